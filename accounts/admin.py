@@ -1,40 +1,77 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from restaurants.models import Restaurant
+from project.paginator import EstimatedCountPaginator
+from .models import User, UserImport
 
 
 class UserAdmin(BaseUserAdmin):
-    list_filter = ("role", "restaurant")
+    list_display = ("username", "email", "first_name", "last_name", "role", "restaurant")
+    list_select_related = ("restaurant",)
+    list_filter = ("role", "is_staff", "is_active")
+    autocomplete_fields = ("restaurant",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ("Restaurant", {"fields": ("role", "restaurant", "phone_number", "address")}),
+    )
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         if request.user.role == "owner":
-            # Only return users associated with the owner's restaurant
-            return qs.filter(restaurant=request.user.restaurant).exclude(role="owner")
+            # Only return users associated with the owner's restaurants
+            return qs.filter(restaurant__owner=request.user).exclude(role="owner")
         return qs
 
+    def is_managed_by(self, request, obj):
+        """
+        Whether `obj` works at or is a customer of one of the owner's
+        restaurants, checked without loading the restaurant.
+        """
+        return (
+            obj.role != "owner"
+            and obj.restaurant_id is not None
+            and Restaurant.objects.filter(
+                id=obj.restaurant_id, owner=request.user
+            ).exists()
+        )
+
     def has_module_permission(self, request):
-        return request.user.is_superuser or request.user.role == "owner"
+        # The login page lists the apps for anonymous users too
+        role = getattr(request.user, "role", None)
+        return request.user.is_superuser or role == "owner"
 
     def has_change_permission(self, request, obj=None):
         # Prevent owners from editing other owners or employees in other restaurants
         if obj and request.user.role == "owner":
-            if obj.restaurant != request.user.restaurant or obj.role == "owner":
+            if not self.is_managed_by(request, obj):
                 return False
         return super().has_change_permission(request, obj)
 
     def has_delete_permission(self, request, obj=None):
         # Prevent owners from deleting other owners or employees in other restaurants
         if obj and request.user.role == "owner":
-            if obj.restaurant != request.user.restaurant or obj.role == "owner":
+            if not self.is_managed_by(request, obj):
                 return False
         return super().has_delete_permission(request, obj)
 
     def has_view_permission(self, request, obj=None):
         # Allow owners to view only users within their restaurant
         if request.user.role == "owner" and obj:
-            return obj.restaurant == request.user.restaurant and obj.role != "owner"
+            return self.is_managed_by(request, obj)
         return super().has_view_permission(request, obj)
 
 
-admin.site.register(User)
+admin.site.register(User, UserAdmin)
+
+
+class UserImportAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_by", "status", "total", "processed", "created")
+    list_filter = ("status",)
+    readonly_fields = [field.name for field in UserImport._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(UserImport, UserImportAdmin)
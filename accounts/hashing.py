@@ -0,0 +1,20 @@
+"""
+Password hashing for worker processes.
+
+Imported by the hashing pool's worker processes, so it must not import
+models or anything else that needs the app registry.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+def init_worker(hashers):
+    # Only the hashers are needed; the rest of the settings stay unloaded
+    if not settings.configured:
+        settings.configure(PASSWORD_HASHERS=hashers)
+
+
+def hash_password(password):
+    # None and "" give an unusable password, like set_unusable_password()
+    return make_password(password or None)
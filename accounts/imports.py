@@ -0,0 +1,379 @@
+"""
+Bulk user import from CSV or NDJSON files.
+
+Records are handled in batches of USER_IMPORT_BATCH_SIZE. A batch is
+validated with a few queries in total rather than a few per user: the fields
+and the role and restaurant rules of User.clean, the restaurants the importer
+may add users to, and username and email uniqueness against the database and
+the rest of the batch. The passwords of the valid records are hashed in a
+pool of USER_IMPORT_HASH_WORKERS processes, and the users are inserted with a
+single bulk_create.
+
+Each batch commits together with the job's progress, so an import that fails
+or is interrupted resumes at the first record it had not committed. Invalid
+records are skipped and reported in the job's errors.
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.hashing import hash_password, init_worker
+from accounts.models import ROLE_CHOICES, User, UserImport
+from restaurants.models import Restaurant
+
+FIELDS = [
+    "username",
+    "email",
+    "password",
+    "role",
+    "restaurant",
+    "first_name",
+    "last_name",
+    "phone_number",
+    "address",
+]
+ROLES = [value for value, _ in ROLE_CHOICES]
+FORMAT_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class UserImportError(Exception):
+    pass
+
+
+def detect_format(filename):
+    return FORMAT_EXTENSIONS.get(Path(filename).suffix.lower())
+
+
+def store_upload(uploaded_file, format):
+    """
+    Save an uploaded file under USER_IMPORT_DIR and return its path.
+    """
+    directory = Path(settings.USER_IMPORT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{uuid.uuid4().hex}.{format}"
+    with open(path, "wb") as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    return str(path)
+
+
+def read_records(path, format):
+    """
+    Yield (number, record, error) for the records of a file, numbered from 1.
+
+    `record` is a dict, or None with `error` set when the record cannot be
+    parsed. Records are numbered the same way on every read, so a resumed
+    import can skip the ones already processed.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as source:
+        if format == "csv":
+            for number, row in enumerate(csv.DictReader(source), 1):
+                row.pop(None, None)  # Values beyond the header
+                yield number, row, None
+            return
+
+        lines = (line for line in source if line.strip())
+        for number, line in enumerate(lines, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, None, "Not valid JSON."
+                continue
+            if not isinstance(record, dict):
+                yield number, None, "Expected a JSON object."
+                continue
+            yield number, record, None
+
+
+def create_import(path, format, created_by=None):
+    total = sum(1 for _ in read_records(path, format))
+    return UserImport.objects.create(
+        created_by=created_by, path=path, format=format, total=total
+    )
+
+
+class ImportScope:
+    """
+    The roles and restaurants an importer may create users for. Owners can
+    add employees and customers to their own restaurants; superusers and the
+    management command can add anyone.
+    """
+
+    def __init__(self, user=None):
+        self.owner_id = None
+        self.roles = ROLES
+        if user is not None and not user.is_superuser:
+            self.owner_id = user.id
+            self.roles = ["employee", "customer"]
+
+    def allows(self, restaurant):
+        return self.owner_id is None or restaurant.owner_id == self.owner_id
+
+
+def clean_value(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def build_user(record, restaurants, scope):
+    """
+    Return (user, password, errors) for one record.
+    """
+    data = {name: clean_value(record.get(name)) for name in FIELDS}
+    errors = {}
+
+    role = data["role"]
+    # Values outside ROLE_CHOICES are reported by full_clean() below
+    if not role:
+        errors["role"] = ["This field is required."]
+    elif role in ROLES and role not in scope.roles:
+        errors["role"] = [f"You cannot import users with the role {role}."]
+
+    restaurant = None
+    if data["restaurant"] and role != "owner":
+        restaurant = restaurants.get(data["restaurant"])
+        if restaurant is None:
+            errors["restaurant"] = ["Unknown restaurant."]
+        elif not scope.allows(restaurant):
+            errors["restaurant"] = ["You do not own this restaurant."]
+            restaurant = None
+
+    user = User(
+        username=data["username"],
+        email=data["email"],
+        role=role or None,
+        restaurant=restaurant,
+        first_name=data["first_name"],
+        last_name=data["last_name"],
+        phone_number=data["phone_number"] or None,
+        address=data["address"] or None,
+    )
+    try:
+        # The restaurant is already resolved, and uniqueness is checked per
+        # batch. clean() applies the role rules.
+        user.full_clean(exclude=["password", "restaurant"], validate_unique=False)
+    except ValidationError as error:
+        for field, messages in error.message_dict.items():
+            errors.setdefault(field, []).extend(messages)
+
+    password = data["password"]
+    if password:
+        try:
+            validate_password(password, user)
+        except ValidationError as error:
+            errors["password"] = error.messages
+    elif settings.PASSWORD_REQUIRED:
+        errors["password"] = ["This field is required."]
+    return user, password, errors
+
+
+def validate_batch(batch, scope):
+    """
+    Return the valid (number, user, password) entries of a batch, and the
+    errors of the others.
+    """
+    restaurant_ids = {
+        clean_value(record.get("restaurant")) for _, record, _ in batch if record
+    }
+    restaurants = {
+        str(restaurant.id): restaurant
+        for restaurant in Restaurant.objects.filter(
+            id__in=[value for value in restaurant_ids if value.isdigit()]
+        )
+    }
+
+    entries = []
+    errors = []
+    for number, record, error in batch:
+        if error:
+            errors.append({"row": number, "errors": {"record": [error]}})
+            continue
+        user, password, problems = build_user(record, restaurants, scope)
+        if problems:
+            errors.append({"row": number, "errors": problems})
+        else:
+            entries.append((number, user, password))
+
+    usernames = {user.username for _, user, _ in entries}
+    taken_usernames = set(
+        User.objects.filter(username__in=usernames).values_list("username", flat=True)
+    )
+    # email and restaurant are unique together; NULL restaurants never clash
+    emails = {
+        (user.email, user.restaurant_id)
+        for _, user, _ in entries
+        if user.restaurant_id is not None
+    }
+    taken_emails = set()
+    if emails:
+        rows = User.objects.filter(
+            email__in={email for email, _ in emails},
+            restaurant_id__in={restaurant_id for _, restaurant_id in emails},
+        ).values_list("email", "restaurant_id")
+        taken_emails = emails & set(rows)
+
+    valid = []
+    for number, user, password in entries:
+        problems = {}
+        if user.username in taken_usernames:
+            problems["username"] = ["A user with that username already exists."]
+        email = (user.email, user.restaurant_id)
+        if user.restaurant_id is not None and email in taken_emails:
+            problems["email"] = ["This email is already used at this restaurant."]
+        if problems:
+            errors.append({"row": number, "errors": problems})
+            continue
+        taken_usernames.add(user.username)
+        if user.restaurant_id is not None:
+            taken_emails.add(email)
+        valid.append((number, user, password))
+    errors.sort(key=lambda error: error["row"])
+    return valid, errors
+
+
+def batches(records, size):
+    records = iter(records)
+    while batch := list(itertools.islice(records, size)):
+        yield batch
+
+
+def claim_import(job):
+    """
+    Mark the import as running, unless it is completed or another process
+    is working on it. Returns whether the import was claimed.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.USER_IMPORT_STALE_SECONDS)
+    claimed = (
+        UserImport.objects.filter(id=job.id)
+        .filter(
+            Q(status__in=["pending", "failed"])
+            | Q(status="running", updated_at__lt=stale)
+        )
+        .update(status="running", failure="", updated_at=now)
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def import_batch(job, batch, scope, pool):
+    valid, errors = validate_batch(batch, scope)
+    workers = settings.USER_IMPORT_HASH_WORKERS or 1
+    chunksize = max(1, len(valid) // (workers * 4))
+    hashes = dict(
+        zip(
+            [number for number, _, _ in valid],
+            pool.map(
+                hash_password,
+                [password for _, _, password in valid],
+                chunksize=chunksize,
+            ),
+        )
+    )
+
+    for attempt in range(2):
+        for number, user, _ in valid:
+            user.password = hashes[number]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, user, _ in valid])
+                job.processed += len(batch)
+                job.created += len(valid)
+                job.skipped += len(errors)
+                room = settings.USER_IMPORT_MAX_ERRORS - len(job.errors)
+                job.errors.extend(errors[: max(room, 0)])
+                job.save(
+                    update_fields=[
+                        "processed",
+                        "created",
+                        "skipped",
+                        "errors",
+                        "updated_at",
+                    ]
+                )
+            return
+        except IntegrityError:
+            job.refresh_from_db()
+            if attempt:
+                raise
+            # Users created elsewhere since the batch was validated
+            valid, errors = validate_batch(batch, scope)
+
+
+def process_import(job, progress=None):
+    """
+    Run a claimed import to the end, from its first unprocessed record.
+    """
+    try:
+        scope = ImportScope(job.created_by)
+        pool = ProcessPoolExecutor(
+            max_workers=settings.USER_IMPORT_HASH_WORKERS,
+            # Forking a threaded web worker can deadlock the children
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(settings.PASSWORD_HASHERS,),
+        )
+        with pool:
+            records = itertools.islice(
+                read_records(job.path, job.format), job.processed, None
+            )
+            for batch in batches(records, settings.USER_IMPORT_BATCH_SIZE):
+                import_batch(job, batch, scope, pool)
+                if progress:
+                    progress(job)
+    except Exception as error:
+        UserImport.objects.filter(id=job.id).update(
+            status="failed",
+            failure=f"{type(error).__name__}: {error}",
+            updated_at=timezone.now(),
+        )
+        raise
+    now = timezone.now()
+    UserImport.objects.filter(id=job.id).update(
+        status="completed", finished_at=now, updated_at=now
+    )
+    job.refresh_from_db()
+    # Uploads are not needed once done; files given to the command are left
+    path = Path(job.path)
+    if path.parent == Path(settings.USER_IMPORT_DIR):
+        path.unlink(missing_ok=True)
+
+
+def run_import(job, progress=None):
+    if not claim_import(job):
+        raise UserImportError(f"Import {job.id} is completed or already running.")
+    process_import(job, progress)
+
+
+def start_import(job):
+    """
+    Claim the import and run it in a background thread.
+    """
+    if not claim_import(job):
+        raise UserImportError(f"Import {job.id} is completed or already running.")
+
+    def target():
+        try:
+            process_import(job)
+        except Exception:
+            pass  # Recorded on the job, which can be resumed
+        finally:
+            connection.close()
+
+    threading.Thread(target=target, daemon=True).start()
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.imports import (
+    UserImportError,
+    create_import,
+    detect_format,
+    run_import,
+)
+from accounts.models import UserImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV or NDJSON file, or resume an import that "
+        "failed or was interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="CSV or NDJSON file.")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument(
+            "--resume", type=int, metavar="ID", help="Resume the import with this ID."
+        )
+
+    def handle(self, *args, **options):
+        if options["resume"] is not None:
+            try:
+                job = UserImport.objects.get(id=options["resume"])
+            except UserImport.DoesNotExist:
+                raise CommandError(f"No import with ID {options['resume']}.")
+        elif options["path"]:
+            format = options["format"] or detect_format(options["path"])
+            if format is None:
+                raise CommandError("Pass --format for files not named .csv or .ndjson.")
+            try:
+                job = create_import(options["path"], format)
+            except OSError as error:
+                raise CommandError(str(error))
+            self.stdout.write(f"Import {job.id}: {job.total} records.")
+        else:
+            raise CommandError("Give a file to import or --resume ID.")
+
+        try:
+            run_import(job, progress=self.report)
+        except UserImportError as error:
+            raise CommandError(str(error))
+        except Exception as error:
+            raise CommandError(
+                f"Import {job.id} failed after {job.processed} records ({error}). "
+                f"Resume it with --resume {job.id}."
+            )
+
+        for error in job.errors[:20]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if job.skipped > len(job.errors[:20]):
+            self.stderr.write(f"... see import {job.id} for all errors.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Import {job.id} done: {job.created} users created, "
+                f"{job.skipped} records skipped."
+            )
+        )
+
+    def report(self, job):
+        self.stdout.write(f"  {job.processed}/{job.total} records")
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.exceptions import ValidationError
@@ -24,6 +26,37 @@ class User(AbstractUser):
 
     class Meta:
         unique_together = ("email", "restaurant")
+        indexes = [
+            # Customer directory lookups, always scoped to a restaurant and role
+            models.Index(
+                fields=["restaurant", "role", "phone_number"],
+                name="user_directory_phone_idx",
+            ),
+            models.Index(
+                F("restaurant"),
+                F("role"),
+                Lower("email"),
+                name="user_directory_email_idx",
+            ),
+            models.Index(
+                F("restaurant"),
+                F("role"),
+                Lower("first_name"),
+                name="user_directory_first_idx",
+            ),
+            models.Index(
+                F("restaurant"),
+                F("role"),
+                Lower("last_name"),
+                name="user_directory_last_idx",
+            ),
+            models.Index(
+                F("restaurant"),
+                F("role"),
+                Lower("username"),
+                name="user_directory_username_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.username} role: {self.role}"
@@ -53,3 +86,47 @@ class User(AbstractUser):
             # Assuming the owner can have multiple restaurants, return a list or a specific restaurant
             return Restaurant.objects.filter(user=self).first()
         return None
+
+
+IMPORT_STATUS = [
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("failed", "Failed"),
+    ("completed", "Completed"),
+]
+
+IMPORT_FORMATS = [("csv", "CSV"), ("ndjson", "NDJSON")]
+
+
+class UserImport(models.Model):
+    """
+    A bulk user import from an uploaded file, see accounts/imports.py.
+
+    `processed` counts the records already handled, and is committed together
+    with the users created from them, so a failed or interrupted import
+    resumes after the last committed batch.
+    """
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="user_imports",
+    )
+    path = models.CharField(max_length=500)
+    format = models.CharField(max_length=10, choices=IMPORT_FORMATS)
+    status = models.CharField(max_length=10, choices=IMPORT_STATUS, default="pending")
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    created = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    # [{"row": <1-based record number>, "errors": {...}}], capped
+    errors = models.JSONField(default=list, blank=True)
+    failure = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"User import {self.id} ({self.status})"
@@ -1,3 +1,193 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts import imports
+from accounts.imports import ImportScope, create_import, run_import
+from accounts.models import User, UserImport
+from restaurants.models import Restaurant
+
+
+class UserAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            "owner", "owner@example.com", role="owner", is_staff=True
+        )
+        cls.owner.user_permissions.set(
+            Permission.objects.filter(codename__in=["view_user", "change_user"])
+        )
+        restaurant = Restaurant.objects.create(
+            owner=cls.owner, name="R", address="a", phone_number="+12025550123"
+        )
+        cls.customer = User.objects.create_user(
+            "customer", "customer@example.com", role="customer", restaurant=restaurant
+        )
+        other_owner = User.objects.create_user(
+            "other", "other@example.com", role="owner"
+        )
+        other = Restaurant.objects.create(
+            owner=other_owner, name="O", address="b", phone_number="+12025550124"
+        )
+        cls.stranger = User.objects.create_user(
+            "stranger", "stranger@example.com", role="customer", restaurant=other
+        )
+
+    def test_login_page_renders_for_anonymous_users(self):
+        response = self.client.get("/admin/login/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_owners_only_see_their_restaurants_users(self):
+        self.client.force_login(self.owner)
+        response = self.client.get("/admin/accounts/user/")
+        self.assertEqual(response.status_code, 200)
+        users = [user.username for user in response.context["cl"].result_list]
+        self.assertEqual(users, ["customer"])
+
+        # Outside the owner's queryset, so reported as missing
+        response = self.client.get(f"/admin/accounts/user/{self.stranger.id}/change/")
+        self.assertRedirects(response, "/admin/")
+        response = self.client.get(f"/admin/accounts/user/{self.customer.id}/change/")
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    USER_IMPORT_HASH_WORKERS=1,
+    USER_IMPORT_BATCH_SIZE=2,
+)
+class UserImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", role="owner")
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name="R", address="a", phone_number="+12025550123"
+        )
+        other_owner = User.objects.create_user(
+            "other", "other@example.com", role="owner"
+        )
+        cls.other = Restaurant.objects.create(
+            owner=other_owner, name="O", address="b", phone_number="+12025550124"
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, lines, name="users.csv"):
+        path = self.directory / name
+        path.write_text("\n".join(lines) + "\n")
+        return str(path)
+
+    def csv(self, *rows):
+        return self.write(["username,email,password,role,restaurant", *rows])
+
+    def test_creates_valid_users_and_reports_the_rest(self):
+        r = self.restaurant.id
+        job = create_import(
+            self.csv(
+                f"ann,ann@example.com,S3cure-pass-1,customer,{r}",
+                f"ann,ann2@example.com,S3cure-pass-1,customer,{r}",
+                f"bob,bob@example.com,S3cure-pass-1,employee,{self.other.id}",
+                "cat,cat@example.com,S3cure-pass-1,owner,",
+                f"dan,dan@example.com,S3cure-pass-1,employee,{r}",
+            ),
+            "csv",
+            self.owner,
+        )
+        run_import(job)
+
+        self.assertEqual((job.status, job.total, job.created), ("completed", 5, 2))
+        self.assertEqual(
+            {error["row"]: sorted(error["errors"]) for error in job.errors},
+            # Without an allowed restaurant, User.clean() also complains
+            {2: ["username"], 3: ["error", "restaurant"], 4: ["role"]},
+        )
+        ann = User.objects.get(username="ann")
+        self.assertEqual(ann.restaurant, self.restaurant)
+        self.assertTrue(ann.check_password("S3cure-pass-1"))
+        self.assertTrue(User.objects.filter(username="dan", role="employee").exists())
+
+    def test_reads_ndjson(self):
+        job = create_import(
+            self.write(
+                [
+                    '{"username": "ann", "email": "ann@example.com", '
+                    f'"password": "S3cure-pass-1", "role": "customer", '
+                    f'"restaurant": {self.restaurant.id}}}',
+                    "not json",
+                ],
+                "users.ndjson",
+            ),
+            "ndjson",
+        )
+        run_import(job)
+        self.assertEqual(job.created, 1)
+        self.assertEqual(
+            job.errors, [{"row": 2, "errors": {"record": ["Not valid JSON."]}}]
+        )
+
+    def test_resumes_after_the_last_committed_batch(self):
+        r = self.restaurant.id
+        job = create_import(
+            self.csv(
+                *(f"u{i},u{i}@example.com,S3cure-pass-1,customer,{r}" for i in range(5))
+            ),
+            "csv",
+        )
+        import_batch = imports.import_batch
+        calls = []
+
+        def fail_second_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            return import_batch(*args)
+
+        with mock.patch.object(imports, "import_batch", fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                run_import(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("failed", 2))
+
+        run_import(job)
+        self.assertEqual((job.status, job.processed, job.created), ("completed", 5, 5))
+        self.assertEqual(User.objects.filter(username__startswith="u").count(), 5)
+        with self.assertRaises(imports.UserImportError):
+            run_import(job)
+
+    def test_owners_upload_imports_through_the_api(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        upload = SimpleUploadedFile(
+            "users.csv",
+            b"username,email,password,role,restaurant\nann,a@b.c,x,customer,1\n",
+        )
+        with override_settings(USER_IMPORT_DIR=self.directory / "uploads"):
+            with mock.patch("api.views.imports.start_import") as start:
+                response = client.post("/user-imports/", {"file": upload})
+        self.assertEqual(response.status_code, 202)
+        job = UserImport.objects.get()
+        self.assertEqual((job.total, job.created_by), (1, self.owner))
+        start.assert_called_once_with(job)
+
+        customer = User.objects.create_user(
+            "customer",
+            "customer@example.com",
+            role="customer",
+            restaurant=self.restaurant,
+        )
+        client.force_authenticate(customer)
+        self.assertEqual(client.get("/user-imports/").status_code, 403)
+
+    def test_scope_of_owners(self):
+        scope = ImportScope(self.owner)
+        self.assertEqual(scope.roles, ["employee", "customer"])
+        self.assertTrue(scope.allows(self.restaurant))
+        self.assertFalse(scope.allows(self.other))
@@ -0,0 +1,72 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from orders.models import ORDER_STATUS
+
+ORDER_STATUSES = {value for value, _ in ORDER_STATUS}
+
+
+class OrderFilterBackend(BaseFilterBackend):
+    """
+    Filter orders by the `status`, `customer`, `restaurant`, `total_min` and
+    `total_max` query parameters.
+
+    `status` takes a comma-separated list of statuses. Every filter is an
+    equality or range on a column covered by the Order indexes, and works the
+    same on archived orders.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {}
+
+        if params.get("status"):
+            statuses = params["status"].split(",")
+            unknown = sorted(set(statuses) - ORDER_STATUSES)
+            if unknown:
+                raise ValidationError(
+                    {"status": f"Unknown statuses: {', '.join(unknown)}."}
+                )
+            if len(statuses) == 1:
+                filters["status"] = statuses[0]
+            else:
+                filters["status__in"] = statuses
+
+        for name in ("customer", "restaurant"):
+            if params.get(name):
+                if not params[name].isdigit():
+                    raise ValidationError({name: "Provide an ID."})
+                filters[f"{name}_id"] = int(params[name])
+
+        for name, lookup in (("total_min", "total__gte"), ("total_max", "total__lte")):
+            if params.get(name):
+                try:
+                    value = Decimal(params[name])
+                except InvalidOperation:
+                    value = None
+                # Decimal() also takes "NaN" and "Infinity"
+                if value is None or not value.is_finite():
+                    raise ValidationError({name: "Provide a number."})
+                filters[lookup] = value
+
+        return queryset.filter(**filters)
+
+
+class OrderOrderingFilter(OrderingFilter):
+    """
+    Whitelisted `?ordering=` for order lists, newest first by default.
+    """
+
+    ordering_fields = ["order_date", "total", "id"]
+
+    def get_default_ordering(self, view):
+        return ["-order_date", "-id"]
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Break ties on the primary key so that pages are stable
+        if ordering and ordering[-1].lstrip("-") != "id":
+            ordering = [*ordering, "-id" if ordering[0].startswith("-") else "id"]
+        return ordering
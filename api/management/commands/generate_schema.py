@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.schema import (
+    generate_schema,
+    read_schema_file,
+    schema_fingerprint,
+    write_schema_file,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the OpenAPI schema into SCHEMA_CACHE_FILE, for the API "
+        "processes to load instead of generating it themselves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only fail if the stored schema is missing or out of date.",
+        )
+
+    def handle(self, *args, **options):
+        fingerprint = schema_fingerprint()
+        if options["check"]:
+            if read_schema_file(fingerprint) is None:
+                raise CommandError(
+                    f"{settings.SCHEMA_CACHE_FILE} is missing or out of date."
+                )
+            self.stdout.write(self.style.SUCCESS("The stored schema is up to date."))
+            return
+
+        schema = generate_schema(fingerprint)
+        write_schema_file(schema)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote the schema for {schema.fingerprint[:12]} to "
+                f"{settings.SCHEMA_CACHE_FILE}."
+            )
+        )
@@ -0,0 +1,96 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "List the traces written by project.tracing.FileExporter, or print "
+        "one of them as a tree of spans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "trace_id",
+            nargs="?",
+            help="Trace to print; a prefix is enough. Lists the traces if omitted.",
+        )
+        parser.add_argument(
+            "--file",
+            default=settings.TRACING_EXPORTER.get("OPTIONS", {}).get("path"),
+            help="File of exported spans. Defaults to the TRACING_EXPORTER path.",
+        )
+        parser.add_argument(
+            "--slowest",
+            type=int,
+            default=20,
+            help="Number of traces to list, slowest first.",
+        )
+
+    def read_spans(self, path):
+        if not path:
+            raise CommandError("No trace file given and TRACING_EXPORTER has none.")
+        traces = defaultdict(list)
+        try:
+            with open(path, encoding="utf-8") as source:
+                for line in source:
+                    if line.strip():
+                        span = json.loads(line)
+                        traces[span["trace_id"]].append(span)
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        return traces
+
+    def handle(self, *args, **options):
+        traces = self.read_spans(options["file"])
+        if options["trace_id"]:
+            matches = [
+                trace_id
+                for trace_id in traces
+                if trace_id.startswith(options["trace_id"])
+            ]
+            if len(matches) != 1:
+                raise CommandError(
+                    f"{len(matches)} traces match {options['trace_id']!r}."
+                )
+            self.print_tree(traces[matches[0]])
+            return
+
+        roots = []
+        for trace_id, spans in traces.items():
+            ids = {span["span_id"] for span in spans}
+            root = next(span for span in spans if span["parent_id"] not in ids)
+            roots.append((root["duration_ms"], trace_id, root, len(spans)))
+        roots.sort(key=lambda entry: entry[0], reverse=True)
+        for duration, trace_id, root, count in roots[: options["slowest"]]:
+            status = root["attributes"].get("status", "")
+            self.stdout.write(
+                f"{trace_id}  {duration:9.2f} ms  {count:4} spans  "
+                f"{status}  {root['name']}"
+            )
+
+    def print_tree(self, spans):
+        ids = {span["span_id"] for span in spans}
+        children = defaultdict(list)
+        for span in spans:
+            parent = span["parent_id"] if span["parent_id"] in ids else None
+            children[parent].append(span)
+
+        def write(span, depth):
+            attributes = " ".join(
+                f"{key}={value}" for key, value in span["attributes"].items()
+            )
+            line = (
+                f"{span['duration_ms']:9.2f} ms  {'  ' * depth}{span['name']}"
+                f"  {attributes}"
+            )
+            if span["error"]:
+                line += f"  ERROR {span['error']}"
+            self.stdout.write(line.rstrip())
+            for child in sorted(children[span["span_id"]], key=lambda s: s["start"]):
+                write(child, depth + 1)
+
+        for root in sorted(children[None], key=lambda s: s["start"]):
+            write(root, 0)
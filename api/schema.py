@@ -0,0 +1,139 @@
+"""
+Precomputed OpenAPI schema.
+
+drf-spectacular builds the schema by introspecting every view and serializer,
+which takes hundreds of milliseconds. The schema only changes with the code,
+so it is generated once per code version and kept in memory, and in
+SCHEMA_CACHE_FILE for the next processes to load (see the generate_schema
+command). The version is a fingerprint of the URL patterns, the source of the
+project apps and the settings and packages the schema depends on.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import django
+import drf_spectacular
+import rest_framework
+from django.apps import apps
+from django.conf import settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {"yaml": OpenApiYamlRenderer, "json": OpenApiJsonRenderer}
+
+
+class CachedSchema:
+    def __init__(self, fingerprint, documents):
+        self.fingerprint = fingerprint
+        # {format: rendered bytes}
+        self.documents = documents
+        self.etags = {
+            name: '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+            for name, body in documents.items()
+        }
+
+
+def iter_patterns(patterns, prefix=""):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            callback = pattern.callback
+            yield f"{route} {callback.__module__}.{callback.__qualname__}"
+
+
+def schema_fingerprint():
+    """
+    Return a hash that changes whenever the generated schema may change.
+    """
+    digest = hashlib.sha256()
+    versions = (django.__version__, rest_framework.VERSION, drf_spectacular.__version__)
+    digest.update(repr(versions).encode())
+    for name in ("SPECTACULAR_SETTINGS", "REST_FRAMEWORK"):
+        digest.update(json.dumps(getattr(settings, name, {}), default=repr).encode())
+    for line in iter_patterns(get_resolver().url_patterns):
+        digest.update(line.encode())
+
+    packages = [apps.get_app_config(label).path for label in settings.PROJECT_APPS]
+    packages.append(str(Path(get_resolver().urlconf_module.__file__).parent))
+    for package in sorted(set(packages)):
+        for path in sorted(Path(package).rglob("*.py")):
+            digest.update(str(path.relative_to(settings.BASE_DIR)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def generate_schema(fingerprint):
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    data = generator.get_schema(request=None, public=True)
+    documents = {
+        name: renderer().render(data, renderer.media_type)
+        for name, renderer in RENDERERS.items()
+    }
+    return CachedSchema(fingerprint, documents)
+
+
+def read_schema_file(fingerprint):
+    path = Path(settings.SCHEMA_CACHE_FILE)
+    try:
+        stored = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if stored.get("fingerprint") != fingerprint:
+        return None
+    documents = {name: body.encode() for name, body in stored["documents"].items()}
+    if set(documents) != set(RENDERERS):
+        return None
+    return CachedSchema(fingerprint, documents)
+
+
+def write_schema_file(schema):
+    path = Path(settings.SCHEMA_CACHE_FILE)
+    stored = {
+        "fingerprint": schema.fingerprint,
+        "documents": {name: body.decode() for name, body in schema.documents.items()},
+    }
+    # Written to a temporary file first, so that readers never see half of it
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temporary.write_text(json.dumps(stored))
+    temporary.replace(path)
+
+
+_schema = None
+_lock = threading.Lock()
+
+
+def get_schema():
+    """
+    Return the CachedSchema for the running code, loading or generating it on
+    first use.
+    """
+    global _schema
+    if _schema is not None:
+        return _schema
+    with _lock:
+        if _schema is not None:
+            return _schema
+        fingerprint = schema_fingerprint()
+        schema = read_schema_file(fingerprint)
+        if schema is None:
+            schema = generate_schema(fingerprint)
+            try:
+                write_schema_file(schema)
+            except OSError:
+                logger.warning(
+                    "Could not write the schema cache %s",
+                    settings.SCHEMA_CACHE_FILE,
+                    exc_info=True,
+                )
+        _schema = schema
+    return _schema
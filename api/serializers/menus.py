@@ -1,5 +1,21 @@
+from copy import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from restaurants.models import Menu, MenuItem
+from restaurants.models import Menu, MenuCategory, MenuItem, Modifier, ModifierGroup
+
+
+def clean_instance(serializer, model, attrs):
+    """
+    Run the model's clean() on the instance as it would be saved.
+    """
+    instance = copy(serializer.instance) if serializer.instance else model()
+    for name, value in attrs.items():
+        setattr(instance, name, value)
+    try:
+        instance.clean()
+    except DjangoValidationError as e:
+        raise serializers.ValidationError(e.message_dict)
 
 
 class MenuItemSerializer(serializers.ModelSerializer):
@@ -8,6 +24,76 @@ class MenuItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ["created_at", "updated_at"]
 
+    def validate(self, attrs):
+        menu = attrs.get("menu") or getattr(self.instance, "menu", None)
+        category = attrs.get("category")
+        if category is not None and category.menu_id != menu.id:
+            raise serializers.ValidationError(
+                {"category": "The category is on another menu."}
+            )
+        for group in attrs.get("modifier_groups", []):
+            if group.menu_id != menu.id:
+                raise serializers.ValidationError(
+                    {"modifier_groups": f"{group.name} is on another menu."}
+                )
+        return attrs
+
+
+class MenuCategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MenuCategory
+        fields = [
+            "id",
+            "menu",
+            "parent",
+            "name",
+            "description",
+            "position",
+            "path",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["path", "created_at", "updated_at"]
+
+    def validate(self, attrs):
+        if self.instance is not None and attrs.get("menu", self.instance.menu) != (
+            self.instance.menu
+        ):
+            raise serializers.ValidationError(
+                {"menu": "Categories cannot be moved to another menu."}
+            )
+        clean_instance(self, MenuCategory, attrs)
+        return attrs
+
+
+class ModifierSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Modifier
+        fields = ["id", "group", "name", "price", "is_available", "position"]
+
+
+class ModifierGroupSerializer(serializers.ModelSerializer):
+    modifiers = ModifierSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ModifierGroup
+        fields = [
+            "id",
+            "menu",
+            "name",
+            "min_choices",
+            "max_choices",
+            "position",
+            "modifiers",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["created_at", "updated_at"]
+
+    def validate(self, attrs):
+        clean_instance(self, ModifierGroup, attrs)
+        return attrs
+
 
 class MenuSerializer(serializers.ModelSerializer):
     items = MenuItemSerializer(many=True, read_only=True)
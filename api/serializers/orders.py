@@ -1,20 +1,84 @@
+from django.db import transaction
 from rest_framework import serializers
-from orders.models import Order, OrderItem
+from orders.models import (
+    Order,
+    OrderItem,
+    ArchivedOrder,
+    ArchivedOrderItem,
+    OrderEvent,
+)
+from restaurants.inventory import OutOfStock, release_held_stock, reserve_stock
 from restaurants.models import MenuItem
+from restaurants.modifiers import InvalidModifiers, resolve_modifiers
 from accounts.models import User
 from restaurants.models import Restaurant
 
 
+class ModifierChoicesField(serializers.ListField):
+    """
+    The modifiers of an order line: written as a list of modifier IDs, read
+    as the snapshot stored on the line, see restaurants/modifiers.py.
+    """
+
+    child = serializers.IntegerField(min_value=1)
+
+    def to_representation(self, data):
+        return data
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    menu_item = serializers.PrimaryKeyRelatedField(queryset=MenuItem.objects.all())
+    menu_item = serializers.PrimaryKeyRelatedField(
+        queryset=MenuItem.objects.select_related("menu")
+    )
+    modifiers = ModifierChoicesField(required=False)
 
     class Meta:
         model = OrderItem
-        fields = ["id", "menu_item", "quantity", "price"]
+        fields = ["id", "menu_item", "quantity", "price", "modifiers"]
+        extra_kwargs = {"quantity": {"min_value": 1}}
+
+    def validate(self, attrs):
+        # Lines of a new order are checked together by OrderSerializer
+        if self.parent is not None:
+            return attrs
+        if self.instance is None:
+            ids = attrs.get("modifiers", [])
+        elif "modifiers" in attrs:
+            ids = attrs["modifiers"]
+        elif "menu_item" in attrs:
+            ids = [modifier["id"] for modifier in self.instance.modifiers]
+        else:
+            return attrs
+        menu_item = attrs.get("menu_item") or self.instance.menu_item
+        try:
+            [attrs["modifiers"]] = resolve_modifiers([(menu_item, ids)])
+        except InvalidModifiers as error:
+            raise serializers.ValidationError({"modifiers": str(error)})
+        return attrs
+
+    def update(self, instance, validated_data):
+        """
+        Update the line. A new menu item or quantity gives back the stock the
+        line holds and reserves it again, unless its order was cancelled.
+        """
+        menu_item = validated_data.get("menu_item") or instance.menu_item
+        quantity = validated_data.get("quantity", instance.quantity)
+        if (menu_item.id, quantity) == (instance.menu_item_id, instance.quantity):
+            return super().update(instance, validated_data)
+        with transaction.atomic():
+            release_held_stock(OrderItem.objects.filter(pk=instance.pk))
+            validated_data["stock_reserved"] = False
+            if instance.order.status != "cancelled":
+                try:
+                    reserve_stock([(menu_item, quantity)])
+                except OutOfStock as error:
+                    raise serializers.ValidationError({"quantity": str(error)})
+                validated_data["stock_reserved"] = menu_item.stock is not None
+            return super().update(instance, validated_data)
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = OrderItemSerializer(many=True, required=False)
     customer = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     restaurant = serializers.PrimaryKeyRelatedField(queryset=Restaurant.objects.all())
 
@@ -30,9 +94,89 @@ class OrderSerializer(serializers.ModelSerializer):
             "items",
         ]
 
+    def validate(self, attrs):
+        # Its stock was put back when it was cancelled, see orders/signals.py
+        if (
+            self.instance is not None
+            and self.instance.status == "cancelled"
+            and attrs.get("status", "cancelled") != "cancelled"
+        ):
+            raise serializers.ValidationError(
+                {"status": "A cancelled order cannot be reopened."}
+            )
+        if not attrs.get("items"):
+            return attrs
+        restaurant = attrs.get("restaurant") or self.instance.restaurant
+        for item in attrs["items"]:
+            if item["menu_item"].menu.restaurant_id != restaurant.id:
+                raise serializers.ValidationError(
+                    {"items": f"{item['menu_item'].name} is not on this menu."}
+                )
+        try:
+            snapshots = resolve_modifiers(
+                (item["menu_item"], item.get("modifiers", []))
+                for item in attrs["items"]
+            )
+        except InvalidModifiers as error:
+            raise serializers.ValidationError({"items": str(error)})
+        for item, snapshot in zip(attrs["items"], snapshots):
+            item["modifiers"] = snapshot
+        return attrs
+
     def create(self, validated_data):
-        items_data = self.context["request"].data.get("items", [])
-        order = Order.objects.create(**validated_data)
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        """
+        Create the order and its items, reserving their stock first.
+        """
+        items_data = validated_data.pop("items", [])
+        with transaction.atomic():
+            try:
+                reserve_stock(
+                    (item["menu_item"], item["quantity"]) for item in items_data
+                )
+            except OutOfStock as error:
+                raise serializers.ValidationError({"items": str(error)})
+            order = Order.objects.create(**validated_data)
+            for item_data in items_data:
+                OrderItem.objects.create(
+                    order=order,
+                    # reserve_stock only takes stock of items that track it
+                    stock_reserved=item_data["menu_item"].stock is not None,
+                    **item_data,
+                )
         return order
+
+    def update(self, instance, validated_data):
+        # Items are changed through the order item endpoints
+        validated_data.pop("items", None)
+        return super().update(instance, validated_data)
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ["id", "menu_item", "quantity", "price", "modifiers"]
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            "id",
+            "restaurant",
+            "customer",
+            "order_date",
+            "total",
+            "status",
+            "items",
+        ]
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    order = serializers.IntegerField(source="order_id")
+    item = serializers.IntegerField(source="order_item_id")
+
+    class Meta:
+        model = OrderEvent
+        fields = ["id", "kind", "order", "item", "status", "created_at"]
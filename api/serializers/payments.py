@@ -5,7 +5,14 @@ from orders.models import Order
 
 class PaymentSerializer(serializers.ModelSerializer):
     order = serializers.PrimaryKeyRelatedField(queryset=Order.objects.all())
+    # Only used to create the payment intent, payments are not stored per currency
+    currency = serializers.CharField(write_only=True, default="usd")
 
     class Meta:
         model = Payment
         fields = "__all__"
+        read_only_fields = ["user", "stripe_payment_intent_id", "status"]
+
+    def create(self, validated_data):
+        validated_data.pop("currency", None)
+        return super().create(validated_data)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from accounts.models import User
+from accounts.models import IMPORT_FORMATS, User, UserImport
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -99,3 +99,29 @@ class OwnerSerializer(serializers.ModelSerializer):
                 f"Cannot assign a restaurant for the role : {self.initial_data.get('role')}."
             )
         return value
+
+
+class UserImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImport
+        fields = [
+            "id",
+            "format",
+            "status",
+            "total",
+            "processed",
+            "created",
+            "skipped",
+            "errors",
+            "failure",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class UserImportUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    # Taken from the file name when not given
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
@@ -0,0 +1,785 @@
+import asyncio
+import base64
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from api import schema
+from api.throttling import TokenBucketStore, TokenBucketThrottle
+from api.views.menus import MenuItemViewSet
+from orders.models import ArchivedOrder, Order, OrderEvent, OrderItem
+from orders.notifier import notifier
+from restaurants.geo import locator
+from restaurants.models import (
+    Menu,
+    MenuCategory,
+    MenuItem,
+    Modifier,
+    ModifierGroup,
+    Restaurant,
+)
+
+
+class APITestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            "owner", "owner@example.com", "pw", role="owner"
+        )
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name="R", address="a", phone_number="+12025550123"
+        )
+        cls.employee = User.objects.create_user(
+            "employee",
+            "employee@example.com",
+            "pw",
+            role="employee",
+            restaurant=cls.restaurant,
+        )
+        cls.customer = User.objects.create_user(
+            "customer",
+            "customer@example.com",
+            "pw",
+            role="customer",
+            restaurant=cls.restaurant,
+        )
+        cls.menu = Menu.objects.create(
+            restaurant=cls.restaurant, name="Menu", description="d"
+        )
+        cls.item = MenuItem.objects.create(
+            menu=cls.menu, name="Burger", description="d", price="5.00"
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def basic_auth(self, user):
+        token = base64.b64encode(f"{user.username}:pw".encode()).decode()
+        return {"HTTP_AUTHORIZATION": f"Basic {token}"}
+
+
+class TokenBucketStoreTests(TestCase):
+    def test_allows_up_to_capacity(self):
+        store = TokenBucketStore()
+        self.assertEqual(store.consume("a", 2, 1.0), 0)
+        self.assertEqual(store.consume("a", 2, 1.0), 0)
+        self.assertGreater(store.consume("a", 2, 1.0), 0)
+
+    def test_zero_rate_denies_first_request(self):
+        store = TokenBucketStore()
+        self.assertGreater(store.consume("a", 0, 0.0), 0)
+        self.assertGreater(store.consume("a", 0, 0.0), 0)
+
+    def test_full_store_evicts_least_recently_used(self):
+        store = TokenBucketStore(max_buckets=2)
+        with mock.patch("api.throttling.time.monotonic", return_value=100.0):
+            store.consume("a", 1, 0.001)
+            store.consume("b", 1, 0.001)
+            # "a" is used again, so "b" is the least recently used bucket
+            store.consume("a", 1, 0.001)
+            store.consume("c", 1, 0.001)
+            # "a" keeps its empty bucket instead of being reset
+            self.assertGreater(store.consume("a", 1, 0.001), 0)
+            self.assertEqual(store.consume("b", 1, 0.001), 0)
+
+    def test_new_keys_evict_one_bucket_at_a_time(self):
+        store = TokenBucketStore(max_buckets=3)
+        for key in "abcde":
+            store.consume(key, 1, 1.0)
+        self.assertEqual(list(store._buckets), ["c", "d", "e"])
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        patcher = mock.patch.object(TokenBucketThrottle, "store", TokenBucketStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_zero_rate_blocks_every_request(self):
+        rates = {"user.read": "0/min"}
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates):
+            response = self.client_for(self.customer).get("/menus/")
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn("Retry-After", response)
+
+    def test_rate_is_enforced_per_user(self):
+        rates = {"user.read": "2/min"}
+        client = self.client_for(self.customer)
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates):
+            statuses = [client.get("/menus/").status_code for _ in range(3)]
+            other = self.client_for(self.employee).get("/menus/")
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(other.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class AsyncReadViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_owner = User.objects.create_user(
+            "other", "other@example.com", "pw", role="owner"
+        )
+        other = Restaurant.objects.create(
+            owner=other_owner, name="O", address="b", phone_number="+12025550124"
+        )
+        cls.other_menu = Menu.objects.create(
+            restaurant=other, name="Other", description="d"
+        )
+
+    def test_requires_credentials(self):
+        response = self.client.get("/async/menus/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    def test_rejects_wrong_password(self):
+        token = base64.b64encode(b"customer:wrong").decode()
+        response = self.client.get("/async/menus/", HTTP_AUTHORIZATION=f"Basic {token}")
+        self.assertEqual(response.status_code, 401)
+
+    def test_lists_menus_of_the_users_restaurant(self):
+        response = self.client.get("/async/menus/", **self.basic_auth(self.customer))
+        self.assertEqual(response.status_code, 200)
+        [menu] = response.json()
+        self.assertEqual(menu["id"], self.menu.id)
+        self.assertEqual([item["id"] for item in menu["items"]], [self.item.id])
+
+    def test_matches_sync_view(self):
+        auth = self.basic_auth(self.customer)
+        sync = self.client.get(f"/menus/{self.menu.id}/", **auth)
+        response = self.client.get(f"/async/menus/{self.menu.id}/", **auth)
+        self.assertEqual(response.json(), sync.json())
+
+    def test_hides_other_restaurants(self):
+        response = self.client.get(
+            f"/async/menus/{self.other_menu.id}/", **self.basic_auth(self.customer)
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class OrderTrackTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.order = Order.objects.create(
+            restaurant=cls.restaurant, customer=cls.customer, total="10.00"
+        )
+        cls.url = f"/async/my-orders/{cls.order.id}/track/"
+
+    def track(self, **params):
+        return self.client.get(self.url, params, **self.basic_auth(self.customer))
+
+    def test_returns_the_current_status(self):
+        response = self.track()
+        self.assertEqual(
+            response.json(),
+            {"id": self.order.id, "status": "pending", "changed": False},
+        )
+        self.assertTrue(self.track(status="in_progress").json()["changed"])
+
+    def test_times_out_unchanged(self):
+        response = self.track(status="pending", timeout="0")
+        self.assertEqual(response.json()["changed"], False)
+
+    def test_rejects_timeouts_that_are_not_numbers(self):
+        for timeout in ("soon", "nan", "inf", "-inf"):
+            with self.subTest(timeout=timeout):
+                response = self.track(status="pending", timeout=timeout)
+                self.assertEqual(response.status_code, 400)
+
+    def test_only_tracks_the_customers_orders(self):
+        response = self.client.get(self.url, **self.basic_auth(self.employee))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_wakes_on_a_status_change(self):
+        async def complete_when_waiting():
+            while not notifier.waiters.get(self.order.id):
+                await asyncio.sleep(0.01)
+            notifier.notify(self.order.id, "completed")
+
+        auth = self.basic_auth(self.customer)["HTTP_AUTHORIZATION"]
+        response, _ = await asyncio.gather(
+            self.async_client.get(
+                self.url,
+                {"status": "pending", "timeout": "5"},
+                headers={"authorization": auth},
+            ),
+            complete_when_waiting(),
+        )
+        self.assertEqual(response.json()["status"], "completed")
+        self.assertTrue(response.json()["changed"])
+
+
+class OrderHistoryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.live = Order.objects.create(
+            restaurant=cls.restaurant, customer=cls.customer, total="10.00"
+        )
+        cls.old_date = timezone.now() - timedelta(days=400)
+        cls.archived = ArchivedOrder.objects.create(
+            id=cls.live.id + 1000,
+            restaurant=cls.restaurant,
+            customer=cls.customer,
+            order_date=cls.old_date,
+            total="20.00",
+            status="completed",
+        )
+
+    def list_ids(self, url):
+        response = self.client_for(self.customer).get(url)
+        self.assertEqual(response.status_code, 200)
+        return {order["id"] for order in response.json()}
+
+    def test_list_without_range_skips_archive(self):
+        self.assertEqual(self.list_ids("/my-orders/"), {self.live.id})
+
+    def test_old_date_from_reads_archive(self):
+        date_from = self.old_date.date().isoformat()
+        self.assertEqual(
+            self.list_ids(f"/my-orders/?date_from={date_from}"),
+            {self.live.id, self.archived.id},
+        )
+
+    def test_old_date_to_reads_archive(self):
+        date_to = (self.old_date + timedelta(days=1)).date().isoformat()
+        self.assertEqual(
+            self.list_ids(f"/my-orders/?date_to={date_to}"), {self.archived.id}
+        )
+
+    def test_recent_date_from_skips_archive(self):
+        date_from = (timezone.now() - timedelta(days=1)).date().isoformat()
+        self.assertEqual(
+            self.list_ids(f"/my-orders/?date_from={date_from}"), {self.live.id}
+        )
+
+    def test_retrieves_archived_order(self):
+        response = self.client_for(self.customer).get(f"/my-orders/{self.archived.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "completed")
+
+    def test_archived_orders_stay_scoped(self):
+        other = User.objects.create_user(
+            "other", "other@example.com", role="customer", restaurant=self.restaurant
+        )
+        response = self.client_for(other).get(f"/my-orders/{self.archived.id}/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client_for(self.owner).get(f"/all-orders/{self.archived.id}/")
+        self.assertEqual(response.status_code, 200)
+
+
+class OrderFilterTests(APITestCase):
+    def test_filters_by_total(self):
+        for total in ("5.00", "15.00"):
+            Order.objects.create(
+                restaurant=self.restaurant, customer=self.customer, total=total
+            )
+        response = self.client_for(self.employee).get(
+            "/all-orders/", {"total_min": "10", "total_max": "20"}
+        )
+        self.assertEqual([order["total"] for order in response.json()], ["15.00"])
+
+    def test_rejects_non_finite_totals(self):
+        client = self.client_for(self.employee)
+        for value in ("x", "NaN", "sNaN", "Infinity", "-inf"):
+            response = client.get("/all-orders/", {"total_min": value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+class MenuDeltaSyncTests(APITestCase):
+    def test_items_of_a_deleted_menu_are_reported_deleted(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        response = self.client_for(self.owner).delete(f"/menus/{self.menu.id}/")
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client_for(self.customer).get("/menu-items/", {"since": since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["deleted"], [self.item.id])
+
+    def test_rejects_bad_since(self):
+        client = self.client_for(self.customer)
+        for since in ("x", "2024-02-30T00:00"):
+            response = client.get("/menu-items/", {"since": since})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("since", response.json())
+
+
+class DashboardTests(APITestCase):
+    def test_counts_orders_by_status_in_two_queries(self):
+        other = Restaurant.objects.create(
+            owner=self.owner, name="Another", address="a", phone_number="+12025550199"
+        )
+        for status in ("pending", "pending", "completed"):
+            Order.objects.create(
+                restaurant=self.restaurant,
+                customer=self.customer,
+                total="10.00",
+                status=status,
+            )
+        client = self.client_for(self.owner)
+        with self.assertNumQueries(2):
+            response = client.get("/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        counts = {r["name"]: r["counts"] for r in response.json()["restaurants"]}
+        self.assertEqual(counts["R"]["pending"], 2)
+        self.assertEqual(counts["R"]["completed"], 1)
+        self.assertEqual(set(counts[other.name].values()), {0})
+
+    def test_other_days_and_bad_dates(self):
+        Order.objects.create(
+            restaurant=self.restaurant, customer=self.customer, total="10.00"
+        )
+        client = self.client_for(self.owner)
+        response = client.get("/dashboard/", {"date": "2000-01-01"})
+        self.assertEqual(response.json()["restaurants"][0]["counts"]["pending"], 0)
+        for date in ("x", "2024-02-30"):
+            response = client.get("/dashboard/", {"date": date})
+            self.assertEqual(response.status_code, 400)
+
+    def test_only_owners(self):
+        response = self.client_for(self.employee).get("/dashboard/")
+        self.assertEqual(response.status_code, 403)
+
+
+class NearbyTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name, lat, lng in (
+            ("Near", "48.8570", "2.3520"),
+            ("Further", "48.8600", "2.3600"),
+            ("Far", "45.7640", "4.8357"),
+        ):
+            Restaurant.objects.create(
+                owner=cls.owner,
+                name=name,
+                address="a",
+                phone_number="+12025550123",
+                latitude=lat,
+                longitude=lng,
+            )
+
+    def setUp(self):
+        # Build the index from this test's data
+        locator.index = None
+        self.addCleanup(setattr, locator, "index", None)
+
+    def nearby(self, **params):
+        return self.client_for(self.customer).get("/restaurants/nearby/", params)
+
+    def test_nearest_first_within_the_radius(self):
+        response = self.nearby(lat="48.8566", lng="2.3522", radius="10")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["name"] for r in response.json()], ["Near", "Further"])
+        self.assertLess(response.json()[0]["distance_km"], 0.1)
+
+    def test_k_limits_the_matches(self):
+        response = self.nearby(lat="48.8566", lng="2.3522", k="1")
+        self.assertEqual([r["name"] for r in response.json()], ["Near"])
+
+    def test_rejects_bad_parameters(self):
+        for params in (
+            {"lng": "2"},
+            {"lat": "91", "lng": "2"},
+            {"lat": "nan", "lng": "2"},
+            {"lat": "48", "lng": "2", "radius": "51"},
+            {"lat": "48", "lng": "2", "k": "0"},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.nearby(**params).status_code, 400)
+
+
+class SchemaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "schema.json"
+        patcher = override_settings(SCHEMA_CACHE_FILE=self.path)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.cached = schema.CachedSchema(
+            "abc", {"yaml": b"openapi: 3.0.3\n", "json": b'{"openapi":"3.0.3"}'}
+        )
+        self.addCleanup(setattr, schema, "_schema", None)
+
+    def test_serves_the_cached_schema_with_an_etag(self):
+        schema._schema = self.cached
+        response = self.client.get("/api/schema/", {"format": "json"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"openapi":"3.0.3"}')
+        self.assertEqual(response["ETag"], self.cached.etags["json"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        response = self.client.get(
+            "/api/schema/",
+            {"format": "json"},
+            HTTP_IF_NONE_MATCH=self.cached.etags["json"],
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_stale_etag_gets_the_document(self):
+        schema._schema = self.cached
+        response = self.client.get("/api/schema/", HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"openapi: 3.0.3\n")
+
+    def test_loads_the_stored_schema_of_the_same_code(self):
+        schema.write_schema_file(self.cached)
+        with mock.patch.object(schema, "schema_fingerprint", return_value="abc"):
+            with mock.patch.object(schema, "generate_schema") as generate:
+                self.assertEqual(schema.get_schema().etags, self.cached.etags)
+        generate.assert_not_called()
+        self.assertIsNone(schema.read_schema_file("other"))
+
+
+class MenuStructureTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.drinks = MenuCategory.objects.create(menu=cls.menu, name="Drinks")
+        cls.hot = MenuCategory.objects.create(
+            menu=cls.menu, parent=cls.drinks, name="Hot"
+        )
+        cls.tea = MenuCategory.objects.create(menu=cls.menu, parent=cls.hot, name="Tea")
+        cls.size = ModifierGroup.objects.create(
+            menu=cls.menu, name="Size", min_choices=1, max_choices=1
+        )
+        cls.large = Modifier.objects.create(group=cls.size, name="Large", price="1.50")
+        cls.item.modifier_groups.add(cls.size)
+
+    def test_tree_of_the_users_menus(self):
+        response = self.client_for(self.customer).get("/menus/tree/")
+        self.assertEqual(response.status_code, 200)
+        [menu] = response.json()
+        [drinks] = menu["categories"]
+        self.assertEqual(drinks["children"][0]["children"][0]["name"], "Tea")
+
+    def test_categories_within_a_category(self):
+        response = self.client_for(self.customer).get(
+            "/menu-categories/", {"within": self.drinks.id}
+        )
+        self.assertEqual(
+            sorted(category["name"] for category in response.json()), ["Hot", "Tea"]
+        )
+
+    def test_order_lines_keep_a_snapshot_of_their_modifiers(self):
+        line = {"menu_item": self.item.id, "quantity": 1, "price": "6.50"}
+        order = {
+            "restaurant": self.restaurant.id,
+            "customer": self.customer.id,
+            "total": "6.50",
+            "items": [line],
+        }
+        client = self.client_for(self.customer)
+        response = client.post("/my-orders/", order, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        line["modifiers"] = [self.large.id]
+        response = client.post("/my-orders/", order, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.large.delete()
+        [snapshot] = OrderItem.objects.get().modifiers
+        self.assertEqual((snapshot["name"], snapshot["price"]), ("Large", "1.50"))
+
+
+class BatchTests(APITestCase):
+    def batch(self, *requests):
+        response = self.client_for(self.owner).post(
+            "/batch/", {"requests": list(requests)}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["responses"]
+
+    def test_runs_each_request(self):
+        responses = self.batch(
+            {"id": "menus", "path": "/menus/"},
+            {"id": "missing", "path": "/nowhere/"},
+            {"id": "nested", "path": "/batch/", "method": "POST"},
+            {"id": "invalid", "path": "/menus/", "method": "POST", "body": {}},
+        )
+        self.assertEqual(
+            [(r["id"], r["status"]) for r in responses],
+            [("menus", 200), ("missing", 404), ("nested", 400), ("invalid", 400)],
+        )
+        self.assertEqual(responses[0]["body"][0]["id"], self.menu.id)
+
+    def test_failing_request_does_not_fail_the_batch(self):
+        error = mock.patch.object(
+            MenuItemViewSet, "list", side_effect=RuntimeError("boom")
+        )
+        with error, self.assertLogs("api.views.batch", "ERROR"):
+            responses = self.batch(
+                {"id": "menus", "path": "/menus/"},
+                {"id": "items", "path": "/menu-items/"},
+                {"id": "restaurants", "path": "/restaurants/"},
+            )
+        self.assertEqual(
+            [(r["id"], r["status"]) for r in responses],
+            [("menus", 200), ("items", 500), ("restaurants", 200)],
+        )
+
+
+class BulkMutationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_owner = User.objects.create_user(
+            "other", "other@example.com", role="owner"
+        )
+        other = Restaurant.objects.create(
+            owner=other_owner, name="O", address="b", phone_number="+12025550124"
+        )
+        other_menu = Menu.objects.create(restaurant=other, name="O", description="d")
+        cls.other_item = MenuItem.objects.create(
+            menu=other_menu, name="Other", description="d", price="5.00"
+        )
+
+    def bulk(self, user, url, data, method="patch"):
+        client = self.client_for(user)
+        return getattr(client, method)(url, data, format="json")
+
+    def test_updates_only_the_users_rows(self):
+        before = self.item.updated_at
+        response = self.bulk(
+            self.owner,
+            "/menu-items/bulk/",
+            {"ids": [self.item.id, self.other_item.id], "data": {"price": "7.00"}},
+        )
+        self.assertEqual(response.json(), {"updated": 1})
+        self.item.refresh_from_db()
+        self.other_item.refresh_from_db()
+        self.assertEqual(str(self.item.price), "7.00")
+        self.assertGreater(self.item.updated_at, before)
+        self.assertEqual(str(self.other_item.price), "5.00")
+
+    def test_rejects_unlisted_filters_and_fields(self):
+        response = self.bulk(
+            self.owner,
+            "/menu-items/bulk/",
+            {"filter": {"name__startswith": "B"}, "data": {"price": "1"}},
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.bulk(
+            self.owner,
+            "/menu-items/bulk/",
+            {"ids": [self.item.id], "data": {"menu": 1}},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_status_update_is_logged(self):
+        orders = [
+            Order.objects.create(
+                restaurant=self.restaurant, customer=self.customer, total="1.00"
+            )
+            for _ in range(3)
+        ]
+        response = self.bulk(
+            self.employee,
+            "/all-orders/bulk/",
+            {"filter": {"status": "pending"}, "data": {"status": "in_progress"}},
+        )
+        self.assertEqual(response.json(), {"updated": 3})
+        events = OrderEvent.objects.filter(kind="order_status", status="in_progress")
+        self.assertEqual(
+            sorted(events.values_list("order_id", flat=True)),
+            [order.id for order in orders],
+        )
+
+    def test_employees_cannot_bulk_delete_orders(self):
+        Order.objects.create(
+            restaurant=self.restaurant, customer=self.customer, total="1.00"
+        )
+        response = self.bulk(
+            self.employee,
+            "/all-orders/bulk/",
+            {"filter": {"status": "pending"}},
+            "delete",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_order_bulk_delete_queries(self):
+        orders = [
+            Order.objects.create(
+                restaurant=self.restaurant, customer=self.customer, total="1.00"
+            )
+            for _ in range(3)
+        ]
+        for order in orders:
+            OrderItem.objects.create(
+                order=order, menu_item=self.item, quantity=1, price="5.00"
+            )
+        client = self.client_for(self.owner)
+        # Reading orders and items, a DELETE per table, then a counter bump
+        # and an "order_deleted" event per order
+        with self.assertNumQueries(5 + 2 * len(orders)):
+            response = client.delete(
+                "/all-orders/bulk/",
+                {"ids": [order.id for order in orders]},
+                format="json",
+            )
+        self.assertEqual(response.json(), {"deleted": 3})
+        self.assertEqual(
+            OrderEvent.objects.filter(kind="order_deleted").count(), len(orders)
+        )
+
+
+class StockTests(APITestCase):
+    def setUp(self):
+        MenuItem.objects.filter(id=self.item.id).update(stock=5)
+
+    def stock(self):
+        return MenuItem.objects.values_list("stock", flat=True).get(id=self.item.id)
+
+    def place_order(self, quantity):
+        return self.client_for(self.customer).post(
+            "/my-orders/",
+            {
+                "restaurant": self.restaurant.id,
+                "customer": self.customer.id,
+                "total": "10.00",
+                "items": [
+                    {"menu_item": self.item.id, "quantity": quantity, "price": "5.00"}
+                ],
+            },
+            format="json",
+        )
+
+    def test_placing_an_order_reserves_stock(self):
+        self.assertEqual(self.place_order(2).status_code, 201)
+        self.assertEqual(self.stock(), 3)
+        self.assertTrue(OrderItem.objects.get().stock_reserved)
+
+        response = self.place_order(4)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), 3)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cancelled_orders_cannot_be_reopened(self):
+        order_id = self.place_order(2).json()["id"]
+        client = self.client_for(self.owner)
+        response = client.patch(
+            "/all-orders/bulk/",
+            {"ids": [order_id], "data": {"status": "cancelled"}},
+            format="json",
+        )
+        self.assertEqual(response.json(), {"updated": 1})
+        self.assertEqual(self.stock(), 5)
+
+        response = client.patch(
+            f"/all-orders/{order_id}/", {"status": "pending"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.patch(
+            "/all-orders/bulk/",
+            {"ids": [order_id], "data": {"status": "pending"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get().status, "cancelled")
+        self.assertEqual(self.stock(), 5)
+
+    def test_deleting_orders_puts_back_their_stock(self):
+        client = self.client_for(self.owner)
+        first = self.place_order(1).json()["id"]
+        second = self.place_order(2).json()["id"]
+        self.assertEqual(self.stock(), 2)
+        response = client.delete(f"/all-orders/{first}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stock(), 3)
+        response = client.delete("/all-orders/bulk/", {"ids": [second]}, format="json")
+        self.assertEqual(response.json(), {"deleted": 1})
+        self.assertEqual(self.stock(), 5)
+
+    def test_quantity_edits_reserve_stock_again(self):
+        self.place_order(2)
+        line = OrderItem.objects.get()
+        client = self.client_for(self.owner)
+        url = f"/all-order-items/{line.id}/"
+        response = client.patch(url, {"quantity": 4}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 1)
+        response = client.patch(url, {"quantity": 6}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(OrderItem.objects.get().quantity, 4)
+        response = client.patch(url, {"quantity": 1}, format="json")
+        self.assertEqual(self.stock(), 4)
+
+        response = client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stock(), 5)
+
+
+class CustomerSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.alice = User.objects.create_user(
+            "alice",
+            "Alice.Smith@example.com",
+            first_name="Alice",
+            last_name="Smith",
+            role="customer",
+            restaurant=cls.restaurant,
+            phone_number="+12025550199",
+        )
+        cls.bob = User.objects.create_user(
+            "bob",
+            "bob@example.com",
+            first_name="Bob",
+            last_name="Alison",
+            role="customer",
+            restaurant=cls.restaurant,
+        )
+        other_owner = User.objects.create_user(
+            "other", "other@example.com", role="owner"
+        )
+        other = Restaurant.objects.create(
+            owner=other_owner, name="O", address="b", phone_number="+12025550124"
+        )
+        User.objects.create_user(
+            "alina", "alina@example.com", role="customer", restaurant=other
+        )
+
+    def search(self, query, user=None):
+        response = self.client_for(user or self.employee).get(
+            "/customers/search/", {"q": query}
+        )
+        return response
+
+    def usernames(self, query):
+        response = self.search(query)
+        self.assertEqual(response.status_code, 200)
+        return [user["username"] for user in response.json()["results"]]
+
+    def test_name_prefix_matches_any_name_field(self):
+        self.assertEqual(self.usernames("ALI"), ["alice", "bob"])
+
+    def test_email_prefix(self):
+        self.assertEqual(self.usernames("ALICE.SMITH@EX"), ["alice"])
+        self.assertEqual(self.usernames("bob@ex"), ["bob"])
+
+    def test_phone_number(self):
+        self.assertEqual(self.usernames("+1 (202) 555-0199"), ["alice"])
+
+    def test_rejects_short_queries(self):
+        self.assertEqual(self.search("a").status_code, 400)
+
+    def test_customers_only_find_themselves(self):
+        response = self.search("ali", user=self.alice)
+        self.assertEqual(
+            [user["username"] for user in response.json()["results"]], ["alice"]
+        )
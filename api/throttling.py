@@ -0,0 +1,172 @@
+"""
+Token bucket throttling for the API.
+
+Buckets are kept in process memory, so every worker enforces the configured
+rates on its own. Each request costs one dictionary lookup and a little float
+arithmetic under a lock, which keeps the check in the microsecond range.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Parse a rate such as "100/min" into a (capacity, tokens per second) tuple.
+
+    Returns None when no rate is configured, which disables throttling.
+    """
+    if rate is None:
+        return None
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / DURATIONS[period[0]]
+
+
+class TokenBucketStore:
+    """
+    Thread-safe token buckets keyed by an arbitrary string.
+
+    Each bucket is stored as [tokens, last refill, capacity, refill rate] and
+    is refilled lazily when it is next consumed from. Buckets are kept in
+    least recently used order, so that a full store evicts the tenant that
+    has been idle longest rather than resetting everyone's limits. Eviction
+    takes one bucket from the old end per new key, so an insert costs the
+    same however many buckets are stored.
+    """
+
+    def __init__(self, max_buckets=100_000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        """
+        Take one token from the bucket stored under `key`.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the number of
+            seconds until the next token becomes available, which is
+            infinite for a rate of zero.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                while len(self._buckets) >= self.max_buckets:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = [capacity, now, capacity, refill_rate]
+            else:
+                self._buckets.move_to_end(key)
+
+            tokens = bucket[0] + (now - bucket[1]) * refill_rate
+            if tokens > capacity:
+                tokens = capacity
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return 0.0
+            bucket[0] = tokens
+            if not refill_rate:
+                return math.inf
+            return (1.0 - tokens) / refill_rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+bucket_store = TokenBucketStore(getattr(settings, "THROTTLE_MAX_BUCKETS", 100_000))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class for token bucket throttles.
+
+    Requests are split into the "read" and "write" scopes by HTTP method,
+    unless the view sets a `throttle_scope` of its own. The rate for each
+    scope is read from DEFAULT_THROTTLE_RATES as "<prefix>.<scope>".
+    """
+
+    prefix = None
+    store = bucket_store
+
+    def get_key(self, request, view):
+        """
+        Return the tenant key for the request, or None to skip throttling.
+        """
+        raise NotImplementedError(".get_key() must be overridden")
+
+    def get_scope(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope:
+            return scope
+        return "read" if request.method in SAFE_METHODS else "write"
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        scope = self.get_scope(request, view)
+        rate = parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES.get(f"{self.prefix}.{scope}")
+        )
+        if rate is None:
+            return True
+
+        wait = self.store.consume(f"{self.prefix}.{scope}:{key}", *rate)
+        if wait:
+            # A rate of zero never refills, so there is no time to wait for
+            self.wait_time = None if math.isinf(wait) else wait
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Throttle each user, or each client address for anonymous requests.
+    """
+
+    prefix = "user"
+
+    def get_key(self, request, view):
+        if request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class RestaurantTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Throttle all users of a restaurant together.
+
+    Employees and customers share their restaurant's bucket. Owners act on
+    behalf of all of their restaurants, so they get a bucket of their own.
+    """
+
+    prefix = "restaurant"
+
+    def get_key(self, request, view):
+        user = request.user
+        if not user.is_authenticated:
+            return None
+        if user.role == "owner":
+            return f"owner-{user.pk}"
+        if user.restaurant_id is not None:
+            return user.restaurant_id
+        return None
@@ -7,4 +7,7 @@ urlpatterns = [
     path("", include("api.urls.restaurants")),
     path("", include("api.urls.menus")),
     path("", include("api.urls.payments")),
+    path("", include("api.urls.async_views")),
+    path("", include("api.urls.batch")),
+    path("", include("api.urls.dashboard")),
 ]
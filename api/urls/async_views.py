@@ -0,0 +1,43 @@
+from django.urls import path
+from api.views.async_views import (
+    AsyncMenuView,
+    AsyncMenuItemView,
+    AsyncRestaurantView,
+    AsyncMyOrderView,
+    AsyncOrderTrackView,
+    AsyncUserPaymentsView,
+)
+
+# Native async read endpoints, served without a thread per request under ASGI
+urlpatterns = [
+    path("async/menus/", AsyncMenuView.as_view(), name="async_menus"),
+    path("async/menus/<int:pk>/", AsyncMenuView.as_view(), name="async_menu"),
+    path("async/menu-items/", AsyncMenuItemView.as_view(), name="async_menu_items"),
+    path(
+        "async/menu-items/<int:pk>/",
+        AsyncMenuItemView.as_view(),
+        name="async_menu_item",
+    ),
+    path(
+        "async/restaurants/", AsyncRestaurantView.as_view(), name="async_restaurants"
+    ),
+    path(
+        "async/restaurants/<int:pk>/",
+        AsyncRestaurantView.as_view(),
+        name="async_restaurant",
+    ),
+    path("async/my-orders/", AsyncMyOrderView.as_view(), name="async_my_orders"),
+    path(
+        "async/my-orders/<int:pk>/", AsyncMyOrderView.as_view(), name="async_my_order"
+    ),
+    path(
+        "async/my-orders/<int:pk>/track/",
+        AsyncOrderTrackView.as_view(),
+        name="async_my_order_track",
+    ),
+    path(
+        "async/user-payments/",
+        AsyncUserPaymentsView.as_view(),
+        name="async_user_payments",
+    ),
+]
@@ -0,0 +1,6 @@
+from django.urls import path
+from api.views.dashboard import OwnerDashboardView
+
+urlpatterns = [
+    path("dashboard/", OwnerDashboardView.as_view(), name="owner_dashboard"),
+]
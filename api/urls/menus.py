@@ -1,10 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from api.views.menus import MenuViewSet, MenuItemViewSet
+from api.views.menus import (
+    MenuCategoryViewSet,
+    MenuViewSet,
+    MenuItemViewSet,
+    ModifierGroupViewSet,
+    ModifierViewSet,
+)
 
 router = DefaultRouter()
 router.register(r"menus", MenuViewSet, basename="menu")
 router.register(r"menu-items", MenuItemViewSet, basename="menu-item")
+router.register(r"menu-categories", MenuCategoryViewSet, basename="menu-category")
+router.register(r"modifier-groups", ModifierGroupViewSet, basename="modifier-group")
+router.register(r"modifiers", ModifierViewSet, basename="modifier")
 
 urlpatterns = [
     path("", include(router.urls)),
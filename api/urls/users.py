@@ -1,12 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from api.views.users import CustomerView, EmployeeView, OwnerView
+from api.views.imports import UserImportViewSet
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
 router.register(r"customers", CustomerView, basename="customer")
 router.register(r"employees", EmployeeView, basename="employee")
 router.register(r"owners", OwnerView, basename="owner")
+router.register(r"user-imports", UserImportViewSet, basename="user-import")
 
 urlpatterns = [
     path("", include(router.urls)),
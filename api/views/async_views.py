@@ -0,0 +1,203 @@
+import base64
+import binascii
+import math
+
+from django.conf import settings
+from django.contrib.auth import aauthenticate
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.settings import api_settings
+
+from api.views.menus import MenuViewSet, MenuItemViewSet
+from api.views.orders import MyOrderViewSet
+from api.views.payments import UserPaymentsView
+from api.views.restaurants import RestaurantViewSet
+from orders.notifier import DELETED, notifier
+
+
+class AsyncAPIView(View):
+    """
+    Base class for natively async, read-only JSON endpoints.
+
+    Requests are authenticated with HTTP Basic credentials and throttled with
+    the same throttle classes as the DRF views, without leaving the event loop.
+    """
+
+    www_authenticate_realm = "api"
+
+    async def authenticate(self, request):
+        """
+        Authenticate the request from its Authorization header.
+
+        Returns:
+            User: The authenticated user, or None if the credentials are
+            missing or invalid.
+        """
+        auth = request.headers.get("Authorization", "").split()
+        if len(auth) != 2 or auth[0].lower() != "basic":
+            return None
+        try:
+            userid, password = base64.b64decode(auth[1]).decode("utf-8").split(":", 1)
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            return None
+
+        user = await aauthenticate(request, username=userid, password=password)
+        if user is None or not user.is_active:
+            return None
+        return user
+
+    def check_throttles(self, request):
+        """
+        Return the longest wait imposed by the throttle classes, or None.
+        """
+        waits = []
+        for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait() or 0)
+        return max(waits) if waits else None
+
+    async def initial(self, request):
+        """
+        Authenticate and throttle the request.
+
+        Returns:
+            JsonResponse: An error response if the request must be rejected,
+            otherwise None.
+        """
+        user = await self.authenticate(request)
+        if user is None:
+            response = JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=401,
+            )
+            response["WWW-Authenticate"] = f'Basic realm="{self.www_authenticate_realm}"'
+            return response
+        request.user = user
+
+        wait = self.check_throttles(request)
+        if wait is not None:
+            response = JsonResponse({"detail": "Request was throttled."}, status=429)
+            response["Retry-After"] = str(int(wait) + 1)
+            return response
+        return None
+
+
+class AsyncReadView(AsyncAPIView):
+    """
+    Async list and retrieve endpoint backed by an existing sync view.
+
+    The sync view supplies the role-scoped queryset and the serializer, so both
+    stacks apply the same access rules. Related rows named in `prefetch` are
+    loaded up front, as serialization cannot query the database from the
+    event loop.
+    """
+
+    view_class = None
+    prefetch = ()
+
+    def get_view(self, request):
+        view = self.view_class()
+        view.request = request
+        view.format_kwarg = None
+        view.kwargs = self.kwargs
+        return view
+
+    async def get(self, request, pk=None):
+        response = await self.initial(request)
+        if response is not None:
+            return response
+
+        view = self.get_view(request)
+        queryset = view.get_queryset().prefetch_related(*self.prefetch)
+        serializer_class = view.get_serializer_class()
+        context = {"request": request, "view": view}
+
+        if pk is not None:
+            try:
+                instance = await queryset.aget(pk=pk)
+            except queryset.model.DoesNotExist:
+                return JsonResponse({"detail": "No object found."}, status=404)
+            return JsonResponse(serializer_class(instance, context=context).data)
+
+        instances = [instance async for instance in queryset]
+        serializer = serializer_class(instances, many=True, context=context)
+        return JsonResponse(serializer.data, safe=False)
+
+
+class AsyncMenuView(AsyncReadView):
+    view_class = MenuViewSet
+    prefetch = ("items",)
+
+
+class AsyncMenuItemView(AsyncReadView):
+    view_class = MenuItemViewSet
+
+
+class AsyncRestaurantView(AsyncReadView):
+    view_class = RestaurantViewSet
+
+
+class AsyncMyOrderView(AsyncReadView):
+    view_class = MyOrderViewSet
+    prefetch = ("items",)
+
+
+class AsyncUserPaymentsView(AsyncReadView):
+    view_class = UserPaymentsView
+
+
+class AsyncOrderTrackView(AsyncReadView):
+    """
+    Long-poll the status of one of the customer's orders.
+
+    `?status=` is the status the client last saw. The response comes as soon
+    as the order's status differs from it, or after `?timeout=` seconds
+    (ORDER_TRACK_TIMEOUT by default, at most ORDER_TRACK_MAX_TIMEOUT) with
+    "changed": false. Without `status`, the current status is returned right
+    away. While waiting, the request is woken by orders.notifier and makes no
+    database queries; the status is read again on timeout, to catch changes
+    made by other processes.
+    """
+
+    view_class = MyOrderViewSet
+
+    async def get(self, request, pk=None):
+        response = await self.initial(request)
+        if response is not None:
+            return response
+
+        try:
+            timeout = float(request.GET.get("timeout", settings.ORDER_TRACK_TIMEOUT))
+        except ValueError:
+            timeout = math.nan
+        # "nan" and "inf" parse as floats, but NaN would get past the clamp below
+        if not math.isfinite(timeout):
+            return JsonResponse({"timeout": "Provide a number of seconds."}, status=400)
+        timeout = min(max(timeout, 0), settings.ORDER_TRACK_MAX_TIMEOUT)
+        known = request.GET.get("status")
+
+        statuses = (
+            self.get_view(request)
+            .get_queryset()
+            .filter(pk=pk)
+            .values_list("status", flat=True)
+        )
+        # Subscribed before reading, so that a change in between is not missed
+        waiter = notifier.subscribe(pk)
+        try:
+            current = await statuses.afirst()
+            changed = known is not None and current != known
+            if current is not None and known is not None and not changed:
+                try:
+                    current = await waiter.wait(timeout)
+                    changed = True
+                except TimeoutError:
+                    current = await statuses.afirst()
+                    changed = current != known
+        finally:
+            notifier.unsubscribe(pk, waiter)
+
+        if current is DELETED:
+            return JsonResponse({"detail": "No object found."}, status=404)
+        return JsonResponse({"id": pk, "status": current, "changed": changed})
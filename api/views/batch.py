@@ -0,0 +1,158 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Headers of sub-responses that are worth passing back to the client
+FORWARDED_HEADERS = ["Location", "Retry-After"]
+
+
+class BatchView(APIView):
+    """
+    Run several API requests in one round trip.
+
+    The body is {"requests": [{"method", "path", "body"}, ...]}, and each
+    path must resolve to a route in api.urls. Sub-requests run in-process,
+    in order, as the user who authenticated the batch, and skip middleware.
+    Consecutive GETs run concurrently when BATCH_MAX_CONCURRENCY is above
+    one; each such GET then uses its own database connection. A sub-request
+    that raises gets a 500 entry of its own, and the others still run.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=OpenApiTypes.OBJECT, responses=OpenApiTypes.OBJECT)
+    def post(self, request):
+        specs = request.data.get("requests")
+        if not isinstance(specs, list) or not specs:
+            raise ValidationError({"requests": "Provide a non-empty list of requests."})
+        limit = settings.BATCH_MAX_REQUESTS
+        if len(specs) > limit:
+            raise ValidationError({"requests": f"At most {limit} requests per batch."})
+
+        results = []
+        for group in self.group_requests(specs):
+            if len(group) > 1 and settings.BATCH_MAX_CONCURRENCY > 1:
+                with ThreadPoolExecutor(settings.BATCH_MAX_CONCURRENCY) as pool:
+                    results.extend(
+                        pool.map(lambda spec: self.run_in_thread(request, spec), group)
+                    )
+            else:
+                results.extend(self.run_subrequest(request, spec) for spec in group)
+        return Response({"responses": results})
+
+    def group_requests(self, specs):
+        """
+        Split the requests into runs of consecutive GETs and single writes.
+        """
+        group = []
+        for spec in specs:
+            is_get = (
+                isinstance(spec, dict) and spec.get("method", "GET").upper() == "GET"
+            )
+            if is_get:
+                group.append(spec)
+                continue
+            if group:
+                yield group
+                group = []
+            yield [spec]
+        if group:
+            yield group
+
+    def run_in_thread(self, request, spec):
+        try:
+            return self.run_subrequest(request, spec)
+        finally:
+            connections.close_all()
+
+    def run_subrequest(self, request, spec):
+        """
+        Dispatch a single sub-request and return its status and body.
+        """
+        if not isinstance(spec, dict) or not isinstance(spec.get("path"), str):
+            return self.error(spec, 400, "Each request needs a path.")
+
+        url = urlsplit(spec["path"])
+        try:
+            match = resolve(url.path, urlconf="api.urls")
+        except Resolver404:
+            return self.error(spec, 404, "Not found.")
+
+        view_class = getattr(match.func, "cls", None)
+        if (
+            view_class is None
+            or not issubclass(view_class, APIView)
+            or view_class is BatchView
+        ):
+            return self.error(spec, 400, "This route cannot be batched.")
+
+        sub_request = self.build_request(request, spec, url)
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception:
+            logger.exception(
+                "Batch sub-request %s %s failed", sub_request.method, url.path
+            )
+            return self.error(spec, 500, "A server error occurred.")
+
+        result = {"status": response.status_code}
+        if "id" in spec:
+            result["id"] = spec["id"]
+        headers = {
+            name: response[name]
+            for name in FORWARDED_HEADERS
+            if response.has_header(name)
+        }
+        if headers:
+            result["headers"] = headers
+        result["body"] = getattr(response, "data", None)
+        return result
+
+    def build_request(self, request, spec, url):
+        body = b""
+        if spec.get("body") is not None:
+            body = json.dumps(spec["body"]).encode()
+
+        environ = {
+            key: value
+            for key, value in request._request.META.items()
+            if isinstance(value, str) and key != "HTTP_AUTHORIZATION"
+        }
+        environ.update(
+            {
+                "REQUEST_METHOD": spec.get("method", "GET").upper(),
+                "PATH_INFO": url.path,
+                "SCRIPT_NAME": "",
+                "QUERY_STRING": url.query,
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(body)),
+                "wsgi.input": BytesIO(body),
+                "wsgi.url_scheme": request.scheme,
+            }
+        )
+        sub_request = WSGIRequest(environ)
+        # Reuse the batch's authentication instead of authenticating again.
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        return sub_request
+
+    def error(self, spec, status, detail):
+        result = {"status": status, "body": {"detail": detail}}
+        if isinstance(spec, dict) and "id" in spec:
+            result["id"] = spec["id"]
+        return result
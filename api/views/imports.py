@@ -0,0 +1,65 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from accounts.imports import (
+    UserImportError,
+    create_import,
+    detect_format,
+    start_import,
+    store_upload,
+)
+from accounts.models import UserImport
+from accounts.permissions import IsOwner, IsSuperAdmin
+from api.serializers.users import UserImportSerializer, UserImportUploadSerializer
+
+
+class UserImportViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Bulk user imports from CSV or NDJSON files, see accounts/imports.py.
+
+    Uploading a file starts the import in the background and answers 202
+    with the job, which can be polled for progress and errors. A failed or
+    interrupted import is continued with POST .../resume/.
+    """
+
+    serializer_class = UserImportSerializer
+    permission_classes = [IsOwner | IsSuperAdmin]
+
+    def get_queryset(self):
+        queryset = UserImport.objects.order_by("-id")
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(created_by=self.request.user)
+
+    @extend_schema(request=UserImportUploadSerializer)
+    def create(self, request, *args, **kwargs):
+        upload = UserImportUploadSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        file = upload.validated_data["file"]
+        format = upload.validated_data.get("format") or detect_format(file.name)
+        if format is None:
+            raise ValidationError(
+                {"format": "Name the file .csv or .ndjson, or give the format."}
+            )
+
+        job = create_import(store_upload(file, format), format, request.user)
+        start_import(job)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(request=None)
+    @action(detail=True, methods=["post"])
+    def resume(self, request, pk=None):
+        job = self.get_object()
+        try:
+            start_import(job)
+        except UserImportError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
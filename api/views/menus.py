@@ -1,14 +1,26 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
-from restaurants.models import Menu, MenuItem
-from api.serializers.menus import MenuSerializer, MenuItemSerializer
+from restaurants.models import Menu, MenuCategory, MenuItem, Modifier, ModifierGroup
+from api.serializers.menus import (
+    MenuCategorySerializer,
+    MenuSerializer,
+    MenuItemSerializer,
+    ModifierGroupSerializer,
+    ModifierSerializer,
+)
 from accounts.permissions import IsOwner, IsEmployee
 from restaurants.models import Restaurant
+from restaurants.menu_tree import load_menu_trees
+from api.views.mixins import BulkMutationMixin, DeltaSyncMixin
+from restaurants.trending import tracker
 
 
-class MenuViewSet(viewsets.ModelViewSet):
+class MenuViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     serializer_class = MenuSerializer
+    tombstone_kind = "menu"
 
     def get_permissions(self):
         """
@@ -38,10 +50,33 @@ class MenuViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if user.role in ["employee", "customer"]:
-            return Menu.objects.filter(restaurant=user.restaurant)
+            menus = Menu.objects.filter(restaurant_id=user.restaurant_id)
         elif user.role == "owner":
-            return Menu.objects.filter(restaurant__owner=user)
-        return Menu.objects.none()
+            menus = Menu.objects.filter(restaurant__owner=user)
+        else:
+            return Menu.objects.none()
+        return menus.prefetch_related("items__modifier_groups")
+
+    def get_changed_queryset(self, queryset):
+        return queryset.prefetch_related("items")
+
+    @action(detail=False, methods=["get"])
+    def tree(self, request):
+        """
+        Return the whole tree of every menu the user can see: nested
+        categories with their items, uncategorized items and modifier groups.
+
+        `?restaurant=<id>` limits the menus to one restaurant. The trees are
+        loaded with the same six queries whatever their size, see
+        restaurants/menu_tree.py.
+        """
+        menus = self.get_queryset().prefetch_related(None)
+        restaurant_id = request.query_params.get("restaurant")
+        if restaurant_id is not None:
+            if not restaurant_id.isdigit():
+                raise ValidationError({"restaurant": "Provide a restaurant ID."})
+            menus = menus.filter(restaurant_id=int(restaurant_id))
+        return Response(load_menu_trees(menus))
 
     def perform_create(self, serializer):
         """
@@ -126,8 +161,12 @@ class MenuViewSet(viewsets.ModelViewSet):
         instance.delete()
 
 
-class MenuItemViewSet(viewsets.ModelViewSet):
+class MenuItemViewSet(DeltaSyncMixin, BulkMutationMixin, viewsets.ModelViewSet):
     serializer_class = MenuItemSerializer
+    tombstone_kind = "menu_item"
+    bulk_filter_fields = ["menu", "menu__in", "price__gte", "price__lte"]
+    bulk_update_fields = ["price", "name", "description", "stock", "is_available"]
+    bulk_touch_field = "updated_at"
 
     def get_permissions(self):
         """
@@ -163,16 +202,53 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if user.role in ["employee", "customer"]:
-            menu_ids = Menu.objects.filter(restaurant=user.restaurant).values_list(
-                "id", flat=True
-            )
-            return MenuItem.objects.filter(menu__id__in=menu_ids)
+            menu_ids = Menu.objects.filter(
+                restaurant_id=user.restaurant_id
+            ).values_list("id", flat=True)
         elif user.role == "owner":
             menu_ids = Menu.objects.filter(restaurant__owner=user).values_list(
                 "id", flat=True
             )
-            return MenuItem.objects.filter(menu__id__in=menu_ids)
-        return MenuItem.objects.none()
+        else:
+            return MenuItem.objects.none()
+        return MenuItem.objects.filter(menu__id__in=menu_ids).prefetch_related(
+            "modifier_groups"
+        )
+
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        """
+        Return the restaurant's most ordered items right now, from the
+        in-memory trending counters rather than the order history.
+
+        Owners pick the restaurant with `?restaurant=<id>`, everyone else gets
+        their own restaurant. `?limit=` caps the number of items (default 10).
+        """
+        user = request.user
+        if user.role == "owner":
+            restaurant_id = request.query_params.get("restaurant")
+            if not restaurant_id or not restaurant_id.isdigit():
+                raise ValidationError({"restaurant": "Provide a restaurant ID."})
+            restaurant_id = int(restaurant_id)
+            if not Restaurant.objects.filter(id=restaurant_id, owner=user).exists():
+                raise PermissionDenied("You do not own this restaurant.")
+        elif user.restaurant_id is not None:
+            restaurant_id = user.restaurant_id
+        else:
+            raise PermissionDenied("You are not attached to a restaurant.")
+
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 50))
+        except ValueError:
+            raise ValidationError({"limit": "Provide a number."})
+
+        scores = dict(tracker.top(restaurant_id, limit))
+        items = self.get_queryset().filter(id__in=scores)
+        ranked = sorted(items, key=lambda item: scores[item.id], reverse=True)
+        data = self.get_serializer(ranked, many=True).data
+        for entry, item in zip(data, ranked):
+            entry["score"] = round(scores[item.id], 2)
+        return Response(data)
 
     def perform_create(self, serializer):
         """
@@ -260,3 +336,124 @@ class MenuItemViewSet(viewsets.ModelViewSet):
                     "Owners can only delete menu items for their associated restaurants."
                 )
         instance.delete()
+
+
+class MenuPartMixin:
+    """
+    Access rules of the parts of a menu: categories, modifier groups and
+    modifiers.
+
+    Everyone sees the parts of the menus they can see, and only the owner or
+    employees of the menu's restaurant change them. `menu_lookup` is the path
+    from the model to its menu, and get_menu() finds the menu of a part from
+    its `parent_field`.
+    """
+
+    menu_lookup = "menu"
+    parent_field = "menu"
+
+    def get_permissions(self):
+        if self.request.method == "GET":
+            self.permission_classes = [IsAuthenticated]
+        elif self.request.method in ["POST", "PUT", "PATCH", "DELETE"]:
+            self.permission_classes = [IsOwner | IsEmployee]
+        return [permission() for permission in self.permission_classes]
+
+    def get_queryset(self):
+        user = self.request.user
+        model = self.serializer_class.Meta.model
+        if user.role in ["employee", "customer"]:
+            lookup = {f"{self.menu_lookup}__restaurant_id": user.restaurant_id}
+        elif user.role == "owner":
+            lookup = {f"{self.menu_lookup}__restaurant__owner": user}
+        else:
+            return model.objects.none()
+        return model.objects.filter(**lookup)
+
+    def get_menu(self, parent):
+        return parent
+
+    def check_menu(self, menu):
+        """
+        Raise PermissionDenied unless the user works for the menu's restaurant.
+        """
+        user = self.request.user
+        if user.role == "employee":
+            if menu.restaurant_id != user.restaurant_id:
+                raise PermissionDenied(
+                    "Employees can only change menus of their own restaurant."
+                )
+        elif user.role == "owner":
+            if menu.restaurant.owner_id != user.id:
+                raise PermissionDenied(
+                    "Owners can only change menus of their associated restaurants."
+                )
+
+    def perform_create(self, serializer):
+        self.check_menu(self.get_menu(serializer.validated_data[self.parent_field]))
+        serializer.save()
+
+    def perform_update(self, serializer):
+        self.check_menu(self.get_menu(getattr(serializer.instance, self.parent_field)))
+        parent = serializer.validated_data.get(self.parent_field)
+        if parent is not None:
+            self.check_menu(self.get_menu(parent))
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        self.check_menu(self.get_menu(getattr(instance, self.parent_field)))
+        instance.delete()
+
+
+class MenuCategoryViewSet(MenuPartMixin, viewsets.ModelViewSet):
+    """
+    Categories of menus, listed parents first. `?menu=<id>` lists the
+    categories of one menu, and `?within=<id>` those nested in a category,
+    at any depth.
+    """
+
+    serializer_class = MenuCategorySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related("parent")
+        params = self.request.query_params
+        menu_id = params.get("menu")
+        if menu_id is not None:
+            if not menu_id.isdigit():
+                raise ValidationError({"menu": "Provide a menu ID."})
+            queryset = queryset.filter(menu_id=int(menu_id))
+        within = params.get("within")
+        if within is not None and self.action == "list":
+            if not within.isdigit():
+                raise ValidationError({"within": "Provide a category ID."})
+            root = queryset.filter(id=int(within)).values("menu_id", "path").first()
+            if root is None:
+                return queryset.none()
+            queryset = queryset.filter(
+                menu_id=root["menu_id"], path__startswith=root["path"]
+            ).exclude(id=int(within))
+        return queryset.order_by("menu_id", "path")
+
+
+class ModifierGroupViewSet(MenuPartMixin, viewsets.ModelViewSet):
+    serializer_class = ModifierGroupSerializer
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .prefetch_related("modifiers")
+            .order_by("menu_id", "position", "id")
+        )
+
+
+class ModifierViewSet(MenuPartMixin, viewsets.ModelViewSet):
+    serializer_class = ModifierSerializer
+    menu_lookup = "group__menu"
+    parent_field = "group"
+
+    def get_menu(self, parent):
+        return parent.menu
+
+    def get_queryset(self):
+        return super().get_queryset().order_by("group_id", "position", "id")
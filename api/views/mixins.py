@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from restaurants.models import MenuTombstone, Restaurant
+
+
+class BulkMutationMixin:
+    """
+    Add set-based bulk PATCH and DELETE to a viewset at `<prefix>/bulk/`.
+
+    The body selects rows either by {"ids": [...]} or by {"filter": {...}},
+    using only the lookups listed in `bulk_filter_fields`. A PATCH also takes
+    {"data": {...}}, validated by the viewset's serializer, of which only the
+    fields in `bulk_update_fields` are written. Rows are always selected from
+    get_queryset(), so the tenant rules are applied once for the whole set.
+    An update is a single UPDATE and returns the row count.
+
+    A delete goes through QuerySet.delete() on purpose. The change feed,
+    status counters, menu tombstones and held stock of the deleted rows are
+    kept by delete receivers, and Django's collector is what sends them. It reads the
+    rows and their cascades, then deletes each table with one DELETE, but the
+    receivers still cost a few queries per row. See perform_bulk_update()
+    of the order viewset for the bookkeeping an UPDATE has to do instead.
+    """
+
+    bulk_filter_fields = ()
+    bulk_update_fields = ()
+    # Set to the name of an auto_now field, as UPDATE does not refresh it
+    bulk_touch_field = None
+
+    @action(detail=False, methods=["patch", "delete"], url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        queryset = self.get_bulk_queryset()
+        if request.method == "DELETE":
+            return Response({"deleted": self.perform_bulk_destroy(queryset)})
+        return Response(
+            {"updated": self.perform_bulk_update(queryset, self.get_bulk_values())}
+        )
+
+    def get_bulk_queryset(self):
+        ids = self.request.data.get("ids")
+        filters = self.request.data.get("filter")
+        if (ids is None) == (filters is None):
+            raise ValidationError("Provide either 'ids' or 'filter'.")
+
+        queryset = self.get_queryset()
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                raise ValidationError({"ids": "Provide a non-empty list of IDs."})
+            filters = {"pk__in": ids}
+        elif not isinstance(filters, dict) or not filters:
+            raise ValidationError({"filter": "Provide at least one filter."})
+        else:
+            unknown = set(filters) - set(self.bulk_filter_fields)
+            if unknown:
+                raise ValidationError(
+                    {"filter": f"Unsupported filters: {', '.join(sorted(unknown))}."}
+                )
+
+        try:
+            return queryset.filter(**filters)
+        except DjangoValidationError as e:
+            raise ValidationError({"filter": e.messages})
+        except (ValueError, TypeError) as e:
+            raise ValidationError({"filter": str(e)})
+
+    def get_bulk_values(self):
+        data = self.request.data.get("data")
+        if not isinstance(data, dict) or not data:
+            raise ValidationError({"data": "Provide the fields to update."})
+        unknown = ", ".join(sorted(set(data) - set(self.bulk_update_fields)))
+        if unknown:
+            raise ValidationError(
+                {"data": f"Fields cannot be bulk updated: {unknown}."}
+            )
+
+        serializer = self.get_serializer(data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        values = dict(serializer.validated_data)
+        if self.bulk_touch_field:
+            values[self.bulk_touch_field] = timezone.now()
+        return values
+
+    def perform_bulk_update(self, queryset, values):
+        return queryset.update(**values)
+
+    def perform_bulk_destroy(self, queryset):
+        # Not _raw_delete(): the delete receivers must run, see above
+        _, deleted = queryset.delete()
+        return deleted.get(queryset.model._meta.label, 0)
+
+
+class DeltaSyncMixin:
+    """
+    Let list endpoints return only what changed since `?since=<datetime>`.
+
+    With `since`, the list answers {"changed": [...], "deleted": [ids],
+    "synced_at": ...}: the rows whose `updated_at` is at or after `since`, and
+    the IDs of the rows deleted since then, from the MenuTombstone records of
+    `tombstone_kind`. Clients pass `synced_at` back as the next `since`. It
+    trails the current time by MENU_SYNC_OVERLAP_SECONDS, so rows may be sent
+    twice but are never missed. A `since` older than the tombstone retention
+    gets a 410 and the client has to reload the full list.
+    """
+
+    tombstone_kind = None
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get("since")
+        if since is None:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            # Well formed, but not a real date or time
+            since = None
+        if since is None:
+            raise ValidationError({"since": "Provide an ISO 8601 datetime."})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        now = timezone.now()
+        if since < now - timedelta(days=settings.MENU_TOMBSTONE_RETENTION_DAYS):
+            return Response(
+                {"detail": "The sync window has expired, reload the full list."},
+                status=status.HTTP_410_GONE,
+            )
+
+        changed = self.get_changed_queryset(
+            self.filter_queryset(self.get_queryset()).filter(updated_at__gte=since)
+        )
+        deleted = MenuTombstone.objects.filter(
+            restaurant_id__in=self.get_sync_restaurant_ids(),
+            kind=self.tombstone_kind,
+            deleted_at__gte=since,
+        ).values_list("object_id", flat=True)
+        return Response(
+            {
+                "changed": self.get_serializer(changed, many=True).data,
+                "deleted": list(deleted),
+                "synced_at": now
+                - timedelta(seconds=settings.MENU_SYNC_OVERLAP_SECONDS),
+            }
+        )
+
+    def get_changed_queryset(self, queryset):
+        return queryset
+
+    def get_sync_restaurant_ids(self):
+        user = self.request.user
+        if user.role == "owner":
+            return Restaurant.objects.filter(owner=user).values_list("id", flat=True)
+        if user.restaurant_id is not None:
+            return [user.restaurant_id]
+        return []
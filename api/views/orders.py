@@ -1,16 +1,157 @@
-from rest_framework import viewsets
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from operator import itemgetter
+
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from orders.models import Order, OrderItem
-from api.serializers.orders import OrderSerializer, OrderItemSerializer
+from rest_framework.response import Response
+from orders.models import Order, OrderItem, ArchivedOrder, OrderEvent
+from restaurants.inventory import release_held_stock
+from restaurants.models import Restaurant
+from orders.archive import archive_cutoff
+from orders.counters import bump_many, status_change_deltas
+from orders.events import events_after, is_cursor_expired, latest_cursor
+from orders.notifier import notifier
+from api.serializers.orders import (
+    OrderSerializer,
+    OrderItemSerializer,
+    ArchivedOrderSerializer,
+    OrderEventSerializer,
+)
 from accounts.permissions import IsCustomer, IsEmployee, IsOwner
+from api.views.mixins import BulkMutationMixin
+from api.filters import OrderFilterBackend, OrderOrderingFilter
 
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
 
-class MyOrderViewSet(viewsets.ModelViewSet):
+class OrderHistoryMixin:
+    """
+    Filter order lists by date and read the archive for old date ranges.
+
+    The range is given with the `date_from` and `date_to` query parameters, as
+    ISO dates or datetimes; both ends are inclusive. When either end is before
+    the archive cutoff, archived orders in the range are listed alongside the
+    live ones. Without such a range only the live table is read, which keeps
+    the default lists cheap. The other filters and `ordering` come from the
+    filter backends and apply to both. Archived orders can also be retrieved
+    by ID.
+    """
+
+    filter_backends = [OrderFilterBackend, OrderOrderingFilter]
+
+    def get_archive_queryset(self):
+        """
+        Return the archived orders the requesting user is allowed to see.
+        """
+        raise NotImplementedError(".get_archive_queryset() must be overridden")
+
+    def parse_date_param(self, name, end=False):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+            if day is not None:
+                if end:
+                    day += timedelta(days=1)
+                parsed = datetime.combine(day, time.min)
+            else:
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    raise ValueError(value)
+                if end:
+                    parsed += timedelta(microseconds=1)
+        except ValueError:
+            raise ValidationError({name: "Enter a valid date or datetime."})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def get_date_range(self):
+        """
+        Return the requested (start, end) range; end is exclusive.
+        """
+        return (
+            self.parse_date_param("date_from"),
+            self.parse_date_param("date_to", end=True),
+        )
+
+    def filter_by_date(self, queryset):
+        date_from, date_to = self.get_date_range()
+        if date_from is not None:
+            queryset = queryset.filter(order_date__gte=date_from)
+        if date_to is not None:
+            queryset = queryset.filter(order_date__lt=date_to)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list":
+            queryset = self.filter_by_date(queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        date_from, date_to = self.get_date_range()
+        cutoff = archive_cutoff()
+        if not (
+            (date_from is not None and date_from < cutoff)
+            or (date_to is not None and date_to <= cutoff)
+        ):
+            return super().list(request, *args, **kwargs)
+
+        live = self.get_serializer(
+            self.filter_queryset(self.get_queryset()), many=True
+        ).data
+        archived = ArchivedOrderSerializer(
+            self.filter_archive_queryset(self.get_archive_queryset()),
+            many=True,
+            context=self.get_serializer_context(),
+        ).data
+
+        ordering = OrderOrderingFilter().get_ordering(
+            self.request, self.get_queryset(), self
+        )
+        merged = [*archived, *live]
+        # Stable sorts, applied from the least to the most significant key
+        for field in reversed(ordering):
+            name = field.lstrip("-")
+            if name == "total":
+                # Serialized as a string
+                merged.sort(key=lambda o: Decimal(o["total"]), reverse=field[0] == "-")
+            else:
+                merged.sort(key=itemgetter(name), reverse=field[0] == "-")
+        return Response(merged)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            if not str(pk).isdigit():
+                raise
+            archived = get_object_or_404(
+                self.get_archive_queryset().prefetch_related("items"), pk=pk
+            )
+        serializer = ArchivedOrderSerializer(
+            archived, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    def filter_archive_queryset(self, queryset):
+        queryset = OrderFilterBackend().filter_queryset(self.request, queryset, self)
+        return self.filter_by_date(queryset).prefetch_related("items")
+
+
+class MyOrderViewSet(OrderHistoryMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
@@ -23,6 +164,9 @@ class MyOrderViewSet(viewsets.ModelViewSet):
         user = self.request.user
         return Order.objects.filter(customer=user)
 
+    def get_archive_queryset(self):
+        return ArchivedOrder.objects.filter(customer=self.request.user)
+
     def perform_create(self, serializer):
         """
         Create a new Order object and save it to the database.
@@ -58,10 +202,18 @@ class MyOrderViewSet(viewsets.ModelViewSet):
         super().perform_destroy(instance)
 
 
-class AllOrderViewSet(viewsets.ModelViewSet):
+class AllOrderViewSet(OrderHistoryMixin, BulkMutationMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsEmployee | IsOwner]
     http_method_names = ["get", "put", "patch", "delete"]
+    bulk_filter_fields = [
+        "status",
+        "status__in",
+        "customer",
+        "order_date__gte",
+        "order_date__lt",
+    ]
+    bulk_update_fields = ["status"]
 
     def get_queryset(self):
         """
@@ -81,6 +233,66 @@ class AllOrderViewSet(viewsets.ModelViewSet):
             return Order.objects.filter(restaurant__owner=self.request.user)
         return Order.objects.none()
 
+    def get_archive_queryset(self):
+        if self.request.user.role == "employee":
+            return ArchivedOrder.objects.filter(
+                restaurant_id=self.request.user.restaurant_id
+            )
+        elif self.request.user.role == "owner":
+            return ArchivedOrder.objects.filter(restaurant__owner=self.request.user)
+        return ArchivedOrder.objects.none()
+
+    def get_restaurant_ids(self):
+        if self.request.user.role == "employee":
+            return [self.request.user.restaurant_id]
+        elif self.request.user.role == "owner":
+            return list(
+                Restaurant.objects.filter(owner=self.request.user).values_list(
+                    "id", flat=True
+                )
+            )
+        return []
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        Return the order change feed after `?since=<cursor>`. Events are
+        served once they are ORDER_EVENT_SETTLE_SECONDS old.
+
+        Without `since`, no events are returned and the cursor is the current
+        end of the feed, to sync from after loading the order list. A cursor
+        older than the compacted part of the feed gets a 410, after which the
+        client has to reload the order list.
+        """
+        since = request.query_params.get("since")
+        if since is None:
+            return Response(
+                {"events": [], "cursor": latest_cursor(), "has_more": False}
+            )
+        if not since.isdigit():
+            raise ValidationError(
+                {"since": "Provide a cursor from a previous response."}
+            )
+        since = int(since)
+        if is_cursor_expired(since):
+            return Response(
+                {"detail": "The cursor has expired, reload the order list."},
+                status=status.HTTP_410_GONE,
+            )
+
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 500)), 1000))
+        except ValueError:
+            raise ValidationError({"limit": "Provide a number."})
+        events, has_more = events_after(self.get_restaurant_ids(), since, limit)
+        return Response(
+            {
+                "events": OrderEventSerializer(events, many=True).data,
+                "cursor": events[-1].id if events else since,
+                "has_more": has_more,
+            }
+        )
+
     def perform_update(self, serializer):
         """
         Update an Order object and save it to the database.
@@ -126,6 +338,59 @@ class AllOrderViewSet(viewsets.ModelViewSet):
                 )
         super().perform_destroy(instance)
 
+    def perform_bulk_destroy(self, queryset):
+        """
+        Delete the selected orders in one statement.
+
+        The queryset is already limited to the requesting owner's restaurants.
+        Employees cannot delete orders.
+        """
+        if self.request.user.role == "employee":
+            raise PermissionDenied("Employees cannot delete orders.")
+        return super().perform_bulk_destroy(queryset)
+
+    def perform_bulk_update(self, queryset, values):
+        """
+        Update the selected orders in one statement. As UPDATE skips signals,
+        the change feed events, status counters and tracking notifications of
+        the orders whose status changed, and the stock of cancelled orders,
+        are handled here. Cancelled orders cannot be reopened.
+        """
+        new_status = values.get("status")
+        with transaction.atomic():
+            changed = []
+            if new_status is not None:
+                changed = list(
+                    queryset.select_for_update(of=("self",))
+                    .exclude(status=new_status)
+                    .values_list("id", "restaurant_id", "order_date", "status")
+                )
+            if any(row[3] == "cancelled" for row in changed):
+                raise ValidationError(
+                    {"status": "Cancelled orders cannot be reopened."}
+                )
+            updated = super().perform_bulk_update(queryset, values)
+            OrderEvent.objects.bulk_create(
+                OrderEvent(
+                    restaurant_id=restaurant_id,
+                    order_id=order_id,
+                    kind="order_status",
+                    status=new_status,
+                )
+                for order_id, restaurant_id, _, _ in changed
+            )
+            bump_many(status_change_deltas([row[1:] for row in changed], new_status))
+            if new_status == "cancelled" and changed:
+                release_held_stock(
+                    OrderItem.objects.filter(order_id__in=[row[0] for row in changed])
+                )
+            if changed:
+                changed_ids = [row[0] for row in changed]
+                transaction.on_commit(
+                    lambda: notifier.notify_many(changed_ids, new_status)
+                )
+        return updated
+
 
 class MyOrderItemViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
@@ -1,5 +1,3 @@
-import stripe
-from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.response import Response
@@ -8,13 +6,13 @@ from payments.models import Payment
 from api.serializers.payments import PaymentSerializer
 from rest_framework.generics import ListAPIView, CreateAPIView
 from rest_framework.exceptions import ValidationError
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from payments.gateway import GatewayUnavailable, InvalidSignature, get_gateway
 
 
 class PaymentIntentView(CreateAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "payment"
 
     def create(self, request, *args, **kwargs):
         try:
@@ -27,24 +25,33 @@ class PaymentIntentView(CreateAPIView):
                 )  # Convert to cents
                 currency = serializer.validated_data["currency"]
 
-                intent = stripe.PaymentIntent.create(
-                    amount=amount,
-                    currency=currency,
+                intent = get_gateway().create_payment_intent(
+                    amount,
+                    currency,
                     metadata={"integration_check": "accept_a_payment"},
                 )
 
                 payment = serializer.save(
-                    stripe_payment_intent_id=intent.id, status="pending"
+                    user=request.user,
+                    stripe_payment_intent_id=intent["id"],
+                    status="pending",
                 )
                 return Response(
                     {
-                        "clientSecret": intent.client_secret,
+                        "clientSecret": intent["client_secret"],
                         "payment": PaymentSerializer(payment).data,
                     },
                     status=201,
                 )
             else:
                 raise ValidationError(serializer.errors)
+        except GatewayUnavailable as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else {}
+            return Response(
+                {"error": "The payment provider is unavailable, try again later."},
+                status=503,
+                headers=headers,
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=400)
 
@@ -64,12 +71,10 @@ def stripe_webhook(request):
     event = None
 
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
-        )
+        event = get_gateway().construct_event(payload, sig_header)
     except ValueError as e:
         return JsonResponse({"error": "Invalid payload"}, status=400)
-    except stripe.error.SignatureVerificationError as e:
+    except InvalidSignature as e:
         return JsonResponse({"error": "Invalid signature"}, status=400)
 
     if event["type"] == "payment_intent.succeeded":
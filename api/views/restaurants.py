@@ -1,8 +1,12 @@
+import math
+
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from restaurants.geo import locator
 from restaurants.models import Restaurant
-from accounts.models import User
 from api.serializers.restaurants import RestaurantSerializer
 from accounts.permissions import IsOwner, IsEmployee
 
@@ -22,10 +26,51 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         if user.role == "owner":
             return Restaurant.objects.filter(owner=user)
         elif user.role == "employee":
-            return User.objects.filter(restaurant=user.restaurant)
+            return Restaurant.objects.filter(id=user.restaurant_id)
         else:
             return Restaurant.objects.none()
 
+    @action(detail=False, methods=["get"])
+    def nearby(self, request):
+        """
+        Return the restaurants near `?lat=` and `?lng=`, nearest first, each
+        with its `distance_km`.
+
+        `?radius=` limits the search in kilometres (default 5, at most 50),
+        and `?k=` to the k nearest restaurants in it (default 20, at most
+        100). Any authenticated user can search every restaurant, not only
+        the ones they belong to.
+        """
+        lat = self.get_float_param("lat", -90, 90)
+        lng = self.get_float_param("lng", -180, 180)
+        radius = self.get_float_param("radius", 0, 50, default=5)
+        k = request.query_params.get("k", "20")
+        if not k.isdigit() or not 1 <= int(k) <= 100:
+            raise ValidationError({"k": "Provide a number from 1 to 100."})
+        matches = locator.nearest(lat, lng, int(k), radius)
+
+        distances = {pk: distance for distance, pk in matches}
+        restaurants = Restaurant.objects.filter(id__in=distances)
+        ranked = sorted(restaurants, key=lambda restaurant: distances[restaurant.id])
+        data = self.get_serializer(ranked, many=True).data
+        for entry, restaurant in zip(data, ranked):
+            entry["distance_km"] = round(distances[restaurant.id], 3)
+        return Response(data)
+
+    def get_float_param(self, name, low, high, default=None):
+        value = self.request.query_params.get(name)
+        if not value:
+            if default is None:
+                raise ValidationError({name: "This parameter is required."})
+            return default
+        try:
+            value = float(value)
+        except ValueError:
+            value = math.nan
+        if not low <= value <= high:
+            raise ValidationError({name: f"Provide a number from {low} to {high}."})
+        return value
+
     def perform_create(self, serializer):
         if self.request.user != serializer.instance.owner:
             raise PermissionDenied(
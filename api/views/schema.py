@@ -0,0 +1,45 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+from api.schema import get_schema
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serve the precomputed schema from api/schema.py, with an ETag.
+
+    Requests for a specific language or API version fall back to generating
+    the schema, as those are not precomputed.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        uncached = {"lang", "version"} & request.GET.keys()
+        if uncached or self.api_version or request.version:
+            return super().get(request, *args, **kwargs)
+
+        schema = get_schema()
+        renderer = request.accepted_renderer
+        etag = schema.etags[renderer.format]
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and (
+            etag in parse_etags(if_none_match) or if_none_match.strip() == "*"
+        ):
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f"; charset={renderer.charset}"
+            response = HttpResponse(
+                schema.documents[renderer.format], content_type=content_type
+            )
+            response["Content-Disposition"] = (
+                f'inline; filename="{self._get_filename(request, None)}"'
+            )
+        response["ETag"] = etag
+        # Clients may keep the schema but have to revalidate it
+        patch_cache_control(response, no_cache=True)
+        return response
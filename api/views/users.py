@@ -1,5 +1,12 @@
+import re
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.db.models.functions import Lower
+from phonenumber_field.phonenumber import to_python
 from rest_framework import viewsets
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from accounts.models import User
 from restaurants.models import Restaurant
 from api.serializers.users import (
@@ -8,6 +15,19 @@ from api.serializers.users import (
     OwnerSerializer,
 )
 from accounts.permissions import IsOwner, IsEmployee, IsCustomer, IsSuperAdmin
+from api.pagination import SearchPagination
+
+PHONE_QUERY = re.compile(r"^\+?[\d\s().-]{6,}$")
+
+
+def prefix_range(prefix):
+    """
+    Return the (lower, upper) bounds of the strings starting with `prefix`.
+
+    Range comparisons can use a B-tree index on any database, unlike LIKE on
+    a lowercased expression.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 class CustomerView(viewsets.ModelViewSet):
@@ -68,6 +88,48 @@ class CustomerView(viewsets.ModelViewSet):
             # Default to empty queryset if the role is not recognized
             return User.objects.none()
 
+    @action(detail=False, methods=["get"], pagination_class=SearchPagination)
+    def search(self, request):
+        """
+        Look customers up by phone number, email or name prefix.
+
+        The `q` query parameter is matched as a phone number if it looks like
+        one, as an email prefix if it contains "@", and otherwise as a prefix
+        of the first name, last name or username. Matching is case-insensitive,
+        backed by the directory indexes on User, and scoped by get_queryset.
+        """
+        query = request.query_params.get("q", "").strip()
+        if len(query) < 2:
+            raise ValidationError({"q": "Enter at least two characters."})
+
+        queryset = self.get_queryset()
+        if PHONE_QUERY.match(query):
+            phone = to_python(query, region=settings.PHONENUMBER_DEFAULT_REGION)
+            if phone is None or not phone.is_valid():
+                raise ValidationError({"q": "Enter a valid phone number."})
+            queryset = queryset.filter(phone_number=phone.as_e164).order_by("id")
+        elif "@" in query:
+            lower, upper = prefix_range(query.lower())
+            queryset = (
+                queryset.alias(email_lower=Lower("email"))
+                .filter(email_lower__gte=lower, email_lower__lt=upper)
+                .order_by("email_lower", "id")
+            )
+        else:
+            # One range scan per name index; an OR across the three columns
+            # would leave the planner with only the restaurant and role prefix.
+            lower, upper = prefix_range(query.lower())
+            matches = [
+                queryset.alias(key=Lower(field)).filter(key__gte=lower, key__lt=upper)
+                for field in ("first_name", "last_name", "username")
+            ]
+            queryset = matches[0].union(*matches[1:]).order_by("id")
+
+        page = self.paginate_queryset(queryset)
+        prefetch_related_objects(page, "groups", "user_permissions")
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         """
         Create a new User object and save it to the database.
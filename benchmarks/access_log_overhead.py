@@ -0,0 +1,215 @@
+"""
+Measure what the structured access log costs API requests.
+
+The same authenticated API request is sent in-process, without a network
+server, through the lean WSGI handler with and without AccessLogMiddleware,
+and the difference in time per request is what the access log adds. The
+records are written to a temporary file by the background writer, as in
+production.
+
+A second run floods a writer whose output is slow, with --flood records from
+several threads, and reports how long submitting took and how many records
+each drop policy discarded. Submitting has to stay fast while records are
+being dropped.
+
+Usage:
+    python benchmarks/access_log_overhead.py [--requests 5000] [--path /menus/]
+"""
+
+import argparse
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+CREDENTIALS = base64.b64encode(b"bench-owner:bench").decode()
+
+
+def setup_django(db_path, log_path):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    # PBKDF2 would dominate every request; the benchmark measures the stack.
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    settings.REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []
+    settings.ACCESS_LOG_FILE = log_path
+
+    import django
+
+    django.setup()
+
+
+def seed():
+    from django.core.management import call_command
+    from accounts.models import User
+    from restaurants.models import Restaurant
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    owner = User(username="bench-owner", role="owner")
+    owner.set_password("bench")
+    owner.save()
+    Restaurant.objects.create(
+        owner=owner, name="Bench", address="1 Main St", phone_number="+12025550100"
+    )
+
+
+def make_request(handler, path):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_AUTHORIZATION": f"Basic {CREDENTIALS}",
+        "wsgi.input": BytesIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+    }
+    status = {}
+
+    def start_response(code, headers, exc_info=None):
+        status["code"] = int(code.split()[0])
+
+    body = handler(environ, start_response)
+    b"".join(body)
+    body.close()
+    return status["code"]
+
+
+def run(handlers, path, total, rounds):
+    """
+    Return the median time per request in microseconds of each handler.
+
+    Rounds alternate between the handlers so that drift affects both alike.
+    """
+    timings = {name: [] for name in handlers}
+    for handler in handlers.values():
+        for _ in range(100):
+            make_request(handler, path)
+    for _ in range(rounds):
+        for name, handler in handlers.items():
+            started = time.perf_counter()
+            for _ in range(total):
+                make_request(handler, path)
+            timings[name].append((time.perf_counter() - started) / total * 1e6)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def flood(policy, total, threads, queue_size):
+    """
+    Submit `total` records from `threads` threads to a writer that takes
+    about a millisecond per write. Returns (us per submit, dropped, written).
+    """
+    from project.access_log import AccessLogWriter
+
+    class SlowWriter(AccessLogWriter):
+        def write(self, stream, records):
+            time.sleep(0.001)
+            super().write(stream, records)
+
+    writer = SlowWriter(path=os.devnull, queue_size=queue_size, drop_policy=policy)
+    record = {
+        "method": "GET",
+        "path": "/restaurants/",
+        "route": "^restaurants/$",
+        "status": 200,
+        "duration_ms": 1.5,
+        "queries": 2,
+        "user_id": 1,
+        "role": "owner",
+        "restaurant_id": None,
+    }
+
+    def submit(count):
+        for _ in range(count):
+            writer.submit({**record, "ts": time.time()})
+
+    workers = [
+        threading.Thread(target=submit, args=(total // threads,))
+        for _ in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    writer.drain(timeout=30)
+    return elapsed / total * 1e6, writer.dropped, writer.written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--path",
+        action="append",
+        help="Path to request; repeatable. Defaults to an unrouted path, "
+        "which isolates the middleware, and /restaurants/.",
+    )
+    parser.add_argument("--flood", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    args = parser.parse_args()
+    paths = args.path or ["/no-such-route/", "/restaurants/"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "access.log")
+        setup_django(os.path.join(tmp, "bench.sqlite3"), log_path)
+        seed()
+
+        from django.conf import settings
+        from project.access_log import get_writer
+        from project.handlers import LeanWSGIHandler
+
+        logged = LeanWSGIHandler()
+        settings.ACCESS_LOG_ENABLED = False
+        handlers = {"plain": LeanWSGIHandler(), "logged": logged}
+        settings.ACCESS_LOG_ENABLED = True
+
+        for path in paths:
+            statuses = {make_request(handler, path) for handler in handlers.values()}
+            results = run(handlers, path, args.requests, args.rounds)
+
+            print(
+                f"GET {path} ({', '.join(map(str, sorted(statuses)))}), "
+                f"{args.requests} requests x {args.rounds} rounds"
+            )
+            for name, value in results.items():
+                print(f"  {name:<6} {value:8.1f} us/request")
+            added = results["logged"] - results["plain"]
+            print(f"  access log {added:+.1f} us/request")
+
+        writer = get_writer()
+        writer.drain(timeout=30)
+        with open(log_path) as log:
+            lines = sum(1 for _ in log)
+        print(f"  {lines} records written, {writer.dropped} dropped")
+
+        print(
+            f"Flood: {args.flood} records from {args.threads} threads into a "
+            f"queue of {args.queue_size} with a slow writer"
+        )
+        for policy in ("drop_newest", "drop_oldest"):
+            per_submit, dropped, written = flood(
+                policy, args.flood, args.threads, args.queue_size
+            )
+            print(
+                f"  {policy:<11} {per_submit:6.2f} us/submit, "
+                f"{dropped} dropped, {written} written"
+            )
+
+
+if __name__ == "__main__":
+    main()
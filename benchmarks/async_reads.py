@@ -0,0 +1,229 @@
+"""
+Compare the native async read endpoints against the sync WSGI path.
+
+Both stacks are driven in-process, without a network server, so the numbers
+show the cost of the request handling model itself. The ASGI run keeps every
+connection as a coroutine on one event loop. The WSGI run gives every
+connection a thread, as a threaded server would.
+
+Usage:
+    python benchmarks/async_reads.py [--connections 1000] [--requests 2000]
+
+Each stack runs in its own subprocess so peak RSS is measured separately.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+PATHS = {"asgi": "/async/menus/", "wsgi": "/menus/"}
+CREDENTIALS = base64.b64encode(b"bench-customer:bench").decode()
+
+
+def setup_django(db_path):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    # PBKDF2 would dominate every request; the benchmark measures the stack.
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    settings.REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []
+
+    import django
+
+    django.setup()
+
+
+def seed():
+    from django.core.management import call_command
+    from accounts.models import User
+    from restaurants.models import Restaurant, Menu, MenuItem
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    owner = User(username="bench-owner", role="owner")
+    owner.set_password("bench")
+    owner.save()
+    restaurant = Restaurant.objects.create(
+        owner=owner, name="Bench", address="1 Main St", phone_number="+12025550100"
+    )
+    customer = User(username="bench-customer", role="customer", restaurant=restaurant)
+    customer.set_password("bench")
+    customer.save()
+    for m in range(5):
+        menu = Menu.objects.create(restaurant=restaurant, name=f"Menu {m}", description="")
+        MenuItem.objects.bulk_create(
+            MenuItem(menu=menu, name=f"Item {i}", description="", price="9.99")
+            for i in range(20)
+        )
+
+
+def run_asgi(connections, total):
+    from project.asgi import application
+
+    async def request():
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": PATHS["asgi"],
+            "raw_path": PATHS["asgi"].encode(),
+            "query_string": b"",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"authorization", f"Basic {CREDENTIALS}".encode()),
+            ],
+            "server": ("localhost", 80),
+            "client": ("127.0.0.1", 50000),
+        }
+        disconnected = asyncio.Event()
+        sent = {"request": False}
+        status = {}
+
+        async def receive():
+            if not sent["request"]:
+                sent["request"] = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        await application(scope, receive, send)
+        disconnected.set()
+        return status.get("code")
+
+    async def main():
+        limit = asyncio.Semaphore(connections)
+
+        async def bounded():
+            async with limit:
+                return await request()
+
+        return await asyncio.gather(*(bounded() for _ in range(total)))
+
+    return asyncio.run(main())
+
+
+def run_wsgi(connections, total):
+    from io import BytesIO
+    from project.wsgi import application
+
+    def request(_):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": PATHS["wsgi"],
+            "QUERY_STRING": "",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "localhost",
+            "HTTP_AUTHORIZATION": f"Basic {CREDENTIALS}",
+            "wsgi.input": BytesIO(),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": sys.stderr,
+        }
+        status = {}
+
+        def start_response(code, headers, exc_info=None):
+            status["code"] = int(code.split()[0])
+
+        body = application(environ, start_response)
+        b"".join(body)
+        body.close()
+        return status["code"]
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        return list(pool.map(request, range(total)))
+
+
+def measure(mode, connections, total, db_path):
+    setup_django(db_path)
+    peak_threads = 0
+    stop = threading.Event()
+
+    def sample_threads():
+        nonlocal peak_threads
+        while not stop.wait(0.01):
+            peak_threads = max(peak_threads, threading.active_count())
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    statuses = (run_asgi if mode == "asgi" else run_wsgi)(connections, total)
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    return {
+        "mode": mode,
+        "path": PATHS[mode],
+        "requests": total,
+        "ok": sum(1 for status in statuses if status == 200),
+        "seconds": round(elapsed, 3),
+        "req_per_s": round(total / elapsed, 1),
+        "peak_threads": peak_threads,
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mode", choices=["asgi", "wsgi"])
+    parser.add_argument("--db")
+    args = parser.parse_args()
+
+    if args.mode:
+        result = measure(args.mode, args.connections, args.requests, args.db)
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        setup_django(db_path)
+        seed()
+        for mode in ("asgi", "wsgi"):
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--mode",
+                    mode,
+                    "--connections",
+                    str(args.connections),
+                    "--requests",
+                    str(args.requests),
+                    "--db",
+                    db_path,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                "{mode}: {ok}/{requests} ok in {seconds}s ({req_per_s} req/s), "
+                "peak threads {peak_threads}, max RSS {max_rss_mb} MB".format(**result)
+            )
+
+
+if __name__ == "__main__":
+    main()
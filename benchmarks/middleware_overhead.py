@@ -0,0 +1,141 @@
+"""
+Measure the per-request cost of the full middleware chain on API requests.
+
+The same authenticated API request is sent in-process, without a network
+server, through a WSGI handler built with MIDDLEWARE and one built with
+LEAN_MIDDLEWARE. The difference in time per request is the overhead the
+routed handler in project/handlers.py saves on every API call.
+
+Usage:
+    python benchmarks/middleware_overhead.py [--requests 5000] [--path /menus/]
+"""
+
+import argparse
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+CREDENTIALS = base64.b64encode(b"bench-owner:bench").decode()
+
+
+def setup_django(db_path):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    # PBKDF2 would dominate every request; the benchmark measures the stack.
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    settings.REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []
+
+    import django
+
+    django.setup()
+
+
+def seed():
+    from django.core.management import call_command
+    from accounts.models import User
+    from restaurants.models import Restaurant
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    owner = User(username="bench-owner", role="owner")
+    owner.set_password("bench")
+    owner.save()
+    Restaurant.objects.create(
+        owner=owner, name="Bench", address="1 Main St", phone_number="+12025550100"
+    )
+
+
+def make_request(handler, path):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_AUTHORIZATION": f"Basic {CREDENTIALS}",
+        "wsgi.input": BytesIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+    }
+    status = {}
+
+    def start_response(code, headers, exc_info=None):
+        status["code"] = int(code.split()[0])
+
+    body = handler(environ, start_response)
+    b"".join(body)
+    body.close()
+    return status["code"]
+
+
+def run(handlers, path, total, rounds):
+    """
+    Return the median time per request in microseconds of each handler.
+
+    Rounds alternate between the handlers so that drift affects both alike.
+    """
+    timings = {name: [] for name in handlers}
+    for handler in handlers.values():
+        for _ in range(100):
+            make_request(handler, path)
+    for _ in range(rounds):
+        for name, handler in handlers.items():
+            started = time.perf_counter()
+            for _ in range(total):
+                make_request(handler, path)
+            timings[name].append((time.perf_counter() - started) / total * 1e6)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--path",
+        action="append",
+        help="Path to request; repeatable. Defaults to an unrouted path, "
+        "which isolates the middleware, and /restaurants/.",
+    )
+    args = parser.parse_args()
+    paths = args.path or ["/no-such-route/", "/restaurants/"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, "bench.sqlite3"))
+        seed()
+
+        from django.conf import settings
+        from django.core.handlers.wsgi import WSGIHandler
+        from project.handlers import LeanWSGIHandler
+
+        handlers = {"full": WSGIHandler(), "lean": LeanWSGIHandler()}
+        sizes = {
+            "full": len(settings.MIDDLEWARE),
+            "lean": len(settings.LEAN_MIDDLEWARE),
+        }
+        for path in paths:
+            statuses = {make_request(handler, path) for handler in handlers.values()}
+            results = run(handlers, path, args.requests, args.rounds)
+
+            print(
+                f"GET {path} ({', '.join(map(str, sorted(statuses)))}), "
+                f"{args.requests} requests x {args.rounds} rounds"
+            )
+            for name, value in results.items():
+                print(f"  {name:<5} {sizes[name]} middleware  {value:8.1f} us/request")
+            saved = results["full"] - results["lean"]
+            print(f"  saved {saved:.1f} us/request ({saved / results['full']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
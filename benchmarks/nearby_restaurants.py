@@ -0,0 +1,104 @@
+"""
+Measure nearby restaurant queries against the in-memory grid index.
+
+Restaurants are scattered around a number of city centres, which is denser
+than real data and so a harder case for the grid. Each query shape is timed
+over the same random query points near those centres, and a sample of the
+results is checked against a brute-force scan.
+
+Usage:
+    python benchmarks/nearby_restaurants.py [--restaurants 100000] [--cell 0.02]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def scatter(rng, cities, count):
+    """
+    Return `count` (lat, lng) points spread about 10 km around the cities.
+    """
+    points = []
+    for _ in range(count):
+        lat, lng = rng.choice(cities)
+        points.append((lat + rng.gauss(0, 0.1), lng + rng.gauss(0, 0.12)))
+    return points
+
+
+def time_queries(query, points, rounds):
+    """
+    Return the median time per query in microseconds.
+    """
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for lat, lng in points:
+            query(lat, lng)
+        timings.append((time.perf_counter() - started) / len(points) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--cell", type=float, default=0.02, help="Grid cell size in degrees."
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from restaurants.geo import GridIndex, haversine_km
+
+    rng = random.Random(args.seed)
+    cities = [(rng.uniform(30, 48), rng.uniform(-122, -72)) for _ in range(args.cities)]
+    restaurants = scatter(rng, cities, args.restaurants)
+    queries = scatter(rng, cities, args.queries)
+
+    index = GridIndex(args.cell)
+    started = time.perf_counter()
+    for pk, (lat, lng) in enumerate(restaurants):
+        index.add(pk, lat, lng)
+    built = time.perf_counter() - started
+    print(
+        f"{args.restaurants} restaurants around {args.cities} cities, "
+        f"{args.cell} degree cells, built in {built:.2f}s"
+    )
+
+    shapes = {
+        "nearest 10 in 5 km": lambda lat, lng: index.nearest(lat, lng, 10, 5),
+        "nearest 100 in 5 km": lambda lat, lng: index.nearest(lat, lng, 100, 5),
+        "nearest 100 in 50 km": lambda lat, lng: index.nearest(lat, lng, 100, 50),
+        "within 1 km": lambda lat, lng: index.within(lat, lng, 1),
+        "within 5 km": lambda lat, lng: index.within(lat, lng, 5),
+        # Nothing to find, so every ring out to the radius is searched
+        "nearest 10 in 50 km, empty": lambda lat, lng: index.nearest(0, 0, 10, 50),
+    }
+    for name, query in shapes.items():
+        value = time_queries(query, queries, args.rounds)
+        print(f"  {name:<28} {value:8.1f} us/query")
+
+    for lat, lng in queries[:20]:
+        brute = sorted(
+            (haversine_km(lat, lng, plat, plng), pk)
+            for pk, (plat, plng) in enumerate(restaurants)
+        )
+        expected = [match for match in brute if match[0] <= 5]
+        assert [pk for _, pk in index.within(lat, lng, 5)] == [pk for _, pk in expected]
+        assert [pk for _, pk in index.nearest(lat, lng, 10, 5)] == [
+            pk for _, pk in expected[:10]
+        ]
+    print("  results match a brute-force scan")
+
+
+if __name__ == "__main__":
+    main()
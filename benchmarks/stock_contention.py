@@ -0,0 +1,195 @@
+"""
+Stress stock reservation with many concurrent orders for the same item.
+
+Worker threads place orders through the API for a limited item, each also
+ordering an untracked item and sometimes a second limited one. Once all
+orders are in, the script checks that no item was oversold: every limited
+item's remaining stock plus the quantities of its committed order lines adds
+up to its starting stock, and orders were only refused once an item ran
+low.
+
+SQLite serializes writers, so under it the run mostly measures lock waits.
+Point --settings at a PostgreSQL or MySQL settings module for a run where
+the conditional UPDATE is what keeps orders from overselling. A smaller
+version of the check runs with the tests, in orders/tests.py.
+
+Usage:
+    python benchmarks/stock_contention.py [--orders 500] [--workers 50]
+"""
+
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def setup_django(settings_module, db_path):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    from django.conf import settings
+
+    database = settings.DATABASES["default"]
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        database["NAME"] = db_path
+        # Writers wait for each other instead of failing with "locked"
+        database["OPTIONS"] = {"timeout": 60}
+    # PBKDF2 would dominate every request; the benchmark measures the stack.
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    settings.REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []
+
+    import django
+
+    django.setup()
+
+
+def seed(stock, customers):
+    from django.core.management import call_command
+    from accounts.models import User
+    from restaurants.models import Menu, MenuItem, Restaurant
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    owner = User.objects.create(username="bench-owner", role="owner")
+    restaurant = Restaurant.objects.create(
+        owner=owner, name="Bench", address="1 Main St", phone_number="+12025550100"
+    )
+    menu = Menu.objects.create(restaurant=restaurant, name="Menu", description="")
+    items = {
+        name: MenuItem.objects.create(
+            menu=menu, name=name, description="", price="5.00", stock=count
+        )
+        for name, count in (("hot", stock), ("side", stock // 2), ("drink", None))
+    }
+    users = []
+    for number in range(customers):
+        user = User(
+            username=f"bench-{number}",
+            email=f"bench-{number}@example.com",
+            role="customer",
+            restaurant=restaurant,
+        )
+        user.set_password("bench")
+        users.append(user)
+    User.objects.bulk_create(users)
+    return restaurant, items, list(User.objects.filter(role="customer"))
+
+
+def worker(jobs, restaurant, items, results):
+    from django.db import connection
+    from django.test import Client
+
+    clients = {}
+    try:
+        while True:
+            try:
+                customer, lines = jobs.pop()
+            except IndexError:
+                return
+            client = clients.get(customer.id)
+            if client is None:
+                client = clients[customer.id] = Client()
+                credentials = base64.b64encode(
+                    f"{customer.username}:bench".encode()
+                ).decode()
+                client.defaults["HTTP_AUTHORIZATION"] = f"Basic {credentials}"
+            payload = {
+                "restaurant": restaurant.id,
+                "customer": customer.id,
+                "total": "0.00",
+                "items": [
+                    {"menu_item": items[name].id, "quantity": quantity, "price": "5.00"}
+                    for name, quantity in lines
+                ],
+            }
+            started = time.perf_counter()
+            response = client.post(
+                "/my-orders/", payload, content_type="application/json"
+            )
+            results.append((response.status_code, time.perf_counter() - started))
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument(
+        "--stock", type=int, default=300, help="Starting stock of the hot item."
+    )
+    parser.add_argument("--settings", default="project.settings")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(args.settings, os.path.join(tmp, "bench.sqlite3"))
+        from orders.models import OrderItem
+        from restaurants.models import MenuItem
+
+        restaurant, items, customers = seed(args.stock, args.workers)
+        rng = random.Random(args.seed)
+        jobs = []
+        for _ in range(args.orders):
+            lines = [("hot", rng.randint(1, 2)), ("drink", 1)]
+            if rng.random() < 0.5:
+                lines.append(("side", 1))
+            jobs.append((rng.choice(customers), lines))
+
+        results = []
+        threads = [
+            threading.Thread(target=worker, args=(jobs, restaurant, items, results))
+            for _ in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        statuses = Counter(status for status, _ in results)
+        latencies = sorted(duration for _, duration in results)
+        print(
+            f"{args.orders} orders from {args.workers} workers in {elapsed:.2f}s "
+            f"({args.orders / elapsed:.0f} orders/s)"
+        )
+        print(
+            f"  latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms"
+        )
+        print(f"  responses {dict(sorted(statuses.items()))}")
+
+        failures = []
+        left = {}
+        unexpected = set(statuses) - {201, 400}
+        if unexpected:
+            failures.append(f"unexpected responses {sorted(unexpected)}")
+        for name, item in items.items():
+            if item.stock is None:
+                continue
+            remaining = MenuItem.objects.get(id=item.id).stock
+            sold = sum(
+                OrderItem.objects.filter(menu_item=item).values_list(
+                    "quantity", flat=True
+                )
+            )
+            print(f"  {name}: started {item.stock}, sold {sold}, left {remaining}")
+            left[name] = remaining
+            if remaining + sold != item.stock:
+                failures.append(f"{name} stock does not add up")
+        # An order takes at most 2 of "hot" and 1 of "side"
+        if statuses[400] and left["hot"] >= 2 and left["side"] >= 1:
+            failures.append("orders were refused while stock was left")
+        if failures:
+            sys.exit("FAILED: " + "; ".join(failures))
+        print("  no item was oversold")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,33 @@
 from django.contrib import admin
 
-# Register your models here.
+from project.paginator import EstimatedCountPaginator
 from .models import Order, OrderItem
 
-admin.site.register(Order)
-admin.site.register(OrderItem)
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ("menu_item",)
+    extra = 0
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ("id", "customer", "restaurant", "order_date", "total", "status")
+    list_select_related = ("customer", "restaurant")
+    list_filter = ("status",)
+    date_hierarchy = "order_date"
+    raw_id_fields = ("customer",)
+    autocomplete_fields = ("restaurant",)
+    inlines = [OrderItemInline]
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) on every changelist page
+    show_full_result_count = False
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "menu_item", "quantity", "price")
+    list_select_related = ("order__customer", "order__restaurant", "menu_item__menu")
+    raw_id_fields = ("order", "menu_item")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
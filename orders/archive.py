@@ -0,0 +1,132 @@
+"""
+Archival of old, finished orders.
+
+Completed and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved,
+with their items and payments, into the archive tables in batches. Each batch
+is copied and deleted in one transaction, so an interrupted run leaves no
+half-moved orders and a new run simply carries on with what is left.
+
+Archiving is not a deletion: it adds no events to the change feed, leaves
+the status counters as they are and does not wake order trackers.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import (
+    Order,
+    OrderItem,
+    ArchivedOrder,
+    ArchivedOrderItem,
+    TERMINAL_ORDER_STATUSES,
+)
+from payments.models import Payment, ArchivedPayment
+
+
+def archive_cutoff(days=None):
+    """
+    Return the order date before which finished orders belong in the archive.
+    """
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def delete_rows(model, column, ids):
+    """
+    Delete the rows of `model` whose `column` is in `ids` with plain SQL.
+
+    QuerySet.delete() would collect every row and send pre_delete and
+    post_delete for each, and the delete receivers (change feed, status
+    counters, order trackers) must not see archived rows go: they live on in
+    the archive. Nothing cascades, so callers delete children first.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(column)} IN ({placeholders})",
+            ids,
+        )
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move one batch of archivable orders into the archive tables.
+
+    Returns:
+        int: The number of orders archived.
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status__in=TERMINAL_ORDER_STATUSES, order_date__lt=cutoff)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+
+        ArchivedOrder.objects.bulk_create(
+            ArchivedOrder(
+                id=order.id,
+                restaurant_id=order.restaurant_id,
+                customer_id=order.customer_id,
+                order_date=order.order_date,
+                total=order.total,
+                status=order.status,
+            )
+            for order in Order.objects.filter(id__in=order_ids)
+        )
+        ArchivedOrderItem.objects.bulk_create(
+            ArchivedOrderItem(
+                id=item.id,
+                order_id=item.order_id,
+                menu_item_id=item.menu_item_id,
+                quantity=item.quantity,
+                price=item.price,
+                modifiers=item.modifiers,
+            )
+            for item in OrderItem.objects.filter(order_id__in=order_ids)
+        )
+        ArchivedPayment.objects.bulk_create(
+            ArchivedPayment(
+                id=payment.id,
+                user_id=payment.user_id,
+                order_id=payment.order_id,
+                amount=payment.amount,
+                stripe_payment_intent_id=payment.stripe_payment_intent_id,
+                status=payment.status,
+                created_at=payment.created_at,
+            )
+            for payment in Payment.objects.filter(order_id__in=order_ids)
+        )
+
+        delete_rows(Payment, Payment._meta.get_field("order").column, order_ids)
+        delete_rows(OrderItem, OrderItem._meta.get_field("order").column, order_ids)
+        delete_rows(Order, Order._meta.pk.column, order_ids)
+    return len(order_ids)
+
+
+def archive_orders(days=None, batch_size=500, max_batches=None):
+    """
+    Archive finished orders in batches until none are left, or until
+    `max_batches` batches have been moved.
+
+    Returns:
+        int: The total number of orders archived.
+    """
+    cutoff = archive_cutoff(days)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        batches += 1
+    return total
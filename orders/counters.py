@@ -0,0 +1,85 @@
+"""
+Per-restaurant, per-day order status counters for the owner dashboard.
+
+Each counter holds how many of a restaurant's orders placed on a given local
+day are currently in a given status. Creating an order adds one to its
+status, a status change moves one from the old status to the new one and a
+delete takes one away. Counters are changed with UPDATE ... SET count =
+count + n, so concurrent requests never lose an increment.
+"""
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, Order, OrderStatusCounter
+
+
+def order_day(order_date):
+    return timezone.localdate(order_date)
+
+
+def bump(restaurant_id, day, status, delta):
+    """
+    Add `delta` to one counter, creating it on first use.
+    """
+    lookup = {"restaurant_id": restaurant_id, "day": day, "status": status}
+    if OrderStatusCounter.objects.filter(**lookup).update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            OrderStatusCounter.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Created concurrently since the update above
+        OrderStatusCounter.objects.filter(**lookup).update(count=F("count") + delta)
+
+
+def bump_many(deltas):
+    """
+    Apply a {(restaurant_id, day, status): delta} mapping of changes.
+    """
+    for (restaurant_id, day, status), delta in deltas.items():
+        if delta:
+            bump(restaurant_id, day, status, delta)
+
+
+def status_change_deltas(rows, new_status):
+    """
+    Return the counter changes for moving orders to `new_status`, from
+    (restaurant_id, order_date, old status) rows.
+    """
+    deltas = Counter()
+    for restaurant_id, order_date, old_status in rows:
+        day = order_day(order_date)
+        deltas[(restaurant_id, day, old_status)] -= 1
+        deltas[(restaurant_id, day, new_status)] += 1
+    return deltas
+
+
+def rebuild_counters(day):
+    """
+    Recount every restaurant's counters for one day from the live and
+    archived orders.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    counts = Counter()
+    for model in (Order, ArchivedOrder):
+        rows = (
+            model.objects.filter(order_date__gte=start, order_date__lt=end)
+            .values_list("restaurant_id", "status")
+            .annotate(count=Count("id"))
+        )
+        for restaurant_id, status, count in rows:
+            counts[(restaurant_id, status)] += count
+    with transaction.atomic():
+        OrderStatusCounter.objects.filter(day=day).delete()
+        OrderStatusCounter.objects.bulk_create(
+            OrderStatusCounter(
+                restaurant_id=restaurant_id, day=day, status=status, count=count
+            )
+            for (restaurant_id, status), count in counts.items()
+        )
@@ -0,0 +1,95 @@
+"""
+Order change feed.
+
+Every create, status change and delete of an order, and every item added to
+or removed from one, is appended to the OrderEvent table by the receivers in
+orders/signals.py. Clients sync by asking for the events after the last
+event ID they saw.
+
+Events older than ORDER_EVENT_RETENTION_DAYS are deleted by compaction, which
+always keeps the newest event. Since event IDs increase with time, every
+deleted event has a lower ID than every remaining one, so a cursor from
+before the oldest remaining event may have missed changes.
+
+Event IDs are assigned at insert time, so an event from a transaction that
+commits late can become visible after a higher ID has already been read. The
+feed therefore only serves events older than ORDER_EVENT_SETTLE_SECONDS, and
+stops at the first newer one: an event is only skipped if its transaction
+stayed open for longer than that.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from orders.models import OrderEvent
+
+
+def settle_horizon():
+    """
+    Return the time before which all events are assumed to be committed.
+    """
+    return timezone.now() - timedelta(seconds=settings.ORDER_EVENT_SETTLE_SECONDS)
+
+
+def events_after(restaurant_ids, cursor, limit):
+    """
+    Return up to `limit` settled events after `cursor` for the given
+    restaurants, and whether there are more.
+    """
+    events = list(
+        OrderEvent.objects.filter(
+            restaurant_id__in=restaurant_ids, id__gt=cursor
+        ).order_by("id")[: limit + 1]
+    )
+    horizon = settle_horizon()
+    for index, event in enumerate(events):
+        if event.created_at >= horizon:
+            # Later events wait for the next sync, after this one
+            return events[:index], False
+    return events[:limit], len(events) > limit
+
+
+def latest_cursor():
+    """
+    Return the ID of the newest settled event, to start syncing from now on.
+    """
+    unsettled = OrderEvent.objects.filter(created_at__gte=settle_horizon()).aggregate(
+        first=Min("id")
+    )["first"]
+    if unsettled is not None:
+        return unsettled - 1
+    return OrderEvent.objects.aggregate(latest=Max("id"))["latest"] or 0
+
+
+def is_cursor_expired(cursor):
+    """
+    Whether events after `cursor` may have been removed by compaction.
+    """
+    oldest = OrderEvent.objects.aggregate(oldest=Min("id"))["oldest"]
+    return oldest is not None and cursor < oldest - 1
+
+
+def compact_order_events(days=None, batch_size=5000):
+    """
+    Delete events older than the retention period, in batches.
+
+    Returns:
+        int: The number of events deleted.
+    """
+    if days is None:
+        days = settings.ORDER_EVENT_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    newest = latest_cursor()
+    deleted = 0
+    while True:
+        ids = list(
+            OrderEvent.objects.filter(created_at__lt=cutoff, id__lt=newest)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += OrderEvent.objects.filter(id__in=ids).delete()[0]
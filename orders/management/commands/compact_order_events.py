@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.events import compact_order_events
+
+
+class Command(BaseCommand):
+    help = "Delete order change feed events older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ORDER_EVENT_RETENTION_DAYS,
+            help="Keep events from the last this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = compact_order_events(
+            days=options["days"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} order events."))
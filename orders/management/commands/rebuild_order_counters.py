@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the dashboard order status counters from the Order table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=1,
+            help="Rebuild this many days, ending today.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        for offset in range(options["days"]):
+            rebuild_counters(today - timedelta(days=offset))
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt counters for {options['days']} days.")
+        )
@@ -9,6 +9,9 @@ ORDER_STATUS = [
     ("cancelled", "Cancelled"),
 ]
 
+# Orders in these statuses never change again and can be archived
+TERMINAL_ORDER_STATUSES = ["completed", "cancelled"]
+
 
 class Order(models.Model):
     restaurant = models.ForeignKey(
@@ -19,9 +22,30 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=ORDER_STATUS, default="pending")
 
+    class Meta:
+        indexes = [
+            # Admin date drill-down and status filter
+            models.Index(fields=["order_date"]),
+            models.Index(fields=["status", "order_date"]),
+            # Order list filters, see api/filters.py
+            models.Index(fields=["restaurant", "order_date"]),
+            models.Index(fields=["restaurant", "status", "order_date"]),
+            models.Index(fields=["restaurant", "total"]),
+            models.Index(fields=["customer", "order_date"]),
+            models.Index(fields=["customer", "status", "order_date"]),
+        ]
+
     def __str__(self):
         return f"{self.customer.username} - {self.restaurant.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that saves can tell whether the status changed
+        if "status" in field_names:
+            instance._loaded_status = instance.status
+        return instance
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -30,6 +54,122 @@ class OrderItem(models.Model):
     )
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
+    # The chosen modifiers as they were when ordered, as a list of
+    # {"id", "group", "name", "price"}; see restaurants/modifiers.py
+    modifiers = models.JSONField(default=list, blank=True)
+    # Whether the line holds stock of its menu item, taken when the order was
+    # placed; cleared once the stock is put back, see restaurants/inventory.py
+    stock_reserved = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f"{self.order.customer.username} - {self.menu_item.name}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A completed or cancelled order moved out of the live Order table.
+
+    Archived rows keep the primary key they had in the live table.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="archived_orders"
+    )
+    customer = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="archived_orders"
+    )
+    order_date = models.DateTimeField()
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=ORDER_STATUS)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["restaurant", "order_date"]),
+            models.Index(fields=["customer", "order_date"]),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder, on_delete=models.CASCADE, related_name="items"
+    )
+    menu_item = models.ForeignKey(
+        MenuItem,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="archived_order_items",
+    )
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    modifiers = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"Archived order item {self.id}"
+
+
+ORDER_EVENT_KINDS = [
+    ("order_created", "Order created"),
+    ("order_status", "Order status changed"),
+    ("order_deleted", "Order deleted"),
+    ("item_added", "Item added"),
+    ("item_removed", "Item removed"),
+]
+
+
+class OrderEvent(models.Model):
+    """
+    An entry of the append-only order change feed.
+
+    Events reference orders and items by ID only, so they outlive the rows
+    they describe. Their IDs increase monotonically and serve as sync cursors.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="order_events",
+    )
+    order_id = models.BigIntegerField()
+    order_item_id = models.BigIntegerField(blank=True, null=True)
+    kind = models.CharField(max_length=20, choices=ORDER_EVENT_KINDS)
+    status = models.CharField(max_length=20, choices=ORDER_STATUS, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["restaurant", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for order {self.order_id}"
+
+
+class OrderStatusCounter(models.Model):
+    """
+    Number of a restaurant's orders placed on `day` that are in `status`.
+
+    Kept up to date by the receivers in orders/signals.py, see
+    orders/counters.py.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="status_counters"
+    )
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=ORDER_STATUS)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("restaurant", "day", "status")
+
+    def __str__(self):
+        return f"{self.restaurant_id} {self.day} {self.status}: {self.count}"
@@ -0,0 +1,91 @@
+"""
+In-process notification of order status changes.
+
+Long-poll requests wait on the notifier instead of querying the database
+repeatedly. The receivers in orders/signals.py, and bulk updates that skip
+signals, call notify() once the change is committed, which wakes every
+request of this process waiting on the order.
+
+Changes committed by other processes are not seen here; waiting requests
+read the status again when they time out.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+# Passed to waiters when the order was deleted
+DELETED = None
+
+
+class Waiter:
+    """
+    A request waiting for an order to change, in its event loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+
+    def wake(self, status):
+        try:
+            self.loop.call_soon_threadsafe(self.resolve, status)
+        except RuntimeError:
+            pass  # The loop has closed, the request is gone
+
+    def resolve(self, status):
+        if not self.future.done():
+            self.future.set_result(status)
+
+    async def wait(self, timeout):
+        """
+        Return the new status, or raise TimeoutError after `timeout` seconds.
+        """
+        return await asyncio.wait_for(asyncio.shield(self.future), timeout)
+
+
+class OrderStatusNotifier:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = defaultdict(set)
+
+    def subscribe(self, order_id):
+        """
+        Return a Waiter woken by the next change of the order. Must be called
+        from a coroutine, and before reading the current status so that no
+        change goes unnoticed.
+        """
+        waiter = Waiter()
+        with self.lock:
+            self.waiters[order_id].add(waiter)
+        return waiter
+
+    def unsubscribe(self, order_id, waiter):
+        with self.lock:
+            waiters = self.waiters.get(order_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self.waiters[order_id]
+
+    def notify(self, order_id, status):
+        self.notify_many([order_id], status)
+
+    def notify_many(self, order_ids, status):
+        with self.lock:
+            if not self.waiters:
+                return
+            woken = [
+                waiter
+                for order_id in order_ids
+                for waiter in self.waiters.pop(order_id, ())
+            ]
+        for waiter in woken:
+            waiter.wake(status)
+
+    def waiting(self):
+        with self.lock:
+            return sum(len(waiters) for waiters in self.waiters.values())
+
+
+notifier = OrderStatusNotifier()
@@ -0,0 +1,148 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from orders.counters import bump, order_day
+from orders.models import Order, OrderEvent, OrderItem
+from orders.notifier import DELETED, notifier
+from restaurants.inventory import release_held_stock
+from restaurants.models import Menu, MenuItem, Restaurant
+from restaurants.signals import origin_model
+from restaurants.trending import tracker
+
+
+def order_restaurant_id(item):
+    """
+    Return the restaurant of an item's order. Uses the order when it is
+    already loaded, as when the item was created with it, and otherwise
+    reads only its restaurant_id, once per item.
+    """
+    if OrderItem.order.is_cached(item):
+        return item.order.restaurant_id
+    if not hasattr(item, "_restaurant_id"):
+        item._restaurant_id = (
+            Order.objects.filter(pk=item.order_id)
+            .values_list("restaurant_id", flat=True)
+            .first()
+        )
+    return item._restaurant_id
+
+
+@receiver(post_save, sender=OrderItem)
+def count_trending_item(sender, instance, created, **kwargs):
+    """
+    Count newly ordered items towards their restaurant's trending items,
+    once the order is committed.
+    """
+    if not created:
+        return
+    restaurant_id = order_restaurant_id(instance)
+    transaction.on_commit(
+        lambda: tracker.record(restaurant_id, instance.menu_item_id, instance.quantity)
+    )
+
+
+# Connected before log_order_saved, which moves _loaded_status on, as is
+# notify_status_change
+@receiver(post_save, sender=Order)
+def release_cancelled_stock(sender, instance, created, **kwargs):
+    """
+    Put back the stock held by an order's items when it is cancelled.
+    Reopening a cancelled order does not take the stock again, so the API
+    refuses to.
+    """
+    if created or instance.status != "cancelled":
+        return
+    if getattr(instance, "_loaded_status", None) == "cancelled":
+        return
+    release_held_stock(instance.items.all())
+
+
+@receiver(pre_delete, sender=OrderItem)
+def release_deleted_stock(sender, instance, origin=None, **kwargs):
+    """
+    Put back the stock held by an order line that is deleted, on its own or
+    along with its order. Nothing is put back when the menu item goes too.
+    """
+    if not instance.stock_reserved:
+        return
+    if origin_model(origin) in (Restaurant, Menu, MenuItem):
+        return
+    release_held_stock(OrderItem.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Order)
+def notify_status_change(sender, instance, created, **kwargs):
+    """
+    Wake the requests tracking the order once its new status is committed.
+    """
+    if created or instance.status == getattr(instance, "_loaded_status", None):
+        return
+    order_id, status = instance.id, instance.status
+    transaction.on_commit(lambda: notifier.notify(order_id, status))
+
+
+@receiver(post_save, sender=Order)
+def log_order_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_loaded_status", None)
+    day = order_day(instance.order_date)
+    if created:
+        kind = "order_created"
+    elif instance.status != previous:
+        kind = "order_status"
+        if previous is not None:
+            bump(instance.restaurant_id, day, previous, -1)
+    else:
+        return
+    bump(instance.restaurant_id, day, instance.status, 1)
+    instance._loaded_status = instance.status
+    OrderEvent.objects.create(
+        restaurant_id=instance.restaurant_id,
+        order_id=instance.id,
+        kind=kind,
+        status=instance.status,
+    )
+
+
+@receiver(post_delete, sender=Order)
+def notify_order_deleted(sender, instance, **kwargs):
+    order_id = instance.id
+    transaction.on_commit(lambda: notifier.notify(order_id, DELETED))
+
+
+@receiver(post_delete, sender=Order)
+def log_order_deleted(sender, instance, origin=None, **kwargs):
+    # Nobody is left to sync a deleted restaurant's orders
+    if origin_model(origin) is Restaurant:
+        return
+    bump(instance.restaurant_id, order_day(instance.order_date), instance.status, -1)
+    OrderEvent.objects.create(
+        restaurant_id=instance.restaurant_id,
+        order_id=instance.id,
+        kind="order_deleted",
+        status=instance.status,
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def log_item_added(sender, instance, created, **kwargs):
+    if created:
+        OrderEvent.objects.create(
+            restaurant_id=order_restaurant_id(instance),
+            order_id=instance.order_id,
+            order_item_id=instance.id,
+            kind="item_added",
+        )
+
+
+@receiver(post_delete, sender=OrderItem)
+def log_item_removed(sender, instance, origin=None, **kwargs):
+    # Items deleted along with their order are covered by "order_deleted"
+    if origin_model(origin) is not OrderItem:
+        return
+    OrderEvent.objects.create(
+        restaurant_id=order_restaurant_id(instance),
+        order_id=instance.order_id,
+        order_item_id=instance.id,
+        kind="item_removed",
+    )
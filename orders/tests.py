@@ -1,3 +1,390 @@
-from django.test import TestCase
+import itertools
+import re
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from accounts.models import User
+from api.filters import OrderFilterBackend, OrderOrderingFilter
+from api.serializers.orders import OrderSerializer
+from orders.archive import archive_orders
+from orders.counters import order_day, rebuild_counters
+from orders.events import events_after, latest_cursor
+from orders.models import (
+    ArchivedOrder,
+    ArchivedOrderItem,
+    Order,
+    OrderEvent,
+    OrderItem,
+    OrderStatusCounter,
+)
+from payments.models import ArchivedPayment, Payment
+from restaurants.inventory import release_held_stock
+from restaurants.models import Menu, MenuItem, Restaurant
+
+
+class OrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", role="owner")
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name="R", address="a", phone_number="+12025550123"
+        )
+        cls.customer = User.objects.create_user(
+            "customer",
+            "customer@example.com",
+            role="customer",
+            restaurant=cls.restaurant,
+        )
+        cls.menu = Menu.objects.create(
+            restaurant=cls.restaurant, name="Menu", description="d"
+        )
+        cls.item = MenuItem.objects.create(
+            menu=cls.menu, name="Burger", description="d", price="5.00"
+        )
+
+    def make_order(self, status="pending", items=1, quantity=1):
+        order = Order.objects.create(
+            restaurant=self.restaurant,
+            customer=self.customer,
+            total="10.00",
+            status=status,
+        )
+        for _ in range(items):
+            OrderItem.objects.create(
+                order=order, menu_item=self.item, quantity=quantity, price="5.00"
+            )
+        return order
+
+    def counters(self):
+        return dict(
+            OrderStatusCounter.objects.values_list("status", "count").filter(
+                count__gt=0
+            )
+        )
+
+
+class CounterTests(OrderTestCase):
+    def test_follow_creates_status_changes_and_deletes(self):
+        order = self.make_order()
+        self.make_order()
+        self.assertEqual(self.counters(), {"pending": 2})
+        order.status = "completed"
+        order.save()
+        self.assertEqual(self.counters(), {"pending": 1, "completed": 1})
+        order.delete()
+        self.assertEqual(self.counters(), {"pending": 1})
+
+    def test_rebuild_matches_live_counters(self):
+        self.make_order()
+        self.make_order("cancelled")
+        live = self.counters()
+        OrderStatusCounter.objects.update(count=7)
+        rebuild_counters(timezone.localdate())
+        self.assertEqual(self.counters(), live)
+
+
+class StockTests(OrderTestCase):
+    def setUp(self):
+        MenuItem.objects.filter(id=self.item.id).update(stock=10)
+
+    def stock(self):
+        return MenuItem.objects.values_list("stock", flat=True).get(id=self.item.id)
+
+    def test_cancelling_puts_back_only_held_stock(self):
+        order = self.make_order(quantity=3)
+        order.items.update(stock_reserved=True)
+        # Added later without a reservation, like through the order items API
+        OrderItem.objects.create(
+            order=order, menu_item=self.item, quantity=2, price="5.00"
+        )
+        order.status = "cancelled"
+        order.save()
+        self.assertEqual(self.stock(), 13)
+        self.assertFalse(order.items.filter(stock_reserved=True).exists())
+
+    def test_stock_is_put_back_once(self):
+        order = self.make_order(quantity=3)
+        order.items.update(stock_reserved=True)
+        for status in ("cancelled", "pending", "cancelled"):
+            order.status = status
+            order.save()
+        release_held_stock(order.items.all())
+        self.assertEqual(self.stock(), 13)
+
+    def test_deleting_puts_back_held_stock(self):
+        order = self.make_order(quantity=3, items=2)
+        order.items.update(stock_reserved=True)
+        order.items.first().delete()
+        self.assertEqual(self.stock(), 13)
+        order.delete()
+        self.assertEqual(self.stock(), 16)
+
+    def test_deleted_menu_items_get_nothing_back(self):
+        order = self.make_order(quantity=3)
+        order.items.update(stock_reserved=True)
+        with mock.patch("orders.signals.release_held_stock") as release:
+            self.item.delete()
+        release.assert_not_called()
+
+
+class ArchiveTests(OrderTestCase):
+    def make_old_orders(self, count):
+        orders = [self.make_order("completed", items=3) for _ in range(count)]
+        for order in orders:
+            Payment.objects.create(
+                user=self.customer,
+                order=order,
+                amount="10.00",
+                stripe_payment_intent_id=f"pi_{order.id}",
+            )
+        Order.objects.filter(id__in=[order.id for order in orders]).update(
+            order_date=timezone.now() - timedelta(days=400)
+        )
+        return orders
+
+    def test_moves_orders_items_and_payments(self):
+        self.make_old_orders(2)
+        recent = self.make_order("completed")
+
+        self.assertEqual(archive_orders(), 2)
+        self.assertEqual(list(Order.objects.values_list("id", flat=True)), [recent.id])
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 6)
+        self.assertEqual(ArchivedPayment.objects.count(), 2)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_leaves_events_counters_and_trackers_alone(self):
+        self.make_old_orders(5)
+        events = OrderEvent.objects.count()
+        counters = self.counters()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            archive_orders()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(OrderEvent.objects.count(), events)
+        self.assertEqual(self.counters(), counters)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        self.make_old_orders(1)
+        with CaptureQueriesContext(connection) as one:
+            archive_orders()
+        self.make_old_orders(5)
+        with CaptureQueriesContext(connection) as five:
+            archive_orders()
+        self.assertEqual(len(five), len(one))
+
+    def test_rebuilt_counters_include_archived_orders(self):
+        [order] = self.make_old_orders(1)
+        order.refresh_from_db()
+        archive_orders()
+        rebuild_counters(order_day(order.order_date))
+        self.assertEqual(
+            OrderStatusCounter.objects.get(day=order_day(order.order_date)).count, 1
+        )
+
+
+class OrderAdminTests(OrderTestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        for url in ("/admin/orders/order/", "/admin/orders/orderitem/"):
+            with self.subTest(url=url):
+                self.make_order()
+                one = self.changelist_queries(url)
+                for _ in range(5):
+                    self.make_order()
+                self.assertEqual(self.changelist_queries(url), one)
+
+
+class ChangeFeedTests(OrderTestCase):
+    def age_events(self, seconds):
+        OrderEvent.objects.update(
+            created_at=timezone.now() - timedelta(seconds=seconds)
+        )
+
+    def test_withholds_events_until_they_settle(self):
+        self.make_order()
+        self.age_events(60)
+        settled = list(OrderEvent.objects.values_list("id", flat=True))
+        self.make_order()
+
+        events, has_more = events_after([self.restaurant.id], 0, 100)
+        self.assertEqual([event.id for event in events], settled)
+        self.assertFalse(has_more)
+        self.assertEqual(latest_cursor(), settled[-1])
+
+        self.age_events(60)
+        events, _ = events_after([self.restaurant.id], settled[-1], 100)
+        self.assertEqual(len(events), 2)
+
+    def test_item_events_do_not_load_the_order(self):
+        order = self.make_order(items=0)
+        with CaptureQueriesContext(connection) as queries:
+            OrderItem.objects.create(
+                order=order, menu_item=self.item, quantity=1, price="5.00"
+            )
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(selects, [])
+
+        item = OrderItem.objects.get(order=order)
+        with CaptureQueriesContext(connection) as queries:
+            item.delete()
+        order_selects = [q["sql"] for q in queries if '"orders_order"' in q["sql"]]
+        self.assertEqual(len(order_selects), 1)
+        self.assertNotIn('"orders_order"."total"', order_selects[0])
+
+
+class QueryPlanTests(OrderTestCase):
+    """
+    EXPLAIN the order list query for each scope, combination of up to two
+    filters and ordering, none of which may scan the whole Order table.
+    """
+
+    filters = {
+        "status": {"status": "pending"},
+        "statuses": {"status": "pending,in_progress"},
+        "customer": {"customer": "1"},
+        "restaurant": {"restaurant": "1"},
+        "total": {"total_min": "5", "total_max": "50"},
+        "date": {"date_from": True},
+    }
+    orderings = ["", "total", "-order_date"]
+    full_scan = {
+        "sqlite": re.compile(r"SCAN orders_order(?! USING)"),
+        "postgresql": re.compile(r"Seq Scan on orders_order"),
+        "mysql": re.compile(r"\bALL\b"),
+    }
+
+    def scopes(self):
+        # As applied by the order endpoints before any filter
+        return {
+            "employee": Order.objects.filter(restaurant=self.restaurant),
+            "owner": Order.objects.filter(restaurant__owner=self.owner),
+            "customer": Order.objects.filter(customer=self.customer),
+        }
+
+    def build_queryset(self, scope, combo, ordering):
+        params = {}
+        for name in combo:
+            params.update(self.filters[name])
+        date_from = params.pop("date_from", None)
+        if ordering:
+            params["ordering"] = ordering
+        request = Request(RequestFactory().get("/", params))
+
+        queryset = OrderFilterBackend().filter_queryset(request, scope, None)
+        if date_from:
+            queryset = queryset.filter(
+                order_date__gte=timezone.now() - timedelta(days=7)
+            )
+        queryset = OrderOrderingFilter().filter_queryset(request, queryset, None)
+        # Like the first page of a paginated list
+        return queryset[:50]
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # An empty table is cheapest to scan; ask whether an index is
+                # usable at all
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            return "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+
+    def test_order_lists_use_an_index(self):
+        pattern = self.full_scan.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f"No plan check for {connection.vendor}.")
+        combinations = [
+            combo
+            for size in range(3)
+            for combo in itertools.combinations(self.filters, size)
+        ]
+        for (scope, queryset), combo, ordering in itertools.product(
+            self.scopes().items(), combinations, self.orderings
+        ):
+            with self.subTest(scope=scope, filters=combo, ordering=ordering):
+                plan = self.explain(self.build_queryset(queryset, combo, ordering))
+                self.assertNotRegex(plan, pattern)
+
+
+class StockContentionTests(TransactionTestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner", "owner@example.com", role="owner")
+        self.restaurant = Restaurant.objects.create(
+            owner=owner, name="R", address="a", phone_number="+12025550123"
+        )
+        self.customer = User.objects.create_user(
+            "customer",
+            "customer@example.com",
+            role="customer",
+            restaurant=self.restaurant,
+        )
+        menu = Menu.objects.create(
+            restaurant=self.restaurant, name="M", description="d"
+        )
+        self.item = MenuItem.objects.create(
+            menu=menu, name="Burger", description="d", price="5.00", stock=5
+        )
+
+    def place_order(self, barrier, results):
+        data = {
+            "restaurant": self.restaurant.id,
+            "customer": self.customer.id,
+            "total": "10.00",
+            "items": [{"menu_item": self.item.id, "quantity": 2, "price": "5.00"}],
+        }
+        barrier.wait()
+        try:
+            # SQLite's shared test database refuses, rather than waits for,
+            # a writer while another one holds the lock
+            for _ in range(100):
+                serializer = OrderSerializer(data=data)
+                try:
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+                except OperationalError:
+                    time.sleep(0.01)
+                    continue
+                except ValidationError:
+                    results.append("out of stock")
+                    return
+                results.append("placed")
+                return
+        finally:
+            connections.close_all()
+
+    def test_concurrent_orders_never_oversell(self):
+        workers = 8
+        barrier = threading.Barrier(workers)
+        results = []
+        threads = [
+            threading.Thread(target=self.place_order, args=(barrier, results))
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), ["out of stock"] * 6 + ["placed"] * 2)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.stock, 1)
+        self.assertEqual(sum(OrderItem.objects.values_list("quantity", flat=True)), 4)
@@ -1,6 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from project.paginator import EstimatedCountPaginator
 from .models import Payment
 
-admin.site.register(Payment)
\ No newline at end of file
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "user", "amount", "status", "created_at")
+    list_select_related = ("order__customer", "order__restaurant", "user")
+    list_filter = ("status",)
+    date_hierarchy = "created_at"
+    search_fields = ("=stripe_payment_intent_id",)
+    raw_id_fields = ("order", "user")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
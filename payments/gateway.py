@@ -0,0 +1,331 @@
+"""
+Payment gateway backends.
+
+Code that talks to the payment provider goes through the gateway returned by
+get_gateway(), configured with the PAYMENT_GATEWAY setting. Payment intents
+are returned as mappings with at least "id", "status", "amount" (in cents)
+and "currency" keys, whichever backend produced them.
+"""
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from functools import cached_property, lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from project.tracing import span
+
+
+class GatewayError(Exception):
+    """
+    Base class for errors raised by gateway backends.
+    """
+
+
+class GatewayUnavailable(GatewayError):
+    """
+    The provider could not be reached in time, or the circuit is open.
+
+    `retry_after` is the number of seconds until the circuit lets calls
+    through again, when known.
+    """
+
+    def __init__(self, message="", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InvalidSignature(GatewayError):
+    """
+    A webhook payload did not carry a valid signature.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the provider is down.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are refused for `reset_timeout` seconds. The first call after that is let
+    through as a trial: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial:
+                return False
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def retry_after(self):
+        """
+        Seconds until the next trial call is allowed.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            return max(0, int(remaining + 1))
+
+
+class PaymentGateway:
+    """
+    Interface implemented by every payment gateway backend.
+    """
+
+    def create_payment_intent(self, amount, currency, metadata=None):
+        """
+        Create a payment intent for `amount` cents and return it. The intent
+        carries a "client_secret" key for the client-side confirmation.
+        """
+        raise NotImplementedError
+
+    def construct_event(self, payload, signature):
+        """
+        Verify a webhook payload against its signature header and return the
+        event as a mapping. Raises ValueError for a malformed payload and
+        InvalidSignature for a bad signature.
+        """
+        raise NotImplementedError
+
+    def retrieve_payment_intent(self, intent_id):
+        """
+        Return the payment intent with the given ID, or None if the provider
+        does not know it.
+        """
+        raise NotImplementedError
+
+    def list_payment_intents(self, starting_after=None, limit=100):
+        """
+        Return a page of payment intents as a (intents, has_more) tuple.
+
+        Pages are continued by passing the ID of the last intent of the
+        previous page as `starting_after`.
+        """
+        raise NotImplementedError
+
+
+class StripeGateway(PaymentGateway):
+    """
+    Gateway backed by the Stripe API.
+
+    Every call has a deadline of `timeout` seconds and goes through a circuit
+    breaker, so a slow or failing provider cannot hold on to every worker.
+    HTTP connections are kept alive and reused by each worker thread.
+    """
+
+    def __init__(
+        self,
+        api_key=None,
+        webhook_secret=None,
+        timeout=10,
+        max_network_retries=0,
+        failure_threshold=5,
+        reset_timeout=30,
+    ):
+        self.api_key = api_key or settings.STRIPE_SECRET_KEY
+        self.webhook_secret = webhook_secret or settings.STRIPE_WEBHOOK_SECRET
+        self.timeout = timeout
+        self.max_network_retries = max_network_retries
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    @property
+    def stripe(self):
+        # Imported on first use, as the SDK is large and most workers never call it.
+        import stripe
+
+        return stripe
+
+    @cached_property
+    def client(self):
+        return self.stripe.StripeClient(
+            self.api_key,
+            http_client=self.stripe.RequestsClient(timeout=self.timeout),
+            max_network_retries=self.max_network_retries,
+        )
+
+    def call(self, method, *args, **kwargs):
+        """
+        Run an SDK call through the circuit breaker.
+
+        Connection errors, timeouts and provider-side errors count as
+        failures and surface as GatewayUnavailable. Errors caused by the
+        request itself, such as an unknown ID, are raised unchanged.
+        """
+        if not self.breaker.allow():
+            raise GatewayUnavailable(
+                "The payment provider is unavailable.",
+                retry_after=self.breaker.retry_after(),
+            )
+        try:
+            with span("stripe.call", method=method.__qualname__):
+                result = method(*args, **kwargs)
+        except (
+            self.stripe.error.APIConnectionError,
+            self.stripe.error.APIError,
+            self.stripe.error.RateLimitError,
+        ) as e:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(
+                str(e), retry_after=self.breaker.retry_after() or None
+            ) from e
+        except Exception:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def create_payment_intent(self, amount, currency, metadata=None):
+        params = {"amount": amount, "currency": currency}
+        if metadata:
+            params["metadata"] = metadata
+        return self.call(self.client.payment_intents.create, params=params)
+
+    def construct_event(self, payload, signature):
+        try:
+            return self.client.construct_event(payload, signature, self.webhook_secret)
+        except self.stripe.error.SignatureVerificationError as e:
+            raise InvalidSignature(str(e)) from e
+
+    def retrieve_payment_intent(self, intent_id):
+        try:
+            return self.call(self.client.payment_intents.retrieve, intent_id)
+        except self.stripe.error.InvalidRequestError as e:
+            if e.http_status == 404:
+                return None
+            raise
+
+    def list_payment_intents(self, starting_after=None, limit=100):
+        params = {"limit": limit}
+        if starting_after:
+            params["starting_after"] = starting_after
+        page = self.call(self.client.payment_intents.list, params=params)
+        return page.data, page.has_more
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-process gateway for tests, benchmarks and offline runs.
+
+    Intents are kept in memory in insertion order. They can be added one by
+    one, created through the API or loaded from a newline-delimited JSON file.
+    `latency` adds a delay in seconds to each call, to stand in for the
+    network. Webhook signatures are an HMAC-SHA256 of the payload with
+    `webhook_secret`, see sign().
+    """
+
+    def __init__(self, intents=None, path=None, latency=0, webhook_secret="fake"):
+        self.latency = latency
+        self.webhook_secret = webhook_secret
+        self._intents = {}
+        self._ids = []
+        self._positions = {}
+        self._lock = threading.Lock()
+        for intent in intents or ():
+            self.add(intent)
+        if path:
+            self.load(path)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add(self, intent):
+        with self._lock:
+            if intent["id"] not in self._intents:
+                self._positions[intent["id"]] = len(self._ids)
+                self._ids.append(intent["id"])
+            self._intents[intent["id"]] = dict(intent)
+
+    def load(self, path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    self.add(json.loads(line))
+
+    def sign(self, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        return hmac.new(
+            self.webhook_secret.encode(), payload, hashlib.sha256
+        ).hexdigest()
+
+    def create_payment_intent(self, amount, currency, metadata=None):
+        self.wait()
+        intent_id = f"pi_fake_{uuid.uuid4().hex}"
+        intent = {
+            "id": intent_id,
+            "amount": amount,
+            "currency": currency,
+            "status": "requires_payment_method",
+            "client_secret": f"{intent_id}_secret",
+            "metadata": dict(metadata or {}),
+        }
+        self.add(intent)
+        return dict(intent)
+
+    def construct_event(self, payload, signature):
+        event = json.loads(payload)
+        if not hmac.compare_digest(signature or "", self.sign(payload)):
+            raise InvalidSignature("Invalid signature.")
+        return event
+
+    def retrieve_payment_intent(self, intent_id):
+        self.wait()
+        intent = self._intents.get(intent_id)
+        return dict(intent) if intent is not None else None
+
+    def list_payment_intents(self, starting_after=None, limit=100):
+        self.wait()
+        start = 0
+        if starting_after is not None:
+            start = self._positions[starting_after] + 1
+        ids = self._ids[start : start + limit]
+        has_more = start + limit < len(self._ids)
+        return [dict(self._intents[intent_id]) for intent_id in ids], has_more
+
+
+def load_gateway(config):
+    """
+    Build a gateway from a {"BACKEND": dotted path, "OPTIONS": kwargs} mapping.
+    """
+    backend = import_string(config["BACKEND"])
+    return backend(**config.get("OPTIONS", {}))
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    """
+    Return the gateway configured by the PAYMENT_GATEWAY setting.
+    """
+    return load_gateway(settings.PAYMENT_GATEWAY)
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.gateway import FakeGateway, get_gateway
+from payments.reconcile import PaymentReconciler
+
+
+class Command(BaseCommand):
+    help = "Find and fix Payment rows whose status drifted from the payment provider."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Maximum number of concurrent provider calls.",
+        )
+        parser.add_argument(
+            "--since-days",
+            type=int,
+            help="Only check payments created in the last N days.",
+        )
+        parser.add_argument(
+            "--scan-provider",
+            action="store_true",
+            help="Also page through the provider for intents with no local payment.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report drift without fixing it."
+        )
+        parser.add_argument(
+            "--fake",
+            metavar="PATH",
+            help="Reconcile against an in-process fake provider loaded from an "
+            "NDJSON file of payment intents.",
+        )
+
+    def handle(self, *args, **options):
+        gateway = FakeGateway(path=options["fake"]) if options["fake"] else get_gateway()
+        since = None
+        if options["since_days"] is not None:
+            since = timezone.now() - timedelta(days=options["since_days"])
+
+        reconciler = PaymentReconciler(
+            gateway,
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            since=since,
+            dry_run=options["dry_run"],
+        )
+        report = reconciler.run(scan_remote=options["scan_provider"])
+
+        verb = "Would fix" if options["dry_run"] else "Fixed"
+        self.stdout.write(f"Checked {report.checked} payments.")
+        self.stdout.write(self.style.SUCCESS(f"{verb} {report.fixed} statuses."))
+        if options["scan_provider"]:
+            self.stdout.write(f"Scanned {report.scanned_remote} provider intents.")
+            if not report.remote_complete:
+                self.stdout.write(
+                    self.style.ERROR("The provider scan stopped early: unavailable.")
+                )
+        for first, last in report.failed_chunks:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Could not check payments {first}-{last}: provider unavailable."
+                )
+            )
+        for problem, count in report.counts.items():
+            if count:
+                sample = ", ".join(report.samples[problem])
+                self.stdout.write(
+                    self.style.WARNING(f"{problem}: {count} (e.g. {sample})")
+                )
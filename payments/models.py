@@ -2,15 +2,52 @@
 from django.db import models
 from django.conf import settings
 
+PAYMENT_STATUS = [
+    ("pending", "Pending"),
+    ("succeeded", "Succeeded"),
+    ("canceled", "Canceled"),
+]
+
 
 class Payment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     order = models.ForeignKey("orders.Order", on_delete=models.CASCADE)  # ForeignKey to Order
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     stripe_payment_intent_id = models.CharField(max_length=255, unique=True)  # Ensuring uniqueness
+    status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Admin date drill-down and status filter
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Payment {self.id} for Order {self.order_id} by {self.user}"
+
+
+class ArchivedPayment(models.Model):
+    """
+    A payment moved to the archive together with its order.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_payments",
+    )
+    order = models.ForeignKey(
+        "orders.ArchivedOrder", on_delete=models.CASCADE, related_name="payments"
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    stripe_payment_intent_id = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=PAYMENT_STATUS)
+    created_at = models.DateTimeField()
+
     def __str__(self):
-        return f"Payment {self.id} for Order {self.order.id} by {self.user}"
+        return f"Archived payment {self.id} for Order {self.order_id}"
 
 
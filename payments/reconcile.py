@@ -0,0 +1,182 @@
+"""
+Reconciliation of local Payment rows against the payment provider.
+
+Local rows are read in keyset-ordered chunks of `chunk_size`. The provider
+lookups for a chunk run on a bounded thread pool while the next chunk is
+read. Status fixes for a chunk are written with a single bulk update. At most
+`max_in_flight` chunks are held at once, so memory stays bounded however many
+payments there are.
+
+When the provider is unavailable, for example because the circuit breaker is
+open, the affected chunk is recorded in the report and the run carries on
+with the next one. A remote scan stops at the page that failed, since later
+pages cannot be reached without it.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from payments.gateway import GatewayUnavailable
+from payments.models import ArchivedPayment, Payment
+
+# Provider statuses that map to a local status other than "pending"
+STATUS_MAP = {
+    "succeeded": "succeeded",
+    "canceled": "canceled",
+}
+
+
+def local_status(provider_status):
+    """
+    Map a provider payment intent status onto a local Payment status.
+    """
+    return STATUS_MAP.get(provider_status, "pending")
+
+
+class ReconcileReport:
+    """
+    Counters for a reconciliation run, with a small sample of offending
+    intent IDs for each kind of problem.
+
+    `failed_chunks` lists the (first, last) local payment IDs of each chunk
+    that could not be checked because the provider was unavailable.
+    `remote_complete` is False when a remote scan was cut short.
+    """
+
+    sample_size = 5
+
+    def __init__(self):
+        self.checked = 0
+        self.fixed = 0
+        self.scanned_remote = 0
+        self.failed_chunks = []
+        self.remote_complete = True
+        self.counts = {"missing_remote": 0, "amount_mismatch": 0, "missing_local": 0}
+        self.samples = {key: [] for key in self.counts}
+
+    def record(self, problem, intent_id):
+        self.counts[problem] += 1
+        if len(self.samples[problem]) < self.sample_size:
+            self.samples[problem].append(intent_id)
+
+
+class PaymentReconciler:
+    def __init__(
+        self,
+        gateway,
+        chunk_size=500,
+        workers=8,
+        max_in_flight=2,
+        since=None,
+        dry_run=False,
+    ):
+        self.gateway = gateway
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.since = since
+        self.dry_run = dry_run
+        self.report = ReconcileReport()
+
+    def local_chunks(self):
+        """
+        Yield chunks of (id, intent id, status, amount) tuples in ID order.
+        """
+        queryset = Payment.objects.order_by("id")
+        if self.since is not None:
+            queryset = queryset.filter(created_at__gte=self.since)
+        last_id = 0
+        while True:
+            chunk = list(
+                queryset.filter(id__gt=last_id).values_list(
+                    "id", "stripe_payment_intent_id", "status", "amount"
+                )[: self.chunk_size]
+            )
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1][0]
+
+    def apply(self, chunk, intents):
+        """
+        Compare a chunk with its provider intents and write status fixes.
+        """
+        try:
+            intents = list(intents)
+        except GatewayUnavailable:
+            self.report.failed_chunks.append((chunk[0][0], chunk[-1][0]))
+            return
+
+        fixes = []
+        for (pk, intent_id, status, amount), intent in zip(chunk, intents):
+            self.report.checked += 1
+            if intent is None:
+                self.report.record("missing_remote", intent_id)
+                continue
+            if int(amount * 100) != int(intent["amount"]):
+                self.report.record("amount_mismatch", intent_id)
+            remote_status = local_status(intent["status"])
+            if remote_status != status:
+                fixes.append(Payment(id=pk, status=remote_status))
+
+        if fixes and not self.dry_run:
+            Payment.objects.bulk_update(fixes, ["status"], batch_size=self.chunk_size)
+        self.report.fixed += len(fixes)
+
+    def reconcile_local(self):
+        """
+        Check every local payment against the provider.
+        """
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for chunk in self.local_chunks():
+                intents = pool.map(
+                    self.gateway.retrieve_payment_intent, [row[1] for row in chunk]
+                )
+                in_flight.append((chunk, intents))
+                if len(in_flight) >= self.max_in_flight:
+                    self.apply(*in_flight.popleft())
+            while in_flight:
+                self.apply(*in_flight.popleft())
+
+    def scan_remote(self, page_size=100):
+        """
+        Page through the provider's intents and count those with no local row.
+
+        Intents of archived payments are known locally too.
+        """
+        starting_after = None
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            next_page = pool.submit(
+                self.gateway.list_payment_intents, starting_after, page_size
+            )
+            while next_page is not None:
+                try:
+                    intents, has_more = next_page.result()
+                except GatewayUnavailable:
+                    self.report.remote_complete = False
+                    return
+                next_page = None
+                if has_more and intents:
+                    next_page = pool.submit(
+                        self.gateway.list_payment_intents, intents[-1]["id"], page_size
+                    )
+
+                ids = [intent["id"] for intent in intents]
+                known = set()
+                for model in (Payment, ArchivedPayment):
+                    known.update(
+                        model.objects.filter(
+                            stripe_payment_intent_id__in=ids
+                        ).values_list("stripe_payment_intent_id", flat=True)
+                    )
+                self.report.scanned_remote += len(ids)
+                for intent_id in ids:
+                    if intent_id not in known:
+                        self.report.record("missing_local", intent_id)
+
+    def run(self, scan_remote=False):
+        self.reconcile_local()
+        if scan_remote:
+            self.scan_remote()
+        return self.report
@@ -1,3 +1,248 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from orders.models import ArchivedOrder, Order
+from payments.gateway import (
+    CircuitBreaker,
+    FakeGateway,
+    GatewayUnavailable,
+    StripeGateway,
+    get_gateway,
+)
+from payments.models import ArchivedPayment, Payment
+from payments.reconcile import PaymentReconciler
+from restaurants.models import Restaurant
+
+
+class PaymentTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", "owner@example.com", role="owner")
+        cls.restaurant = Restaurant.objects.create(
+            owner=owner, name="R", address="a", phone_number="+12025550123"
+        )
+        cls.customer = User.objects.create_user(
+            "customer",
+            "customer@example.com",
+            role="customer",
+            restaurant=cls.restaurant,
+        )
+        cls.order = Order.objects.create(
+            restaurant=cls.restaurant, customer=cls.customer, total="10.00"
+        )
+
+    def make_payment(self, intent_id, amount="10.00", status="pending"):
+        return Payment.objects.create(
+            user=self.customer,
+            order=self.order,
+            amount=Decimal(amount),
+            stripe_payment_intent_id=intent_id,
+            status=status,
+        )
+
+
+class ReconcileTests(PaymentTestCase):
+    def setUp(self):
+        self.gateway = FakeGateway()
+        for i in range(5):
+            self.make_payment(f"pi_{i}")
+            self.gateway.add({"id": f"pi_{i}", "status": "succeeded", "amount": 1000})
+
+    def test_fixes_status_drift_across_chunks(self):
+        report = PaymentReconciler(self.gateway, chunk_size=2, workers=2).run()
+        self.assertEqual(report.checked, 5)
+        self.assertEqual(report.fixed, 5)
+        self.assertEqual(
+            set(Payment.objects.values_list("status", flat=True)), {"succeeded"}
+        )
+
+    def test_dry_run_writes_nothing(self):
+        report = PaymentReconciler(self.gateway, dry_run=True).run()
+        self.assertEqual(report.fixed, 5)
+        self.assertFalse(Payment.objects.filter(status="succeeded").exists())
+
+    def test_reports_mismatches(self):
+        self.make_payment("pi_local_only")
+        self.gateway.add({"id": "pi_1", "status": "succeeded", "amount": 999})
+        self.gateway.add({"id": "pi_remote_only", "status": "succeeded", "amount": 1})
+
+        report = PaymentReconciler(self.gateway, chunk_size=2).run(scan_remote=True)
+        self.assertEqual(report.counts["missing_remote"], 1)
+        self.assertEqual(report.samples["missing_remote"], ["pi_local_only"])
+        self.assertEqual(report.samples["amount_mismatch"], ["pi_1"])
+        self.assertEqual(report.samples["missing_local"], ["pi_remote_only"])
+        self.assertEqual(report.scanned_remote, 6)
+
+    def test_archived_payments_are_known_locally(self):
+        archived = ArchivedOrder.objects.create(
+            id=999,
+            restaurant=self.restaurant,
+            customer=self.customer,
+            order_date=self.order.order_date,
+            total="1.00",
+            status="completed",
+        )
+        ArchivedPayment.objects.create(
+            id=999,
+            user=self.customer,
+            order=archived,
+            amount=Decimal("1.00"),
+            stripe_payment_intent_id="pi_archived",
+            status="succeeded",
+            created_at=self.order.order_date,
+        )
+        self.gateway.add({"id": "pi_archived", "status": "succeeded", "amount": 100})
+
+        report = PaymentReconciler(self.gateway).run(scan_remote=True)
+        self.assertEqual(report.counts["missing_local"], 0)
+        self.assertEqual(report.scanned_remote, 6)
+
+    def test_unavailable_provider_skips_the_chunk(self):
+        retrieve = self.gateway.retrieve_payment_intent
+
+        def flaky(intent_id):
+            if intent_id == "pi_2":
+                raise GatewayUnavailable("down")
+            return retrieve(intent_id)
+
+        self.gateway.retrieve_payment_intent = flaky
+        report = PaymentReconciler(self.gateway, chunk_size=2).run()
+        pks = list(Payment.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual(report.failed_chunks, [(pks[2], pks[3])])
+        self.assertEqual(report.checked, 3)
+        self.assertEqual(report.fixed, 3)
+
+    def test_unavailable_provider_stops_the_remote_scan(self):
+        self.gateway.list_payment_intents = mock.Mock(
+            side_effect=GatewayUnavailable("down")
+        )
+        report = PaymentReconciler(self.gateway).run(scan_remote=True)
+        self.assertFalse(report.remote_complete)
+        self.assertEqual(report.checked, 5)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("payments.gateway.time.monotonic", return_value=0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_after(), 31)
+
+    def test_lets_one_trial_through_after_the_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.return_value = 30
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.clock.return_value = 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+
+class StripeGatewayTests(TestCase):
+    def test_provider_errors_open_the_circuit(self):
+        gateway = StripeGateway(api_key="sk_test", failure_threshold=2)
+        error = gateway.stripe.error.APIConnectionError("down")
+        failing = mock.Mock(side_effect=error, __qualname__="retrieve")
+        for _ in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.call(failing)
+        with self.assertRaises(GatewayUnavailable) as raised:
+            gateway.call(failing)
+        self.assertEqual(failing.call_count, 2)
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    def test_request_errors_do_not_count_as_failures(self):
+        gateway = StripeGateway(api_key="sk_test", failure_threshold=1)
+        error = gateway.stripe.error.InvalidRequestError("no such intent", None)
+        failing = mock.Mock(side_effect=error, __qualname__="retrieve")
+        with self.assertRaises(gateway.stripe.error.InvalidRequestError):
+            gateway.call(failing)
+        self.assertTrue(gateway.breaker.allow())
+
+
+@override_settings(
+    PAYMENT_GATEWAY={"BACKEND": "payments.gateway.FakeGateway", "OPTIONS": {}}
+)
+class PaymentViewTests(PaymentTestCase):
+    def setUp(self):
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_creates_intent_and_payment(self):
+        response = self.client.post(
+            "/create-payment-intent/",
+            {"order": self.order.id, "amount": "12.50"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        payment = Payment.objects.get()
+        self.assertEqual(payment.user, self.customer)
+        intent = get_gateway().retrieve_payment_intent(payment.stripe_payment_intent_id)
+        self.assertEqual(intent["amount"], 1250)
+        self.assertEqual(response.json()["clientSecret"], intent["client_secret"])
+
+    def test_unavailable_provider_answers_503(self):
+        unavailable = GatewayUnavailable("down", retry_after=7)
+        with mock.patch.object(
+            FakeGateway, "create_payment_intent", side_effect=unavailable
+        ):
+            response = self.client.post(
+                "/create-payment-intent/",
+                {"order": self.order.id, "amount": "12.50"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertFalse(Payment.objects.exists())
+
+    def test_webhook_marks_payment_succeeded(self):
+        payment = self.make_payment("pi_1")
+        payload = json.dumps(
+            {"type": "payment_intent.succeeded", "data": {"object": {"id": "pi_1"}}}
+        )
+        response = self.client.post(
+            "/webhook/",
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=get_gateway().sign(payload),
+        )
+        self.assertEqual(response.status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "succeeded")
+
+    def test_webhook_rejects_bad_signatures(self):
+        payment = self.make_payment("pi_1")
+        payload = json.dumps(
+            {"type": "payment_intent.succeeded", "data": {"object": {"id": "pi_1"}}}
+        )
+        response = self.client.post(
+            "/webhook/",
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE="forged",
+        )
+        self.assertEqual(response.status_code, 400)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "pending")
@@ -0,0 +1,234 @@
+"""
+Structured JSON access log for API requests.
+
+AccessLogMiddleware collects one record per request: who made it (user, role
+and restaurant), the route, status, latency and number of SQL queries. The
+request only builds a small dict and puts it on a bounded queue. A background
+thread encodes the records and writes them to ACCESS_LOG_FILE, or stdout, one
+JSON object per line.
+
+When the writer falls behind and the queue is full, requests never wait.
+ACCESS_LOG_DROP_POLICY decides which record is lost: "drop_newest" discards
+the incoming record, and "drop_oldest" makes room by discarding the oldest
+queued one. The writer logs how many records were dropped as an
+{"event": "access_log_dropped"} record.
+"""
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# [count] of the queries run for the current request, see count_queries
+query_counter = ContextVar("access_log_query_counter", default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+connection_created.connect(install_query_counter)
+
+
+class AccessLogWriter:
+    """
+    Bounded queue of access log records, drained by a daemon thread.
+    """
+
+    def __init__(self, path=None, queue_size=10000, drop_policy="drop_newest"):
+        if drop_policy not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"Unknown access log drop policy: {drop_policy}")
+        self.path = path
+        self.drop_policy = drop_policy
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def submit(self, record):
+        """
+        Queue a record without blocking, dropping one if the queue is full.
+        """
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.drop_policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        # Unlocked: a lost increment only makes the drop count approximate
+        self.dropped += 1
+
+    def start(self):
+        with self.lock:
+            # Also restarts the writer in a forked worker process
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            thread = threading.Thread(
+                target=self.run, name="access-log-writer", daemon=True
+            )
+            thread.start()
+
+    def open(self):
+        if self.path is None:
+            return sys.stdout
+        return open(self.path, "a", encoding="utf-8")
+
+    def run(self):
+        stream = self.open()
+        reported = 0
+        while True:
+            records = [self.queue.get()]
+            # Write whatever else is waiting in the same call
+            while len(records) < 1000:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            taken = len(records)
+            if self.dropped != reported:
+                records.append(
+                    {
+                        "event": "access_log_dropped",
+                        "count": self.dropped - reported,
+                        "ts": time.time(),
+                    }
+                )
+                reported = self.dropped
+            self.write(stream, records)
+            for _ in range(taken):
+                self.queue.task_done()
+
+    def write(self, stream, records):
+        lines = []
+        for record in records:
+            record["ts"] = (
+                datetime.fromtimestamp(record["ts"], timezone.utc)
+                .isoformat(timespec="milliseconds")
+                .replace("+00:00", "Z")
+            )
+            lines.append(json.dumps(record, separators=(",", ":"), default=str))
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            # A logging failure must not take the worker down
+            return
+        self.written += len(records)
+
+    def drain(self, timeout=1.0):
+        """
+        Wait up to `timeout` seconds for the queued records to be written.
+        """
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+_writer = None
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = AccessLogWriter(
+            path=settings.ACCESS_LOG_FILE,
+            queue_size=settings.ACCESS_LOG_QUEUE_SIZE,
+            drop_policy=settings.ACCESS_LOG_DROP_POLICY,
+        )
+        atexit.register(_writer.drain)
+    return _writer
+
+
+class AccessLogMiddleware:
+    """
+    Send one structured record per request to the access log writer.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ACCESS_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.writer = get_writer()
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(None, connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        counter = [0]
+        token = query_counter.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_counter.reset(token)
+        self.log(request, response, started, counter[0])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        counter = [0]
+        token = query_counter.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_counter.reset(token)
+        self.log(request, response, started, counter[0])
+        return response
+
+    def log(self, request, response, started, queries):
+        # DRF sets request.user once it authenticates the request
+        user = getattr(request, "user", None)
+        authenticated = user is not None and user.is_authenticated
+        match = request.resolver_match
+        self.writer.submit(
+            {
+                "ts": time.time(),
+                "method": request.method,
+                "path": request.path,
+                "route": match.route if match else None,
+                "view": match.view_name if match else None,
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "queries": queries,
+                "user_id": user.pk if authenticated else None,
+                "role": user.role if authenticated else None,
+                "restaurant_id": user.restaurant_id if authenticated else None,
+            }
+        )
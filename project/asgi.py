@@ -5,11 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+The application routes API requests through a shorter middleware chain than
+the admin, see project/handlers.py.
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+from project.handlers import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
 
@@ -0,0 +1,74 @@
+"""
+WSGI and ASGI entry points that pick a middleware chain by path.
+
+API requests authenticate with credentials on every call, so they have no use
+for sessions, messages, CSRF or clickjacking protection. Requests under one of
+FULL_MIDDLEWARE_PATHS (the admin) go through the full MIDDLEWARE chain, and
+everything else goes through the shorter LEAN_MIDDLEWARE chain. Both chains
+are built once, at startup.
+"""
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+
+class LeanMiddlewareMixin:
+    """
+    Build the handler's middleware chain from LEAN_MIDDLEWARE.
+    """
+
+    def load_middleware(self, is_async=False):
+        # BaseHandler reads settings.MIDDLEWARE directly, so swap it for the
+        # duration of the build. This runs once, before any request is served.
+        full = settings.MIDDLEWARE
+        settings.MIDDLEWARE = settings.LEAN_MIDDLEWARE
+        try:
+            super().load_middleware(is_async=is_async)
+        finally:
+            settings.MIDDLEWARE = full
+
+
+class LeanWSGIHandler(LeanMiddlewareMixin, WSGIHandler):
+    pass
+
+
+class LeanASGIHandler(LeanMiddlewareMixin, ASGIHandler):
+    pass
+
+
+def needs_full_middleware(path):
+    return path.startswith(tuple(settings.FULL_MIDDLEWARE_PATHS))
+
+
+class RoutedWSGIHandler:
+    def __init__(self):
+        self.full = WSGIHandler()
+        self.lean = LeanWSGIHandler()
+
+    def __call__(self, environ, start_response):
+        if needs_full_middleware(environ.get("PATH_INFO", "")):
+            return self.full(environ, start_response)
+        return self.lean(environ, start_response)
+
+
+class RoutedASGIHandler:
+    def __init__(self):
+        self.full = ASGIHandler()
+        self.lean = LeanASGIHandler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not needs_full_middleware(scope["path"]):
+            return await self.lean(scope, receive, send)
+        return await self.full(scope, receive, send)
+
+
+def get_wsgi_application():
+    django.setup(set_prefix=False)
+    return RoutedWSGIHandler()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return RoutedASGIHandler()
@@ -0,0 +1,211 @@
+"""
+Opt-in memory profiling with tracemalloc.
+
+With MEMPROFILE_ENABLED, the worker traces its Python allocations from
+startup, keeping MEMPROFILE_FRAMES frames per allocation; one frame keeps the
+overhead low enough for a canary worker, more frames give fuller tracebacks.
+MemoryProfileMiddleware measures how far each request raised the traced
+memory above where it started, and what it left allocated when it finished.
+
+/admin/memory/ shows superusers the worker's memory, the routes with the
+highest peaks and the allocation sites that grew the most since a baseline
+snapshot. The baseline is taken at startup and can be retaken from the page,
+to see what a given series of requests leaves behind.
+
+tracemalloc counts allocations of the whole process, so per-request numbers
+are exact only while the worker serves one request at a time.
+"""
+
+import heapq
+import linecache
+import os
+import threading
+import tracemalloc
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+# Allocations of the profiler itself, left out of the reports. linecache
+# holds the source lines read to format the tracebacks.
+IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+KEY_TYPES = ("lineno", "filename", "traceback")
+
+
+def current_rss():
+    """
+    Return the resident set size of the process in bytes, or None if it
+    cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.max_peak = 0
+        self.total_peak = 0
+        self.total_retained = 0
+
+    def add(self, peak, retained):
+        self.requests += 1
+        self.max_peak = max(self.max_peak, peak)
+        self.total_peak += peak
+        self.total_retained += retained
+
+
+class MemoryProfile:
+    """
+    Per-request peaks and the baseline snapshot of this worker.
+    """
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.routes = {}
+        # Min-heap of (peak, sequence, record) of the largest requests
+        self.largest = []
+        self.sequence = 0
+        self.baseline = None
+        self.baseline_time = None
+
+    def start(self, frames):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.take_baseline()
+
+    def take_baseline(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+        with self.lock:
+            self.baseline = snapshot
+            self.baseline_time = timezone.now()
+
+    def add(self, route, record):
+        with self.lock:
+            self.routes.setdefault(route, RouteStats()).add(
+                record["peak"], record["retained"]
+            )
+            self.sequence += 1
+            entry = (record["peak"], self.sequence, record)
+            if len(self.largest) < self.keep:
+                heapq.heappush(self.largest, entry)
+            elif entry > self.largest[0]:
+                heapq.heapreplace(self.largest, entry)
+
+    def top_requests(self):
+        with self.lock:
+            return [record for _, _, record in sorted(self.largest, reverse=True)]
+
+    def top_routes(self):
+        with self.lock:
+            routes = list(self.routes.items())
+        return sorted(routes, key=lambda item: item[1].max_peak, reverse=True)
+
+    def top_sites(self, key_type="lineno", limit=25):
+        """
+        Return the allocation sites that grew most since the baseline, as
+        tracemalloc StatisticDiff objects.
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+        with self.lock:
+            baseline = self.baseline
+        differences = snapshot.compare_to(baseline, key_type)
+        return [stat for stat in differences if stat.size_diff > 0][:limit]
+
+
+profile = MemoryProfile(settings.MEMPROFILE_KEEP_REQUESTS)
+
+
+class MemoryProfileMiddleware:
+    """
+    Record the peak and retained traced memory of every request.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMPROFILE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        profile.start(settings.MEMPROFILE_FRAMES)
+
+    def __call__(self, request):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        started = timezone.now()
+        response = self.get_response(request)
+        after, peak = tracemalloc.get_traced_memory()
+
+        match = request.resolver_match
+        route = match.route if match else None
+        profile.add(
+            route,
+            {
+                "time": started,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "peak": peak - before,
+                "retained": after - before,
+            },
+        )
+        return response
+
+
+def memory_profile_view(request):
+    """
+    Admin page with the memory profile of the worker serving it.
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    if not tracemalloc.is_tracing():
+        context = {**admin.site.each_context(request), "title": "Memory profile"}
+        return TemplateResponse(request, "admin/memory_profile.html", context)
+    if request.method == "POST":
+        profile.take_baseline()
+        return redirect(request.get_full_path())
+
+    key_type = request.GET.get("key", "lineno")
+    if key_type not in KEY_TYPES:
+        key_type = "lineno"
+    traced, peak = tracemalloc.get_traced_memory()
+    sites = []
+    for stat in profile.top_sites(key_type, settings.MEMPROFILE_TOP_SITES):
+        lines = stat.traceback.format(most_recent_first=True)
+        sites.append(
+            {
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "location": lines[0].strip() if lines else "",
+                "traceback": "\n".join(lines[1:]) if key_type == "traceback" else "",
+            }
+        )
+    context = {
+        **admin.site.each_context(request),
+        "title": "Memory profile",
+        "tracing": True,
+        "pid": os.getpid(),
+        "rss": current_rss(),
+        "traced": traced,
+        "peak": peak,
+        "overhead": tracemalloc.get_tracemalloc_memory(),
+        "baseline_time": profile.baseline_time,
+        "key_type": key_type,
+        "key_types": KEY_TYPES,
+        "sites": sites,
+        "routes": profile.top_routes()[: settings.MEMPROFILE_TOP_SITES],
+        "requests": profile.top_requests(),
+    }
+    return TemplateResponse(request, "admin/memory_profile.html", context)
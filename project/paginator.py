@@ -0,0 +1,55 @@
+"""
+Paginator for admin changelists over very large tables.
+"""
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the planner's row estimate for unfiltered querysets.
+
+    An exact COUNT(*) has to scan the whole table, which is what makes the
+    first page of a changelist slow once a table holds millions of rows. When
+    the queryset has no WHERE clause and the database keeps a row estimate
+    above `estimate_threshold`, that estimate is used instead. Filtered
+    querysets and small tables are still counted exactly.
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = estimated_row_count(self.object_list)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+def estimated_row_count(queryset):
+    """
+    Return the database's estimate of the number of rows in the queryset's
+    table, or None if the backend does not keep one.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+    elif connection.vendor == "mysql":
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
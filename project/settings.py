@@ -37,7 +37,7 @@ DEFAULTS_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
 ]
-PROJECT_APPS = ["accounts", "restaurants", "orders", "payments"]
+PROJECT_APPS = ["accounts", "restaurants", "orders", "payments", "api"]
 
 THIRD_PARTY_APPS = [
     "rest_framework",
@@ -48,6 +48,7 @@ THIRD_PARTY_APPS = [
 INSTALLED_APPS = DEFAULTS_APPS + PROJECT_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    "project.memprofile.MemoryProfileMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -55,14 +56,28 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "project.slow_queries.SlowQueryMiddleware",
 ]
 
+# Middleware for API requests, see project/handlers.py. Only requests under
+# FULL_MIDDLEWARE_PATHS get the full MIDDLEWARE chain above; middleware that
+# every request needs has to be listed in both.
+LEAN_MIDDLEWARE = [
+    "project.memprofile.MemoryProfileMiddleware",
+    "project.access_log.AccessLogMiddleware",
+    "project.tracing.TracingMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "project.slow_queries.SlowQueryMiddleware",
+]
+FULL_MIDDLEWARE_PATHS = ["/admin/"]
+
 ROOT_URLCONF = "project.urls"
 
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [],
+        "DIRS": [BASE_DIR / "project" / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
@@ -140,16 +155,124 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api.throttling.UserTokenBucketThrottle",
+        "api.throttling.RestaurantTokenBucketThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "user.read": "300/min",
+        "user.write": "60/min",
+        "user.payment": "10/min",
+        "restaurant.read": "3000/min",
+        "restaurant.write": "600/min",
+        "restaurant.payment": "120/min",
+    },
 }
 
+# Region used to normalise phone numbers entered without a country code
+PHONENUMBER_DEFAULT_REGION = None
+
+# Upper bound on the number of in-memory throttle buckets kept per worker
+THROTTLE_MAX_BUCKETS = 100000
+
+# Batch endpoint limits. With a concurrency above 1, consecutive GETs in a
+# batch run on worker threads, each with its own database connection.
+BATCH_MAX_REQUESTS = 50
+BATCH_MAX_CONCURRENCY = 1
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Remote Kitchen",
     "DESCRIPTION": "Remote kitchen project api",
     "VERSION": "1.0.0",
     "SERVE_INCLUDE_SCHEMA": False,
 }
+# Bulk user imports, see accounts/imports.py. Uploaded files are kept in
+# USER_IMPORT_DIR until the import is done. A running import that has not
+# saved progress for USER_IMPORT_STALE_SECONDS is taken to have died and may
+# be resumed.
+USER_IMPORT_DIR = BASE_DIR / "imports"
+USER_IMPORT_BATCH_SIZE = 500
+USER_IMPORT_HASH_WORKERS = None  # one per CPU
+USER_IMPORT_STALE_SECONDS = 300
+USER_IMPORT_MAX_ERRORS = 1000  # row errors kept per import
+
+# Structured access log of API requests, see project/access_log.py. Records
+# go to stdout when ACCESS_LOG_FILE is None. When ACCESS_LOG_QUEUE_SIZE
+# records are waiting, ACCESS_LOG_DROP_POLICY ("drop_newest" or
+# "drop_oldest") decides which one is discarded.
+ACCESS_LOG_ENABLED = True
+ACCESS_LOG_FILE = None
+ACCESS_LOG_QUEUE_SIZE = 10000
+ACCESS_LOG_DROP_POLICY = "drop_newest"
+
+# Slow query capture, see project/slow_queries.py. Queries taking at least
+# SLOW_QUERY_THRESHOLD_MS are recorded, None turns the capture off. Each
+# process keeps the latest SLOW_QUERY_BUFFER_SIZE records.
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_BUFFER_SIZE = 200
+SLOW_QUERY_EXPLAIN = True
+
+# Request tracing, see project/tracing.py. TRACING_SAMPLE_RATE is the share of
+# API requests traced, 0 turns tracing off. Exporters are configured like the
+# payment gateway; project.tracing.StreamExporter writes to stdout instead.
+TRACING_SAMPLE_RATE = 0
+TRACING_EXPORTER = {
+    "BACKEND": "project.tracing.FileExporter",
+    "OPTIONS": {"path": BASE_DIR / "traces.ndjson"},
+}
+
+# Memory profiling with tracemalloc, see project/memprofile.py. Meant for one
+# canary worker at a time; the profile is shown at /admin/memory/.
+MEMPROFILE_ENABLED = False
+MEMPROFILE_FRAMES = 1  # frames kept per allocation
+MEMPROFILE_KEEP_REQUESTS = 50  # requests with the highest peaks
+MEMPROFILE_TOP_SITES = 25
+
+# Precomputed schema served at /api/schema/, see api/schema.py
+SCHEMA_CACHE_FILE = BASE_DIR / "openapi-schema.json"
 
 # Stripe config
 STRIPE_PUBLIC_KEY = "stripe-public-key"
 STRIPE_SECRET_KEY = "stripe-secret-key"
 STRIPE_WEBHOOK_SECRET = "stripe_webhook_secret"
+
+# Finished orders older than this are moved to the archive tables
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+# Long-poll order tracking, see AsyncOrderTrackView: the default and the
+# longest time in seconds a request waits for a status change
+ORDER_TRACK_TIMEOUT = 25
+ORDER_TRACK_MAX_TIMEOUT = 60
+
+# Order change feed entries older than this are removed by compact_order_events
+ORDER_EVENT_RETENTION_DAYS = 7
+# The feed only serves events at least this many seconds old, so that events
+# of transactions still committing are not skipped, see orders/events.py
+ORDER_EVENT_SETTLE_SECONDS = 5
+
+# Menu delta sync: tombstones of deleted menus and items are kept this long,
+# and each sync window overlaps the previous one by a few seconds so that
+# rows committed late are not missed
+MENU_TOMBSTONE_RETENTION_DAYS = 30
+MENU_SYNC_OVERLAP_SECONDS = 5
+
+# In-memory restaurant location index, see restaurants/geo.py
+GEO_INDEX_CELL_DEGREES = 0.02  # about 2.2 km north-south
+GEO_INDEX_REFRESH_SECONDS = 30
+
+# Trending menu items, see restaurants/trending.py
+TRENDING_CAPACITY = 50  # items tracked per restaurant
+TRENDING_HALF_LIFE = 3600  # seconds
+TRENDING_CHECKPOINT_INTERVAL = 60  # seconds
+
+# Payment gateway used by the payments app, see payments/gateway.py
+PAYMENT_GATEWAY = {
+    "BACKEND": "payments.gateway.StripeGateway",
+    "OPTIONS": {
+        # Per-call deadline in seconds
+        "timeout": 10,
+        # Consecutive failures that open the circuit, and how long it stays open
+        "failure_threshold": 5,
+        "reset_timeout": 30,
+    },
+}
@@ -0,0 +1,251 @@
+"""
+Slow query capture.
+
+Every database connection gets an execute_wrapper that times its queries.
+Queries that take SLOW_QUERY_THRESHOLD_MS or longer are recorded with their
+normalized SQL, parameters, the view that was being served and the line of
+project code that ran them. For SELECT queries, the plan is fetched with
+EXPLAIN on the same connection right away, so it reflects the transaction and
+indexes the query actually ran with.
+
+The latest SLOW_QUERY_BUFFER_SIZE records are kept in memory, per process, and
+listed at /admin/slow-queries/ for superusers. Restaurant owners are staff too,
+but the records hold every tenant's SQL and parameters.
+"""
+
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+# The view serving the current request, set by SlowQueryMiddleware
+current_view = ContextVar("slow_query_view", default=None)
+
+PROJECT_DIR = str(settings.BASE_DIR)
+LIBRARY_DIRS = ("site-packages", "dist-packages")
+ORM_PATHS = ("django/db/", "django/utils/")
+# Project modules that run between a query and the code that made it: the
+# execute_wrappers of the access log and tracing, and the traced methods
+INSTRUMENTATION = {
+    str(Path(__file__).with_name(name))
+    for name in ("access_log.py", "slow_queries.py", "tracing.py")
+}
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+# Literals and placeholders, replaced by ? in normalized SQL
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Return the shape of a query: the same for every set of parameters.
+    """
+    sql = WHITESPACE.sub(" ", sql).strip()
+    sql = LITERALS.sub("?", sql)
+    return IN_LIST.sub("IN (...)", sql)
+
+
+def format_params(params, limit=200):
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        params = params.values()
+    formatted = []
+    for value in params:
+        text = repr(value)
+        if len(text) > limit:
+            text = text[:limit] + "..."
+        formatted.append(text)
+    return formatted
+
+
+def describe_frame(frame, path):
+    return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def caller_location():
+    """
+    Return "path:line in function" of the innermost project code on the stack.
+
+    Querysets are often evaluated by DRF rather than in project code, and then
+    the innermost frame outside of the ORM is returned instead.
+    """
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        library = next((part for part in LIBRARY_DIRS if part in filename), None)
+        if library:
+            path = filename.split(f"{library}/", 1)[-1]
+            if fallback is None and not path.startswith(ORM_PATHS):
+                fallback = describe_frame(frame, path)
+        elif filename.startswith(PROJECT_DIR) and filename not in INSTRUMENTATION:
+            return describe_frame(frame, Path(filename).relative_to(PROJECT_DIR))
+        frame = frame.f_back
+    return fallback
+
+
+def explain(connection, sql, params):
+    """
+    Return the plan of a query as text, or why it could not be explained.
+    """
+    # A cursor of the driver, so that EXPLAIN is not timed and recorded in
+    # turn, and the cursor of the query is left with its results
+    cursor = connection.create_cursor()
+    # A failed statement would abort the rest of the transaction on some
+    # databases, so EXPLAIN runs in a savepoint
+    savepoint = connection.savepoint() if connection.in_atomic_block else None
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        cursor.execute(f"{prefix} {sql}", params)
+        rows = cursor.fetchall()
+    except Exception as error:
+        if savepoint:
+            connection.savepoint_rollback(savepoint)
+        return f"EXPLAIN failed: {error}"
+    finally:
+        cursor.close()
+    if savepoint:
+        connection.savepoint_commit(savepoint)
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+class SlowQueryLog:
+    """
+    The latest slow queries of this process.
+    """
+
+    def __init__(self, size):
+        self.records = deque(maxlen=size)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+            self.total += 1
+
+    def latest(self):
+        with self.lock:
+            return list(reversed(self.records))
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.total = 0
+
+
+slow_queries = SlowQueryLog(settings.SLOW_QUERY_BUFFER_SIZE)
+
+
+def record_slow_queries(execute, sql, params, many, context):
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    if duration < settings.SLOW_QUERY_THRESHOLD_MS:
+        return result
+
+    connection = context["connection"]
+    plan = None
+    if settings.SLOW_QUERY_EXPLAIN and not many and EXPLAINABLE.match(sql):
+        plan = explain(connection, sql, params)
+    slow_queries.add(
+        {
+            "time": timezone.now(),
+            "duration_ms": round(duration, 3),
+            "database": connection.alias,
+            "sql": normalize_sql(sql),
+            "params": [] if many else format_params(params),
+            "many": many,
+            "view": current_view.get(),
+            "location": caller_location(),
+            "plan": plan,
+        }
+    )
+    return result
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    if record_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_queries)
+
+
+if settings.SLOW_QUERY_THRESHOLD_MS is not None:
+    connection_created.connect(install_slow_query_log)
+
+
+class SlowQueryMiddleware:
+    """
+    Note which view is serving the request, for the slow query records.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported
+        if settings.SLOW_QUERY_THRESHOLD_MS is not None:
+            for connection in connections.all(initialized_only=True):
+                install_slow_query_log(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    async def __acall__(self, request):
+        token = current_view.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF views keep their class on the function as_view() returns
+        view = getattr(view_func, "cls", view_func)
+        current_view.set(
+            f"{request.resolver_match.view_name} "
+            f"({view.__module__}.{view.__qualname__})"
+        )
+
+
+def slow_query_view(request):
+    """
+    Admin page listing the latest slow queries of the worker serving it.
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    if request.method == "POST":
+        slow_queries.clear()
+        return redirect(request.path)
+    context = {
+        **admin.site.each_context(request),
+        "title": "Slow queries",
+        "records": slow_queries.latest(),
+        "total": slow_queries.total,
+        "threshold": settings.SLOW_QUERY_THRESHOLD_MS,
+        "size": slow_queries.records.maxlen,
+    }
+    return TemplateResponse(request, "admin/slow_queries.html", context)
@@ -0,0 +1,282 @@
+import io
+import os
+import tracemalloc
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from project.access_log import AccessLogWriter
+from project.handlers import RoutedWSGIHandler
+from project.memprofile import MemoryProfile
+from project.slow_queries import explain, normalize_sql, slow_queries
+from project.tracing import TracingMiddleware
+from restaurants.models import Menu, Restaurant
+
+
+@override_settings(ACCESS_LOG_ENABLED=False)
+class LeanMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.handler = RoutedWSGIHandler()
+
+    def get(self, path):
+        headers = {}
+
+        def start_response(status, response_headers):
+            headers.update(response_headers)
+
+        environ = RequestFactory().get(path).environ
+        b"".join(self.handler(environ, start_response))
+        return headers
+
+    def test_api_requests_skip_session_and_clickjacking_middleware(self):
+        headers = self.get("/menus/")
+        self.assertNotIn("X-Frame-Options", headers)
+        self.assertNotIn("Cookie", headers.get("Vary", ""))
+        # Middleware listed in both chains still runs
+        self.assertIn("X-Content-Type-Options", headers)
+
+    def test_admin_requests_get_the_full_chain(self):
+        headers = self.get("/admin/login/")
+        self.assertEqual(headers["X-Frame-Options"], "DENY")
+        self.assertIn("Cookie", headers["Vary"])
+
+
+class AccessLogWriterTests(SimpleTestCase):
+    def writer(self, drop_policy):
+        writer = AccessLogWriter(queue_size=2, drop_policy=drop_policy)
+        # As if started, so that nothing drains the queue
+        writer.pid = os.getpid()
+        for number in range(3):
+            writer.submit({"n": number})
+        return writer
+
+    def queued(self, writer):
+        return [writer.queue.get_nowait()["n"] for _ in range(writer.queue.qsize())]
+
+    def test_drop_newest_keeps_the_queued_records(self):
+        writer = self.writer("drop_newest")
+        self.assertEqual(self.queued(writer), [0, 1])
+        self.assertEqual(writer.dropped, 1)
+
+    def test_drop_oldest_makes_room(self):
+        writer = self.writer("drop_oldest")
+        self.assertEqual(self.queued(writer), [1, 2])
+        self.assertEqual(writer.dropped, 1)
+
+    def test_writes_json_lines(self):
+        stream = io.StringIO()
+        AccessLogWriter().write(stream, [{"ts": 0, "path": "/menus/"}])
+        self.assertEqual(
+            stream.getvalue(), '{"ts":"1970-01-01T00:00:00.000Z","path":"/menus/"}\n'
+        )
+
+    def test_rejects_unknown_policies(self):
+        with self.assertRaises(ValueError):
+            AccessLogWriter(drop_policy="block")
+
+
+@override_settings(MIDDLEWARE=["project.access_log.AccessLogMiddleware"])
+class AccessLogMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", "owner@example.com", role="owner")
+        restaurant = Restaurant.objects.create(
+            owner=owner, name="R", address="a", phone_number="+12025550123"
+        )
+        Menu.objects.create(restaurant=restaurant, name="Menu", description="d")
+        cls.customer = User.objects.create_user(
+            "customer", "customer@example.com", role="customer", restaurant=restaurant
+        )
+
+    def setUp(self):
+        patcher = mock.patch("project.access_log.get_writer")
+        self.writer = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_records_who_made_the_request(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get("/menus/")
+        self.assertEqual(response.status_code, 200)
+
+        [[record], _] = self.writer.submit.call_args
+        self.assertEqual(record["view"], "menu-list")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["user_id"], self.customer.id)
+        self.assertEqual(record["role"], "customer")
+        self.assertEqual(record["restaurant_id"], self.customer.restaurant_id)
+        self.assertGreater(record["queries"], 0)
+
+    def test_anonymous_requests(self):
+        self.client.get("/menus/")
+        [[record], _] = self.writer.submit.call_args
+        self.assertEqual(record["status"], 401)
+        self.assertIsNone(record["user_id"])
+
+
+class NormalizeSqlTests(SimpleTestCase):
+    def test_replaces_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT *\n  FROM t WHERE a = 'x''y' AND b IN (%s, %s, %s) AND c > 1.5"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) AND c > ?",
+        )
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        slow_queries.clear()
+        self.addCleanup(slow_queries.clear)
+
+    def test_records_queries_with_their_plan_and_caller(self):
+        list(Restaurant.objects.filter(name="R"))
+        record = slow_queries.latest()[0]
+        self.assertIn('FROM "restaurants_restaurant"', record["sql"])
+        self.assertEqual(record["params"], ["'R'"])
+        self.assertTrue(record["location"].startswith("project/tests.py:"))
+        self.assertTrue(record["plan"])
+        self.assertNotIn("EXPLAIN failed", record["plan"])
+
+    def test_writes_are_not_explained(self):
+        Restaurant.objects.filter(name="R").update(name="S")
+        self.assertIsNone(slow_queries.latest()[0]["plan"])
+
+    def test_failed_explain_keeps_the_transaction_usable(self):
+        plan = explain(connection, "SELECT * FROM missing_table", ())
+        self.assertTrue(plan.startswith("EXPLAIN failed"))
+        self.assertFalse(Restaurant.objects.exists())
+
+    def test_admin_page_is_for_superusers(self):
+        list(Restaurant.objects.all())
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        response = self.client.get("/admin/slow-queries/")
+        self.assertEqual(response.status_code, 302)
+        # Owners are staff, to manage their restaurants in the admin
+        owner = User.objects.create_user(
+            "owner", "owner@example.com", role="owner", is_staff=True
+        )
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get("/admin/slow-queries/").status_code, 403)
+        self.assertEqual(self.client.post("/admin/slow-queries/").status_code, 403)
+        self.assertTrue(slow_queries.latest())
+        self.client.force_login(admin)
+        response = self.client.get("/admin/slow-queries/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "restaurants_restaurant")
+
+
+@override_settings(
+    TRACING_SAMPLE_RATE=0.5,
+    MIDDLEWARE=["project.tracing.TracingMiddleware"],
+)
+class TracingTests(TestCase):
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    def setUp(self):
+        patcher = mock.patch("project.tracing.get_exporter")
+        self.exporter = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("project.tracing.random.random", return_value=0.1)
+        self.random = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sample(self, **headers):
+        middleware = TracingMiddleware(lambda request: None)
+        return middleware.sample(RequestFactory().get("/", headers=headers))
+
+    def test_samples_at_the_configured_rate(self):
+        self.assertEqual(self.sample(), (None, None))
+        self.random.return_value = 0.7
+        self.assertIsNone(self.sample())
+
+    def test_traceparent_joins_the_callers_trace(self):
+        self.assertEqual(
+            self.sample(traceparent=self.parent),
+            ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"),
+        )
+        self.assertIsNone(self.sample(traceparent=self.parent[:-2] + "00"))
+
+    def test_traceparent_does_not_bypass_the_rate(self):
+        self.random.return_value = 0.7
+        self.assertIsNone(self.sample(traceparent=self.parent))
+
+    def test_exports_the_spans_of_a_request(self):
+        response = self.client.get("/menus/", headers={"traceparent": self.parent})
+        self.assertTrue(
+            response["traceresponse"].startswith("00-0af7651916cd43dd8448eb211c80319c-")
+        )
+        [[spans], _] = self.exporter.export.call_args
+        root = spans[-1]
+        self.assertEqual(root["parent_id"], "b7ad6b7169203331")
+        self.assertEqual(root["attributes"]["status"], 401)
+        self.assertIn("drf.authenticate", [span["name"] for span in spans])
+
+    def test_runs_natively_in_async_chains(self):
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(TracingMiddleware(get_response)))
+
+    async def test_traces_async_requests(self):
+        response = await self.async_client.get("/menus/")
+        self.assertIn("traceresponse", response)
+        self.exporter.export.assert_called_once()
+
+
+class MemoryProfileTests(SimpleTestCase):
+    def record(self, peak, path="/"):
+        return {"path": path, "peak": peak, "retained": peak // 2}
+
+    def test_keeps_the_largest_requests(self):
+        memory = MemoryProfile(keep=2)
+        for peak in (5, 1, 9, 3):
+            memory.add("menus/", self.record(peak))
+        self.assertEqual([r["peak"] for r in memory.top_requests()], [9, 5])
+        [(route, stats)] = memory.top_routes()
+        self.assertEqual((route, stats.requests, stats.max_peak), ("menus/", 4, 9))
+        self.assertEqual(stats.total_retained, 2 + 0 + 4 + 1)
+
+
+@override_settings(
+    MEMPROFILE_ENABLED=True,
+    MIDDLEWARE=[
+        "project.memprofile.MemoryProfileMiddleware",
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+    ],
+)
+class MemoryProfileMiddlewareTests(TestCase):
+    def setUp(self):
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        patcher = mock.patch("project.memprofile.profile", MemoryProfile(keep=5))
+        self.profile = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_records_requests_and_shows_them_to_superusers(self):
+        self.client.get("/menus/")
+        [record] = self.profile.top_requests()
+        self.assertEqual((record["path"], record["status"]), ("/menus/", 401))
+        self.assertGreater(record["peak"], 0)
+
+        owner = User.objects.create_user(
+            "owner", "owner@example.com", role="owner", is_staff=True
+        )
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get("/admin/memory/").status_code, 403)
+        self.assertEqual(self.client.post("/admin/memory/").status_code, 403)
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        response = self.client.get("/admin/memory/", {"key": "filename"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "/menus/")
+        response = self.client.post("/admin/memory/")
+        self.assertEqual(response.status_code, 302)
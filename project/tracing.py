@@ -0,0 +1,373 @@
+"""
+Request tracing.
+
+A sampled API request is recorded as a trace: a tree of timed spans for the
+request itself, authentication, each accounts.permissions check, the view's
+get_queryset, serializer output, response rendering, every database query and
+every call to the payment provider. When the request finishes its spans are
+handed to the exporter configured by TRACING_EXPORTER, by default one JSON
+object per line in a local file that the show_trace command prints as a tree.
+
+Sampling is decided once, when the request comes in, with probability
+TRACING_SAMPLE_RATE. A request carrying a W3C traceparent header joins the
+caller's trace, and is not sampled if the caller did not sample it, but the
+header cannot raise the share of requests traced above TRACING_SAMPLE_RATE.
+Spans of a request that is not sampled cost one context variable lookup
+each.
+
+DRF and accounts.permissions are instrumented by install(), which wraps the
+relevant methods once, when the middleware is loaded. View classes get their
+get_queryset wrapped the first time they serve a sampled request.
+"""
+
+import functools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import import_string
+
+from project.slow_queries import normalize_sql
+
+# (trace, span) of the innermost open span of the current request
+current_span = ContextVar("tracing_span", default=None)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or new_id(128)
+        self.spans = []
+
+
+class Span:
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.token = current_span.set((self.trace, self))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        current_span.reset(self.token)
+        self.trace.spans.append(self)
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class NoopSpan:
+    """
+    Stands in for a span when the request is not sampled.
+    """
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def span(name, **attributes):
+    """
+    Return a context manager timing a child of the current span.
+
+    Outside of a sampled request the span is not recorded.
+    """
+    active = current_span.get()
+    if active is None:
+        return NOOP_SPAN
+    trace, parent = active
+    return Span(trace, name, parent.span_id, attributes)
+
+
+def traced(name, describe=None):
+    """
+    Decorate a function to run in a span. `describe(*args, **kwargs)` may
+    return attributes for the span.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return function(*args, **kwargs)
+            attributes = describe(*args, **kwargs) if describe else {}
+            with span(name, **attributes):
+                return function(*args, **kwargs)
+
+        wrapper.traced = True
+        return wrapper
+
+    return decorator
+
+
+class SpanExporter:
+    """
+    Interface of the span exporters. export() receives the finished spans
+    of one trace, as dicts.
+    """
+
+    def export(self, spans):
+        raise NotImplementedError
+
+
+class StreamExporter(SpanExporter):
+    """
+    Write spans as JSON lines to a stream, stdout by default.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(
+            json.dumps(span, separators=(",", ":"), default=str) + "\n"
+            for span in spans
+        )
+        with self.lock:
+            self.stream.write(lines)
+            self.stream.flush()
+
+
+class FileExporter(StreamExporter):
+    """
+    Append spans as JSON lines to a file.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.pid = None
+
+    def export(self, spans):
+        # Each process opens its own handle; appends of whole traces with
+        # O_APPEND do not interleave in practice
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.stream = open(self.path, "a", encoding="utf-8")
+                    self.pid = os.getpid()
+        super().export(spans)
+
+
+def load_exporter(config):
+    """
+    Build an exporter from a {"BACKEND": dotted path, "OPTIONS": kwargs} mapping.
+    """
+    backend = import_string(config["BACKEND"])
+    return backend(**config.get("OPTIONS", {}))
+
+
+def trace_queries(execute, sql, params, many, context):
+    if current_span.get() is None:
+        return execute(sql, params, many, context)
+    with span(
+        "db.query",
+        database=context["connection"].alias,
+        sql=normalize_sql(sql)[:1000],
+        many=many,
+    ):
+        return execute(sql, params, many, context)
+
+
+def install_query_tracing(sender, connection, **kwargs):
+    if trace_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_queries)
+
+
+def class_name(instance, *args, **kwargs):
+    return {"class": type(instance).__qualname__}
+
+
+def instrument_view(view_class):
+    """
+    Trace get_queryset of a view class, once.
+    """
+    get_queryset = getattr(view_class, "get_queryset", None)
+    if get_queryset is None or getattr(get_queryset, "traced", False):
+        return
+    view_class.get_queryset = traced("view.get_queryset", class_name)(get_queryset)
+
+
+_installed = False
+
+
+def install():
+    """
+    Wrap the DRF and accounts.permissions methods that get their own spans.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from rest_framework import serializers
+    from rest_framework.permissions import BasePermission
+    from rest_framework.response import Response
+    from rest_framework.views import APIView
+
+    import accounts.permissions
+
+    APIView.perform_authentication = traced("drf.authenticate")(
+        APIView.perform_authentication
+    )
+    for permission in vars(accounts.permissions).values():
+        if isinstance(permission, type) and issubclass(permission, BasePermission):
+            for method in ("has_permission", "has_object_permission"):
+                if method in vars(permission):
+                    wrapped = traced(f"permission.{method}", class_name)
+                    setattr(permission, method, wrapped(getattr(permission, method)))
+
+    for serializer in (serializers.Serializer, serializers.ListSerializer):
+        data = serializer.data
+        serializer.data = property(traced("serializer.data", class_name)(data.fget))
+
+    def describe_response(response):
+        renderer = getattr(response, "accepted_renderer", None)
+        return {"renderer": type(renderer).__qualname__}
+
+    rendered_content = Response.rendered_content
+    Response.rendered_content = property(
+        traced("response.render", describe_response)(rendered_content.fget)
+    )
+
+    connection_created.connect(install_query_tracing)
+    # Connections opened before this module was imported
+    for connection in connections.all(initialized_only=True):
+        install_query_tracing(None, connection)
+
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = load_exporter(settings.TRACING_EXPORTER)
+    return _exporter
+
+
+class TracingMiddleware:
+    """
+    Start a trace for sampled requests and export it once the response is
+    ready.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TRACING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.exporter = get_exporter()
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sample(self, request):
+        """
+        Return the trace ID and parent span ID to use, or None if the
+        request is not traced.
+        """
+        # Any client can send a traceparent, so it never bypasses the rate
+        if random.random() >= settings.TRACING_SAMPLE_RATE:
+            return None
+        match = TRACEPARENT.match(request.headers.get("traceparent", ""))
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            return (trace_id, parent_id) if int(flags, 16) & 1 else None
+        return None, None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sampled = self.sample(request)
+        if sampled is None:
+            return self.get_response(request)
+        trace, root = self.start(request, *sampled)
+        with root:
+            response = self.get_response(request)
+        return self.finish(request, response, trace, root)
+
+    async def __acall__(self, request):
+        sampled = self.sample(request)
+        if sampled is None:
+            return await self.get_response(request)
+        trace, root = self.start(request, *sampled)
+        with root:
+            response = await self.get_response(request)
+        return self.finish(request, response, trace, root)
+
+    def start(self, request, trace_id, parent_id):
+        trace = Trace(trace_id)
+        return trace, Span(trace, "request", parent_id, {"method": request.method})
+
+    def finish(self, request, response, trace, root):
+        user = getattr(request, "user", None)
+        match = request.resolver_match
+        root.name = f"{request.method} {match.route if match else request.path}"
+        root.set(
+            path=request.path,
+            status=response.status_code,
+            view=match.view_name if match else None,
+            user_id=user.pk if user is not None and user.is_authenticated else None,
+        )
+        response["traceresponse"] = f"00-{trace.trace_id}-{root.span_id}-01"
+        try:
+            self.exporter.export([span.as_dict() for span in trace.spans])
+        except Exception:
+            pass  # Tracing must never fail a request
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None)
+        if view_class is not None and current_span.get() is not None:
+            instrument_view(view_class)
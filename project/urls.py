@@ -17,16 +17,26 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+
+from api.views.schema import CachedSpectacularAPIView
+from project.memprofile import memory_profile_view
+from project.slow_queries import slow_query_view
 
 urlpatterns = [
+    path(
+        "admin/memory/",
+        admin.site.admin_view(memory_profile_view),
+        name="memory-profile",
+    ),
+    path(
+        "admin/slow-queries/",
+        admin.site.admin_view(slow_query_view),
+        name="slow-queries",
+    ),
     path("admin/", admin.site.urls),
     # Swagger urls
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("api/schema/", CachedSpectacularAPIView.as_view(), name="schema"),
     path(
         "api/swagger/",
         SpectacularSwaggerView.as_view(url_name="schema"),
@@ -5,11 +5,14 @@ It exposes the WSGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
+
+The application routes API requests through a shorter middleware chain than
+the admin, see project/handlers.py.
 """
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from project.handlers import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
 
@@ -1,9 +1,15 @@
 from django.contrib import admin
-from .models import Restaurant, Menu, MenuItem
-from orders.models import Order
+from project.paginator import EstimatedCountPaginator
+from .models import Restaurant, Menu, MenuCategory, MenuItem, Modifier, ModifierGroup
 
 
 class RestaurantAdmin(admin.ModelAdmin):
+    list_display = ("name", "owner", "address", "created_at")
+    list_select_related = ("owner",)
+    search_fields = ("name",)
+    ordering = ("name",)
+    raw_id_fields = ("owner",)
+
     # Custom admin for owners
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -12,25 +18,73 @@ class RestaurantAdmin(admin.ModelAdmin):
         return qs
 
     def has_module_permission(self, request):
-        return request.user.role in ["owner", "employee"]
+        # The login page lists the apps for anonymous users too
+        role = getattr(request.user, "role", None)
+        return request.user.is_superuser or role in ["owner", "employee"]
 
     def has_view_permission(self, request, obj=None):
+        if request.user.is_superuser:
+            return True
         if request.user.role == "owner":
-            return obj is None or obj.owner == request.user
+            return obj is None or obj.owner_id == request.user.id
         return False
 
     def has_change_permission(self, request, obj=None):
+        if request.user.is_superuser:
+            return True
         if request.user.role == "owner":
-            return obj is None or obj.owner == request.user
+            return obj is None or obj.owner_id == request.user.id
         return False
 
     def has_delete_permission(self, request, obj=None):
+        if request.user.is_superuser:
+            return True
         if request.user.role == "owner":
-            return obj is None or obj.owner == request.user
+            return obj is None or obj.owner_id == request.user.id
         return False
 
 
-admin.site.register(Restaurant)
-admin.site.register(Menu)
-admin.site.register(MenuItem)
-# admin.site.register(Order, OrderAdmin)
+class MenuAdmin(admin.ModelAdmin):
+    list_display = ("name", "restaurant", "updated_at")
+    list_select_related = ("restaurant",)
+    search_fields = ("name",)
+    autocomplete_fields = ("restaurant",)
+
+
+class MenuCategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "menu", "depth", "position", "path")
+    list_select_related = ("menu",)
+    search_fields = ("name",)
+    autocomplete_fields = ("menu", "parent")
+    # Parents first, each followed by its subtree
+    ordering = ("menu", "path")
+
+
+class ModifierInline(admin.TabularInline):
+    model = Modifier
+    extra = 1
+
+
+class ModifierGroupAdmin(admin.ModelAdmin):
+    list_display = ("name", "menu", "min_choices", "max_choices", "position")
+    list_select_related = ("menu",)
+    search_fields = ("name",)
+    autocomplete_fields = ("menu",)
+    inlines = [ModifierInline]
+
+
+class MenuItemAdmin(admin.ModelAdmin):
+    list_display = ("name", "menu", "price", "stock", "is_available", "updated_at")
+    list_filter = ("is_available",)
+    list_select_related = ("menu__restaurant",)
+    search_fields = ("name",)
+    autocomplete_fields = ("menu", "category", "modifier_groups")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(Restaurant, RestaurantAdmin)
+admin.site.register(Menu, MenuAdmin)
+admin.site.register(MenuCategory, MenuCategoryAdmin)
+admin.site.register(ModifierGroup, ModifierGroupAdmin)
+admin.site.register(MenuItem, MenuItemAdmin)
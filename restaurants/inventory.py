@@ -0,0 +1,93 @@
+"""
+Stock reservation for menu items.
+
+A menu item with a `stock` count can only be ordered while enough is left,
+and one with no count is never sold out. Stock is taken with one conditional
+UPDATE ... SET stock = stock - n WHERE stock >= n per item rather than by
+reading and writing back the count, so concurrent orders can never both take
+the last portions. Cancelled and deleted orders, and deleted order lines,
+put their stock back the same way, see orders/signals.py. A line whose menu
+item or quantity is edited gives back its stock and reserves it anew.
+
+Order lines record whether they hold stock in `stock_reserved`, so that only
+stock that was taken is put back, and only once.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from restaurants.models import MenuItem
+
+
+class OutOfStock(Exception):
+    def __init__(self, menu_item):
+        super().__init__(f"{menu_item.name} is not available in that quantity.")
+        self.menu_item = menu_item
+
+
+def reserve_stock(lines):
+    """
+    Take stock for (menu_item, quantity) lines, all or nothing.
+
+    Raises OutOfStock for the first item that is unavailable or short, after
+    putting back what was already taken. Call it in the transaction that
+    creates the order, so the reservation commits or rolls back with it.
+
+    Items are updated in ID order so that concurrent orders lock rows in the
+    same order and cannot deadlock. Items without a stock count are only
+    checked for availability and take no row lock.
+    """
+    quantities = Counter()
+    menu_items = {}
+    for menu_item, quantity in lines:
+        quantities[menu_item.id] += quantity
+        menu_items[menu_item.id] = menu_item
+
+    now = timezone.now()
+    with transaction.atomic():
+        for menu_item_id in sorted(quantities):
+            menu_item = menu_items[menu_item_id]
+            quantity = quantities[menu_item_id]
+            if menu_item.stock is None:
+                if not menu_item.is_available:
+                    raise OutOfStock(menu_item)
+                continue
+            reserved = (
+                MenuItem.objects.filter(id=menu_item_id, is_available=True).filter(
+                    Q(stock__gte=quantity) | Q(stock__isnull=True)
+                )
+                # updated_at lets menu delta sync pick up the new count
+                .update(stock=F("stock") - quantity, updated_at=now)
+            )
+            if not reserved:
+                raise OutOfStock(menu_item)
+
+
+def release_stock(lines):
+    """
+    Put back stock for (menu_item_id, quantity) lines.
+    """
+    quantities = Counter()
+    for menu_item_id, quantity in lines:
+        quantities[menu_item_id] += quantity
+
+    now = timezone.now()
+    for menu_item_id in sorted(quantities):
+        MenuItem.objects.filter(id=menu_item_id, stock__isnull=False).update(
+            stock=F("stock") + quantities[menu_item_id], updated_at=now
+        )
+
+
+def release_held_stock(lines):
+    """
+    Put back the stock held by a queryset of order lines, and mark it as
+    put back.
+    """
+    with transaction.atomic():
+        # Locked so that concurrent cancellations put the stock back once
+        held = lines.filter(stock_reserved=True).select_for_update()
+        release_stock(held.values_list("menu_item_id", "quantity"))
+        held.update(stock_reserved=False)
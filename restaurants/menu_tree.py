@@ -0,0 +1,104 @@
+"""
+Whole-menu trees: categories, items and modifiers in one structure.
+
+load_menu_trees() builds the trees of any number of menus with six queries:
+the menus, their categories, items, item to modifier group links, modifier
+groups and modifiers. Categories come back ordered by their materialized
+path, so every category is read after its parent and the nesting is rebuilt
+in a single pass. Rows are read with values() and returned as plain dicts,
+ready to be rendered; prices are strings, as in the serializers.
+
+Modifier groups are listed once per menu, and items refer to them by ID, as
+a group is usually shared by many items.
+"""
+
+from collections import defaultdict
+
+from restaurants.models import MenuCategory, MenuItem, Modifier, ModifierGroup
+
+
+def by_position(rows):
+    return sorted(rows, key=lambda row: (row.pop("position"), row["name"], row["id"]))
+
+
+def load_menu_trees(menus):
+    """
+    Return the trees of the menus of a queryset, as a list of dicts.
+    """
+    menus = list(
+        menus.order_by("name", "id").values(
+            "id", "restaurant_id", "name", "description", "updated_at"
+        )
+    )
+    menu_ids = [menu["id"] for menu in menus]
+
+    categories = MenuCategory.objects.filter(menu_id__in=menu_ids).order_by("path")
+    items = MenuItem.objects.filter(menu_id__in=menu_ids).order_by("name", "id")
+    links = MenuItem.modifier_groups.through.objects.filter(
+        menuitem__menu_id__in=menu_ids
+    ).values_list("menuitem_id", "modifiergroup_id")
+    groups = ModifierGroup.objects.filter(menu_id__in=menu_ids)
+    modifiers = Modifier.objects.filter(group__menu_id__in=menu_ids)
+
+    item_groups = defaultdict(list)
+    for item_id, group_id in links:
+        item_groups[item_id].append(group_id)
+
+    group_modifiers = defaultdict(list)
+    for modifier in modifiers.values(
+        "id", "group_id", "name", "price", "is_available", "position"
+    ):
+        modifier["price"] = str(modifier["price"])
+        group_modifiers[modifier.pop("group_id")].append(modifier)
+    menu_groups = defaultdict(list)
+    for group in groups.values(
+        "id", "menu_id", "name", "min_choices", "max_choices", "position"
+    ):
+        group["modifiers"] = by_position(group_modifiers[group["id"]])
+        menu_groups[group.pop("menu_id")].append(group)
+
+    # {category_id: node}. In path order, a category's parent is always
+    # already there to attach it to.
+    nodes = {}
+    menu_roots = defaultdict(list)
+    for category in categories.values(
+        "id", "menu_id", "parent_id", "name", "description", "position"
+    ):
+        category["items"] = []
+        category["children"] = []
+        nodes[category["id"]] = category
+        parent_id = category.pop("parent_id")
+        menu_id = category.pop("menu_id")
+        if parent_id is None:
+            menu_roots[menu_id].append(category)
+        else:
+            nodes[parent_id]["children"].append(category)
+    for node in nodes.values():
+        node["children"] = by_position(node["children"])
+
+    uncategorized = defaultdict(list)
+    for item in items.values(
+        "id",
+        "menu_id",
+        "category_id",
+        "name",
+        "description",
+        "price",
+        "stock",
+        "is_available",
+    ):
+        item["price"] = str(item["price"])
+        item["modifier_groups"] = sorted(item_groups[item["id"]])
+        menu_id = item.pop("menu_id")
+        category_id = item.pop("category_id")
+        if category_id in nodes:
+            nodes[category_id]["items"].append(item)
+        else:
+            uncategorized[menu_id].append(item)
+
+    for menu in menus:
+        menu["restaurant"] = menu.pop("restaurant_id")
+        menu["categories"] = by_position(menu_roots[menu["id"]])
+        menu["items"] = uncategorized[menu["id"]]
+        menu["modifier_groups"] = by_position(menu_groups[menu["id"]])
+    return menus
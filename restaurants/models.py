@@ -1,4 +1,10 @@
-from django.db import models
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from phonenumber_field.modelfields import PhoneNumberField
 from django.conf import settings
 
@@ -11,9 +17,27 @@ class Restaurant(models.Model):
     address = models.CharField(max_length=255)
     phone_number = PhoneNumberField()
     description = models.TextField(blank=True, null=True)
+    latitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(Decimal(-90)), MaxValueValidator(Decimal(90))],
+    )
+    longitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(Decimal(-180)), MaxValueValidator(Decimal(180))],
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Lets processes sync their restaurant location index, see geo.py
+        indexes = [models.Index(fields=["updated_at"])]
+
     def __str__(self):
         return self.name
 
@@ -31,17 +55,203 @@ class Menu(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["restaurant", "updated_at"])]
+
     def __str__(self):
         return f"{self.name} - {self.restaurant.name}"
 
 
+# Each level adds 11 characters to MenuCategory.path
+MAX_CATEGORY_DEPTH = 20
+
+
+class MenuCategory(models.Model):
+    """
+    A section of a menu, possibly nested in another one.
+
+    `path` is the materialized path of the category: the zero-padded IDs of
+    its ancestors and itself, each followed by "/". A subtree is the
+    categories whose path starts with its root's path, and ordering a menu's
+    categories by path lists every parent before its children. It is
+    maintained by save().
+    """
+
+    menu = models.ForeignKey(Menu, on_delete=models.CASCADE, related_name="categories")
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="children",
+    )
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    position = models.PositiveIntegerField(default=0)
+    path = models.CharField(max_length=255, editable=False, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "menu categories"
+        indexes = [models.Index(fields=["menu", "path"])]
+
+    def __str__(self):
+        return f"{self.name} - {self.menu.name}"
+
+    @property
+    def depth(self):
+        return self.path.count("/") - 1
+
+    def clean(self):
+        if self.parent is None:
+            return
+        if self.parent.menu_id != self.menu_id:
+            raise ValidationError({"parent": "The parent is on another menu."})
+        if self.pk is not None and self.parent.path.startswith(self.path):
+            raise ValidationError({"parent": "A category cannot be moved into itself."})
+        if self.parent.depth + 1 >= MAX_CATEGORY_DEPTH:
+            raise ValidationError(
+                {"parent": f"Categories nest at most {MAX_CATEGORY_DEPTH} deep."}
+            )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            prefix = self.parent.path if self.parent_id else ""
+            path = f"{prefix}{self.pk:010d}/"
+            if path == self.path:
+                return
+            old = self.path
+            self.path = path
+            if old:
+                # Moved: rewrite the paths of the whole subtree, this included
+                MenuCategory.objects.filter(
+                    menu_id=self.menu_id, path__startswith=old
+                ).update(path=Concat(Value(path), Substr("path", len(old) + 1)))
+            else:
+                MenuCategory.objects.filter(pk=self.pk).update(path=path)
+
+
+class ModifierGroup(models.Model):
+    """
+    A choice offered with menu items, such as a size or extras, shared by
+    every item of the menu it is attached to.
+
+    An order line picks between `min_choices` and `max_choices` modifiers of
+    each group of its item; no `max_choices` means any number.
+    """
+
+    menu = models.ForeignKey(
+        Menu, on_delete=models.CASCADE, related_name="modifier_groups"
+    )
+    name = models.CharField(max_length=255)
+    min_choices = models.PositiveSmallIntegerField(default=0)
+    max_choices = models.PositiveSmallIntegerField(blank=True, null=True)
+    position = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.menu.name}"
+
+    def clean(self):
+        if self.max_choices is not None and self.max_choices < self.min_choices:
+            raise ValidationError(
+                {"max_choices": "Allow at least the minimum number of choices."}
+            )
+
+
+class Modifier(models.Model):
+    group = models.ForeignKey(
+        ModifierGroup, on_delete=models.CASCADE, related_name="modifiers"
+    )
+    name = models.CharField(max_length=255)
+    # Added to the item's price when chosen
+    price = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    is_available = models.BooleanField(default=True)
+    position = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} - {self.group.name}"
+
+
 class MenuItem(models.Model):
     menu = models.ForeignKey(Menu, on_delete=models.CASCADE, related_name="items")
+    category = models.ForeignKey(
+        MenuCategory,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="items",
+    )
+    modifier_groups = models.ManyToManyField(
+        ModifierGroup, blank=True, related_name="items"
+    )
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
+    # Portions left to order, or None when the item's stock is not tracked.
+    # Changed by orders through restaurants/inventory.py.
+    stock = models.PositiveIntegerField(blank=True, null=True)
+    is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["menu", "updated_at"])]
+
     def __str__(self):
         return f"{self.name} - {self.menu.name}"
+
+
+class TrendingItem(models.Model):
+    """
+    Checkpoint of a restaurant's trending items, see restaurants/trending.py.
+
+    `score` and `error` are the decayed order counts as of `updated_at`.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.CASCADE, related_name="trending_items"
+    )
+    menu_item = models.ForeignKey(
+        MenuItem, on_delete=models.CASCADE, related_name="trending_entries"
+    )
+    score = models.FloatField()
+    error = models.FloatField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("restaurant", "menu_item")
+
+    def __str__(self):
+        return f"{self.menu_item_id} in {self.restaurant_id}: {self.score:.1f}"
+
+
+TOMBSTONE_KINDS = [
+    ("menu", "Menu"),
+    ("menu_item", "Menu item"),
+]
+
+
+class MenuTombstone(models.Model):
+    """
+    Record of a deleted Menu or MenuItem, for clients syncing menu changes.
+    """
+
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="menu_tombstones",
+    )
+    kind = models.CharField(max_length=10, choices=TOMBSTONE_KINDS)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["restaurant", "kind", "deleted_at"])]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id}"
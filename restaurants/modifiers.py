@@ -0,0 +1,88 @@
+"""
+Modifier choices of order lines.
+
+An order line names the modifiers chosen for its menu item by ID. They are
+checked against the modifier groups attached to the item, and stored on the
+line as a snapshot of their names and prices, so that showing or pricing the
+line later needs no lookup and is not affected by later menu changes.
+
+All the lines of an order are checked together with two queries, whatever
+the number of lines.
+"""
+
+from collections import Counter, defaultdict
+
+from restaurants.models import MenuItem, Modifier
+
+
+class InvalidModifiers(Exception):
+    pass
+
+
+def resolve_modifiers(lines):
+    """
+    Return the modifier snapshot of each (menu_item, modifier_ids) line.
+
+    Raises InvalidModifiers for the first line whose choices are unknown,
+    unavailable, not offered with its item, or break a group's minimum or
+    maximum number of choices.
+    """
+    lines = list(lines)
+    item_ids = {menu_item.id for menu_item, _ in lines}
+    # The groups of each item: {menu_item_id: {group_id: (name, min, max)}}
+    groups = defaultdict(dict)
+    links = MenuItem.modifier_groups.through.objects.filter(
+        menuitem_id__in=item_ids
+    ).values_list(
+        "menuitem_id",
+        "modifiergroup_id",
+        "modifiergroup__name",
+        "modifiergroup__min_choices",
+        "modifiergroup__max_choices",
+    )
+    for item_id, group_id, name, minimum, maximum in links:
+        groups[item_id][group_id] = (name, minimum, maximum)
+
+    modifier_ids = {id for _, ids in lines for id in ids}
+    modifiers = {}
+    if modifier_ids:
+        modifiers = Modifier.objects.filter(id__in=modifier_ids).in_bulk()
+
+    snapshots = []
+    for menu_item, ids in lines:
+        offered = groups.get(menu_item.id, {})
+        if len(set(ids)) != len(ids):
+            raise InvalidModifiers(f"A modifier is chosen twice for {menu_item.name}.")
+        chosen = []
+        for modifier_id in ids:
+            modifier = modifiers.get(modifier_id)
+            if modifier is None or modifier.group_id not in offered:
+                raise InvalidModifiers(
+                    f"Modifier {modifier_id} is not offered with {menu_item.name}."
+                )
+            if not modifier.is_available:
+                raise InvalidModifiers(f"{modifier.name} is not available.")
+            chosen.append(modifier)
+
+        counts = Counter(modifier.group_id for modifier in chosen)
+        for group_id, (name, minimum, maximum) in offered.items():
+            if counts[group_id] < minimum:
+                raise InvalidModifiers(
+                    f"Choose at least {minimum} of {name} for {menu_item.name}."
+                )
+            if maximum is not None and counts[group_id] > maximum:
+                raise InvalidModifiers(
+                    f"Choose at most {maximum} of {name} for {menu_item.name}."
+                )
+        snapshots.append(
+            [
+                {
+                    "id": modifier.id,
+                    "group": modifier.group_id,
+                    "name": modifier.name,
+                    "price": str(modifier.price),
+                }
+                for modifier in chosen
+            ]
+        )
+    return snapshots
@@ -0,0 +1,80 @@
+from weakref import WeakKeyDictionary
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from restaurants.geo import locator
+from restaurants.models import Menu, MenuItem, MenuTombstone, Restaurant
+
+
+def origin_model(origin):
+    """
+    Return the model whose deletion started a cascade.
+    """
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver(post_delete, sender=Menu)
+def bury_menu(sender, instance, origin=None, **kwargs):
+    # Nobody is left to sync a deleted restaurant's menus
+    if origin_model(origin) is Restaurant:
+        return
+    MenuTombstone.objects.create(
+        restaurant_id=instance.restaurant_id, kind="menu", object_id=instance.id
+    )
+
+
+@receiver(post_delete, sender=MenuItem)
+def bury_menu_item(sender, instance, origin=None, **kwargs):
+    # Also buried along with their menu, as clients syncing items do not
+    # know which menu an item belonged to
+    if origin_model(origin) is Restaurant:
+        return
+    restaurant_id = menu_restaurant_id(instance, origin)
+    if restaurant_id is None:
+        return
+    MenuTombstone.objects.create(
+        restaurant_id=restaurant_id, kind="menu_item", object_id=instance.id
+    )
+
+
+# Restaurants of the menus met while deleting a queryset, which runs the
+# receiver once per item
+_menu_restaurants = WeakKeyDictionary()
+
+
+def menu_restaurant_id(item, origin):
+    """
+    Return the restaurant of a deleted item's menu, looking each menu up at
+    most once per delete call.
+    """
+    if isinstance(origin, Menu):
+        return origin.restaurant_id
+    if MenuItem.menu.is_cached(item):
+        return item.menu.restaurant_id
+    restaurants = (
+        _menu_restaurants.setdefault(origin, {})
+        if isinstance(origin, QuerySet)
+        else {}
+    )
+    if item.menu_id not in restaurants:
+        restaurants[item.menu_id] = (
+            Menu.objects.filter(id=item.menu_id)
+            .values_list("restaurant_id", flat=True)
+            .first()
+        )
+    return restaurants[item.menu_id]
+
+
+@receiver(post_save, sender=Restaurant)
+def locate_restaurant(sender, instance, **kwargs):
+    pk, lat, lng = instance.pk, instance.latitude, instance.longitude
+    transaction.on_commit(lambda: locator.update(pk, lat, lng))
+
+
+@receiver(post_delete, sender=Restaurant)
+def unlocate_restaurant(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: locator.remove(pk))
@@ -1,3 +1,377 @@
-from django.test import TestCase
+import random
+import threading
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from restaurants.geo import GridIndex, RestaurantLocator, haversine_km
+from restaurants.menu_tree import load_menu_trees
+from restaurants.models import (
+    Menu,
+    MenuCategory,
+    MenuItem,
+    MenuTombstone,
+    Modifier,
+    ModifierGroup,
+    Restaurant,
+    TrendingItem,
+)
+from restaurants.modifiers import InvalidModifiers, resolve_modifiers
+from restaurants.trending import SpaceSaving, TrendingTracker
+
+
+class RestaurantTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", "owner@example.com", role="owner")
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name="R", address="a", phone_number="+12025550123"
+        )
+        cls.menu = Menu.objects.create(
+            restaurant=cls.restaurant, name="Menu", description="d"
+        )
+        cls.items = [
+            MenuItem.objects.create(
+                menu=cls.menu, name=f"Item {i}", description="d", price="5.00"
+            )
+            for i in range(3)
+        ]
+
+
+class SpaceSavingTests(TestCase):
+    def test_scores_halve_every_half_life(self):
+        sketch = SpaceSaving(capacity=2, half_life=10)
+        sketch.add("a", 8, now=0)
+        self.assertEqual(sketch.top(1, now=20), [("a", 2.0, 0.0)])
+
+    def test_full_sketch_replaces_the_lowest_score(self):
+        sketch = SpaceSaving(capacity=2, half_life=1000)
+        sketch.add("a", 5, now=0)
+        sketch.add("b", 1, now=0)
+        sketch.add("c", 2, now=0)
+        # "c" inherits the evicted count as its error bound
+        self.assertEqual(sketch.top(2, now=0), [("a", 5, 0.0), ("c", 3, 1)])
+
+
+class GridIndexTests(TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.index = GridIndex(cell_degrees=0.5)
+        self.points = {}
+        # Around the antimeridian too, where the grid wraps
+        for key in range(500):
+            lat, lng = rng.uniform(-3, 3), rng.uniform(177, 183)
+            lng = lng - 360 if lng > 180 else lng
+            self.points[key] = (lat, lng)
+            self.index.add(key, lat, lng)
+
+    def brute_force(self, lat, lng, radius_km):
+        distances = [
+            (haversine_km(lat, lng, plat, plng), key)
+            for key, (plat, plng) in self.points.items()
+        ]
+        return sorted(match for match in distances if match[0] <= radius_km)
+
+    def assert_matches(self, found, expected):
+        self.assertEqual([key for _, key in found], [key for _, key in expected])
+        for (distance, _), (expected_distance, _) in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_within_matches_brute_force(self):
+        for lat, lng in ((0, 180), (1.5, -179.5), (-2, 178)):
+            with self.subTest(lat=lat, lng=lng):
+                self.assert_matches(
+                    self.index.within(lat, lng, 60), self.brute_force(lat, lng, 60)
+                )
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lng in ((0, 180), (1.5, -179.5), (-2, 178)):
+            with self.subTest(lat=lat, lng=lng):
+                self.assert_matches(
+                    self.index.nearest(lat, lng, 10, 500),
+                    self.brute_force(lat, lng, 500)[:10],
+                )
+
+    def test_removed_and_moved_points(self):
+        self.index.remove(0)
+        self.index.add(1, 45, 45)
+        self.assertEqual(len(self.index), 499)
+        self.assertEqual(self.index.nearest(45, 45, 1, 1), [(0.0, 1)])
+        keys = [key for _, key in self.index.within(0, 180, 1000)]
+        self.assertNotIn(0, keys)
+        self.assertNotIn(1, keys)
+
+
+@override_settings(GEO_INDEX_REFRESH_SECONDS=0)
+class RestaurantLocatorTests(RestaurantTestCase):
+    def setUp(self):
+        self.locator = RestaurantLocator()
+        Restaurant.objects.filter(id=self.restaurant.id).update(
+            latitude="48.8566", longitude="2.3522"
+        )
+
+    def assert_unlocked(self, execute, sql, params, many, context):
+        # Tried from another thread, as searches would be
+        acquired = []
+
+        def try_lock():
+            acquired.append(self.locator.lock.acquire(blocking=False))
+            if acquired[0]:
+                self.locator.lock.release()
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        self.assertTrue(acquired[0], sql)
+        return execute(sql, params, many, context)
+
+    def test_refresh_picks_up_changes_made_elsewhere(self):
+        self.assertEqual(len(self.locator.nearest(48.8566, 2.3522, 5, 1)), 1)
+        # Queryset updates send no signals, as in another process
+        Restaurant.objects.filter(id=self.restaurant.id).update(
+            latitude="45.7640", longitude="4.8357", updated_at=timezone.now()
+        )
+        self.assertEqual(self.locator.nearest(48.8566, 2.3522, 5, 1), [])
+        Restaurant.objects.filter(id=self.restaurant.id).delete()
+        self.assertEqual(self.locator.nearest(45.7640, 4.8357, 5, 1), [])
+
+    def test_no_query_runs_under_the_lock(self):
+        with connection.execute_wrapper(self.assert_unlocked):
+            self.locator.nearest(48.8566, 2.3522, 5, 1)
+            self.locator.within(48.8566, 2.3522, 1)
+
+
+class TrendingTrackerTests(RestaurantTestCase):
+    def setUp(self):
+        self.tracker = TrendingTracker(capacity=2, half_life=3600)
+
+    def assert_unlocked(self, execute, sql, params, many, context):
+        # Tried from another thread, as the lock could be reentrant
+        acquired = []
+
+        def try_lock():
+            acquired.append(self.tracker._lock.acquire(blocking=False))
+            if acquired[0]:
+                self.tracker._lock.release()
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        self.assertTrue(acquired[0], sql)
+        return execute(sql, params, many, context)
+
+    def test_ranks_items_by_quantity(self):
+        first, second, third = self.items
+        self.tracker.record(self.restaurant.id, first.id, 1, now=100)
+        self.tracker.record(self.restaurant.id, second.id, 3, now=100)
+        self.tracker.record(self.restaurant.id, third.id, 2, now=100)
+        ranked = self.tracker.top(self.restaurant.id, now=100)
+        self.assertEqual([item_id for item_id, _ in ranked], [second.id, third.id])
+
+    def test_checkpoint_is_loaded_by_new_processes(self):
+        first, second, _ = self.items
+        self.tracker.record(self.restaurant.id, first.id, 2, now=100)
+        self.tracker.record(self.restaurant.id, second.id, 1, now=100)
+        self.tracker.checkpoint(now=100)
+        self.assertEqual(TrendingItem.objects.count(), 2)
+
+        restarted = TrendingTracker(capacity=2, half_life=3600)
+        self.assertEqual(
+            restarted.top(self.restaurant.id, now=100),
+            self.tracker.top(self.restaurant.id, now=100),
+        )
+
+    def test_checkpoint_skips_deleted_items(self):
+        item = MenuItem.objects.create(
+            menu=self.menu, name="Gone", description="d", price="1.00"
+        )
+        self.tracker.record(self.restaurant.id, item.id, 1, now=100)
+        item.delete()
+        self.tracker.checkpoint(now=100)
+        self.assertFalse(TrendingItem.objects.exists())
+
+    def test_no_query_runs_under_the_lock(self):
+        with connection.execute_wrapper(self.assert_unlocked):
+            self.tracker.record(self.restaurant.id, self.items[0].id, 1, now=100)
+            self.tracker.top(self.restaurant.id, now=100)
+            self.tracker.checkpoint(now=100)
+
+
+class TombstoneTests(RestaurantTestCase):
+    def tombstones(self, kind):
+        return set(
+            MenuTombstone.objects.filter(
+                restaurant=self.restaurant, kind=kind
+            ).values_list("object_id", flat=True)
+        )
+
+    def test_deleting_a_menu_buries_its_items(self):
+        menu_id = self.menu.id
+        self.menu.delete()
+        self.assertEqual(self.tombstones("menu"), {menu_id})
+        self.assertEqual(self.tombstones("menu_item"), {item.id for item in self.items})
+
+    def test_deleting_many_items_looks_their_menu_up_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            MenuItem.objects.filter(menu=self.menu).delete()
+        self.assertEqual(self.tombstones("menu_item"), {item.id for item in self.items})
+        menu_lookups = [
+            query
+            for query in queries
+            if query["sql"].startswith('SELECT "restaurants_menu"."restaurant_id"')
+        ]
+        self.assertEqual(len(menu_lookups), 1)
+
+    def test_deleting_a_restaurant_buries_nothing(self):
+        self.restaurant.delete()
+        self.assertFalse(MenuTombstone.objects.exists())
+
+
+class MenuCategoryTests(RestaurantTestCase):
+    def category(self, name, parent=None, menu=None):
+        return MenuCategory.objects.create(
+            menu=menu or self.menu, parent=parent, name=name
+        )
+
+    def test_paths_list_parents_before_children(self):
+        drinks = self.category("Drinks")
+        hot = self.category("Hot", drinks)
+        tea = self.category("Tea", hot)
+        self.assertEqual(tea.path, f"{drinks.id:010d}/{hot.id:010d}/{tea.id:010d}/")
+        self.assertEqual(tea.depth, 2)
+        self.assertEqual(
+            list(MenuCategory.objects.order_by("path")), [drinks, hot, tea]
+        )
+
+    def test_moving_a_category_moves_its_subtree(self):
+        drinks = self.category("Drinks")
+        food = self.category("Food")
+        hot = self.category("Hot", drinks)
+        tea = self.category("Tea", hot)
+        hot.parent = food
+        hot.save()
+        tea.refresh_from_db()
+        self.assertEqual(tea.path, f"{food.id:010d}/{hot.id:010d}/{tea.id:010d}/")
+        self.assertEqual(
+            set(
+                MenuCategory.objects.filter(path__startswith=food.path).values_list(
+                    "name", flat=True
+                )
+            ),
+            {"Food", "Hot", "Tea"},
+        )
+
+    def test_rejects_cycles_and_other_menus(self):
+        drinks = self.category("Drinks")
+        hot = self.category("Hot", drinks)
+        drinks.parent = hot
+        with self.assertRaises(ValidationError):
+            drinks.clean()
+        other_menu = Menu.objects.create(
+            restaurant=self.restaurant, name="Other", description="d"
+        )
+        with self.assertRaises(ValidationError):
+            MenuCategory(menu=other_menu, parent=drinks, name="X").clean()
+
+
+class ModifierTests(RestaurantTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.size = ModifierGroup.objects.create(
+            menu=cls.menu, name="Size", min_choices=1, max_choices=1
+        )
+        cls.small = Modifier.objects.create(group=cls.size, name="Small")
+        cls.large = Modifier.objects.create(group=cls.size, name="Large", price="1.50")
+        cls.extras = ModifierGroup.objects.create(menu=cls.menu, name="Extras")
+        cls.cheese = Modifier.objects.create(group=cls.extras, name="Cheese")
+        cls.gone = Modifier.objects.create(
+            group=cls.extras, name="Bacon", is_available=False
+        )
+        burger, fries, _ = cls.items
+        burger.modifier_groups.set([cls.size, cls.extras])
+        fries.modifier_groups.set([cls.size])
+
+    def test_snapshots_the_choices_of_every_line_in_two_queries(self):
+        burger, fries, plain = self.items
+        with self.assertNumQueries(2):
+            snapshots = resolve_modifiers(
+                [
+                    (burger, [self.large.id, self.cheese.id]),
+                    (fries, [self.small.id]),
+                    (plain, []),
+                ]
+            )
+        self.assertEqual(
+            snapshots[0],
+            [
+                {
+                    "id": self.large.id,
+                    "group": self.size.id,
+                    "name": "Large",
+                    "price": "1.50",
+                },
+                {
+                    "id": self.cheese.id,
+                    "group": self.extras.id,
+                    "name": "Cheese",
+                    "price": "0.00",
+                },
+            ],
+        )
+        self.assertEqual([m["name"] for m in snapshots[1]], ["Small"])
+        self.assertEqual(snapshots[2], [])
+
+    def test_rejects_invalid_choices(self):
+        burger, fries, _ = self.items
+        for line in (
+            (burger, []),
+            (burger, [self.small.id, self.large.id]),
+            (burger, [self.small.id, self.small.id]),
+            (burger, [self.small.id, self.gone.id]),
+            (fries, [self.small.id, self.cheese.id]),
+            (fries, [self.small.id, 0]),
+        ):
+            with self.subTest(line=line):
+                with self.assertRaises(InvalidModifiers):
+                    resolve_modifiers([line])
+
+
+class MenuTreeTests(RestaurantTestCase):
+    def build_tree(self, menu, categories):
+        group = ModifierGroup.objects.create(menu=menu, name="Extras")
+        Modifier.objects.create(group=group, name="Cheese")
+        for i in range(categories):
+            parent = MenuCategory.objects.create(menu=menu, name=f"C{i}")
+            child = MenuCategory.objects.create(menu=menu, parent=parent, name="Sub")
+            item = MenuItem.objects.create(
+                menu=menu, category=child, name=f"I{i}", description="d", price="1.00"
+            )
+            item.modifier_groups.add(group)
+
+    def test_nests_categories_items_and_modifiers(self):
+        self.build_tree(self.menu, 1)
+        [tree] = load_menu_trees(Menu.objects.all())
+        [category] = tree["categories"]
+        [child] = category["children"]
+        [group] = tree["modifier_groups"]
+        self.assertEqual(child["items"][0]["modifier_groups"], [group["id"]])
+        self.assertEqual([m["name"] for m in group["modifiers"]], ["Cheese"])
+        # Items without a category stay on the menu
+        self.assertEqual(len(tree["items"]), len(self.items))
+
+    def test_queries_do_not_grow_with_the_menus(self):
+        self.build_tree(self.menu, 1)
+        with self.assertNumQueries(6):
+            load_menu_trees(Menu.objects.all())
+        for _ in range(3):
+            menu = Menu.objects.create(
+                restaurant=self.restaurant, name="More", description="d"
+            )
+            self.build_tree(menu, 3)
+        with self.assertNumQueries(6):
+            self.assertEqual(len(load_menu_trees(Menu.objects.all())), 4)
@@ -0,0 +1,176 @@
+"""
+Time-decayed "popular right now" counters per restaurant.
+
+Each restaurant gets a Space-Saving sketch of at most TRENDING_CAPACITY menu
+items. Every ordered quantity is added to its item's score, and scores halve
+every TRENDING_HALF_LIFE seconds. When the sketch is full, a new item replaces
+the lowest-scoring one and inherits its score as an error bound, so items that
+really are ordered a lot are never missed. Memory per restaurant is bounded
+whatever the size of the menu or the order history.
+
+Sketches live in process memory and are written to the TrendingItem table at
+most every TRENDING_CHECKPOINT_INTERVAL seconds. A process that has no sketch
+for a restaurant yet starts from that checkpoint. Each worker process keeps
+its own sketch, and the latest checkpoint wins.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+
+class SpaceSaving:
+    """
+    Bounded heavy-hitter counter with exponential time decay.
+
+    Entries are stored as {key: [score, error, stamp]}, with the score and
+    error valid as of `stamp`. They are decayed lazily when touched.
+    """
+
+    def __init__(self, capacity, half_life):
+        self.capacity = capacity
+        self.half_life = half_life
+        self.entries = {}
+
+    def decay(self, value, stamp, now):
+        if now <= stamp:
+            return value
+        return value * 0.5 ** ((now - stamp) / self.half_life)
+
+    def current(self, key, now):
+        score, error, stamp = self.entries[key]
+        return self.decay(score, stamp, now), self.decay(error, stamp, now)
+
+    def add(self, key, weight, now):
+        if key in self.entries:
+            score, error = self.current(key, now)
+            self.entries[key] = [score + weight, error, now]
+            return
+        if len(self.entries) < self.capacity:
+            self.entries[key] = [weight, 0.0, now]
+            return
+        victim = min(self.entries, key=lambda k: self.current(k, now)[0])
+        floor, _ = self.current(victim, now)
+        del self.entries[victim]
+        self.entries[key] = [floor + weight, floor, now]
+
+    def top(self, k, now):
+        """
+        Return up to `k` (key, score, error) tuples, highest score first.
+        """
+        ranked = [(key, *self.current(key, now)) for key in self.entries]
+        ranked.sort(key=lambda entry: entry[1], reverse=True)
+        return ranked[:k]
+
+
+class TrendingTracker:
+    """
+    The Space-Saving sketches of all restaurants seen by this process.
+    """
+
+    def __init__(self, capacity=None, half_life=None, checkpoint_interval=None):
+        self.capacity = capacity or settings.TRENDING_CAPACITY
+        self.half_life = half_life or settings.TRENDING_HALF_LIFE
+        self.checkpoint_interval = (
+            checkpoint_interval
+            if checkpoint_interval is not None
+            else settings.TRENDING_CHECKPOINT_INTERVAL
+        )
+        self._sketches = {}
+        self._dirty = set()
+        self._last_checkpoint = time.time()
+        # Guards the sketches only; no database query is made while holding it,
+        # so a slow query never holds up the on_commit hooks of other orders.
+        self._lock = threading.Lock()
+
+    def sketch(self, restaurant_id):
+        with self._lock:
+            sketch = self._sketches.get(restaurant_id)
+        if sketch is None:
+            loaded = self.load(restaurant_id)
+            with self._lock:
+                # Another thread may have loaded it in the meantime
+                sketch = self._sketches.setdefault(restaurant_id, loaded)
+        return sketch
+
+    def load(self, restaurant_id):
+        """
+        Build a sketch for a restaurant from its last checkpoint.
+        """
+        from restaurants.models import TrendingItem
+
+        sketch = SpaceSaving(self.capacity, self.half_life)
+        rows = TrendingItem.objects.filter(restaurant_id=restaurant_id).values_list(
+            "menu_item_id", "score", "error", "updated_at"
+        )
+        for menu_item_id, score, error, updated_at in rows:
+            sketch.entries[menu_item_id] = [score, error, updated_at.timestamp()]
+        return sketch
+
+    def record(self, restaurant_id, menu_item_id, quantity, now=None):
+        """
+        Count `quantity` orders of a menu item, and checkpoint if it is due.
+        """
+        now = now or time.time()
+        sketch = self.sketch(restaurant_id)
+        with self._lock:
+            sketch.add(menu_item_id, quantity, now)
+            self._dirty.add(restaurant_id)
+            due = now - self._last_checkpoint >= self.checkpoint_interval
+        if due:
+            self.checkpoint(now)
+
+    def top(self, restaurant_id, k=10, now=None):
+        """
+        Return up to `k` (menu item ID, score) pairs, highest score first.
+        """
+        now = now or time.time()
+        sketch = self.sketch(restaurant_id)
+        with self._lock:
+            return [(key, score) for key, score, _ in sketch.top(k, now)]
+
+    def checkpoint(self, now=None):
+        """
+        Write the sketches changed since the last checkpoint to the database.
+        """
+        from restaurants.models import MenuItem, TrendingItem
+
+        now = now or time.time()
+        # Snapshot under the lock, write without it
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._last_checkpoint = now
+            snapshots = {
+                restaurant_id: self._sketches[restaurant_id].top(self.capacity, now)
+                for restaurant_id in dirty
+            }
+        if not snapshots:
+            return
+
+        # Skip items deleted since they were counted
+        existing = set(
+            MenuItem.objects.filter(
+                id__in={entry[0] for entries in snapshots.values() for entry in entries}
+            ).values_list("id", flat=True)
+        )
+        stamp = datetime.fromtimestamp(now, tz=dt_timezone.utc)
+        with transaction.atomic():
+            TrendingItem.objects.filter(restaurant_id__in=snapshots).delete()
+            TrendingItem.objects.bulk_create(
+                TrendingItem(
+                    restaurant_id=restaurant_id,
+                    menu_item_id=menu_item_id,
+                    score=score,
+                    error=error,
+                    updated_at=stamp,
+                )
+                for restaurant_id, entries in snapshots.items()
+                for menu_item_id, score, error in entries
+                if menu_item_id in existing
+            )
+
+
+tracker = TrendingTracker()